@@ -0,0 +1,105 @@
+"""
+API Load Test - Measure requests per second against a running API server
+
+Start the server first (python src/main.py serve), pointed at a local mongod,
+then run:
+
+    python benchmarks/api_load_test.py --concurrency 50 --duration 30
+
+Requires aiohttp.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import aiohttp
+
+
+# (weight, method, path, body factory)
+REQUEST_MIX = [
+    (40, "GET", "/dashboard", None),
+    (20, "POST", "/expenses", lambda: {
+        "amount": round(random.uniform(1, 200), 2),
+        "category": random.choice(["Food", "Transportation", "Shopping", "Utilities"]),
+        "description": "load test",
+    }),
+    (10, "POST", "/income", lambda: {
+        "amount": round(random.uniform(100, 3000), 2),
+        "source": "Load Test",
+    }),
+    (15, "GET", "/debts", None),
+    (15, "GET", "/investments", None),
+]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _worker(session, base_url, deadline, latencies, errors):
+    weights = [item[0] for item in REQUEST_MIX]
+    while time.perf_counter() < deadline:
+        _, method, path, body = random.choices(REQUEST_MIX, weights)[0]
+        started = time.perf_counter()
+        try:
+            async with session.request(method, base_url + path,
+                                       json=body() if body else None) as response:
+                await response.read()
+                if response.status >= 400:
+                    errors[path] = errors.get(path, 0) + 1
+                    continue
+        except aiohttp.ClientError:
+            errors[path] = errors.get(path, 0) + 1
+            continue
+        latencies.setdefault(path, []).append(time.perf_counter() - started)
+
+
+async def run_load_test(base_url, concurrency, duration):
+    latencies = {}
+    errors = {}
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*[
+            _worker(session, base_url, deadline, latencies, errors)
+            for _ in range(concurrency)
+        ])
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    args = parser.parse_args()
+
+    latencies, errors, elapsed = asyncio.run(
+        run_load_test(args.url.rstrip("/"), args.concurrency, args.duration)
+    )
+
+    total = sum(len(values) for values in latencies.values())
+    print("=" * 72)
+    print(f"{args.concurrency} clients for {elapsed:.1f}s against {args.url}")
+    print("=" * 72)
+    print(f"{'Endpoint':<20} {'Requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'Errors':>8}")
+    for path in sorted(set(latencies) | set(errors)):
+        values = sorted(latencies.get(path, []))
+        print(f"{path:<20} {len(values):>9} "
+              f"{_percentile(values, 50) * 1000:>9.1f} "
+              f"{_percentile(values, 95) * 1000:>9.1f} "
+              f"{_percentile(values, 99) * 1000:>9.1f} "
+              f"{errors.get(path, 0):>8}")
+    print("-" * 72)
+    print(f"Throughput: {total / elapsed:,.1f} requests/second ({total} ok, {sum(errors.values())} failed)")
+
+
+if __name__ == "__main__":
+    main()
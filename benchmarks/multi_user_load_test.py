@@ -0,0 +1,372 @@
+"""
+Multi-User Load Test - Many simulated users writing to one household's ledger
+
+Every user opens its own DataManager session and runs a weighted mix of
+entries, debt payments, goal contributions, investment deposits and
+revaluations, budget checks and dashboard renders against one tenant. At
+the end the ledger is checked against what the users report writing, and
+each session renders its dashboard again to show whether its caches caught
+every other user's writes. Point it at a local mongod:
+
+    python benchmarks/multi_user_load_test.py --users 32 --duration 30
+    python benchmarks/multi_user_load_test.py --users 8 --processes
+
+Threads share one pooled client, like the API server; with --processes every
+user has its own. Data goes to a fresh tenant (load-test-<time>) that is
+deleted afterwards unless --keep is given. PFA_BACKEND=memory works with
+threads only, since processes would each get an empty store.
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from connection import create_client, selected_backend  # noqa: E402
+from dashboard import Dashboard  # noqa: E402
+from data_manager import DataManager  # noqa: E402
+
+
+CATEGORIES = ["Food", "Transportation", "Shopping", "Utilities"]
+CHECKED_COLLECTIONS = ["income", "expenses", "debts", "goals", "investments"]
+
+# Large enough that payments and contributions never finish a debt or goal
+FIXTURE_TARGET = 10 ** 9
+INITIAL_INVESTMENT = 1000
+
+
+# Operations: each takes (user, amount) and returns the tally keys it added amount to
+def _add_expense(user, amount):
+    category = user.rng.choice(CATEGORIES)
+    user.dm.add_expense(amount, category, user.today, "load test")
+    return [("expenses", category)]
+
+
+def _add_income(user, amount):
+    user.dm.add_income(amount, "Load Test", user.today, "load test")
+    return [("income", "Load Test")]
+
+
+def _add_debt_payment(user, amount):
+    debt_id = user.rng.choice(user.fixture["debts"])
+    if not user.dm.add_debt_payment(debt_id, amount, user.today):
+        raise LookupError(f"debt {debt_id} not found")
+    return [("debts", str(debt_id))]
+
+
+def _add_goal_contribution(user, amount):
+    goal_id = user.rng.choice(user.fixture["goals"])
+    if not user.dm.add_goal_contribution(goal_id, amount, user.today):
+        raise LookupError(f"goal {goal_id} not found")
+    return [("goals", str(goal_id))]
+
+
+def _deposit_to_investment(user, amount):
+    investment_id = user.rng.choice(user.fixture["deposit_investments"])
+    user.dm.deposit_to_investment("Load test fund", amount, user.today, investment_id=investment_id)
+    return [("investments", str(investment_id)), ("expenses", "Investment")]
+
+
+def _revalue_investment(user, amount):
+    # Only touches investments that take no deposits, whose values are checked
+    investment_id = user.rng.choice(user.fixture["revalued_investments"])
+    if not user.dm.set_investment_value(investment_id, INITIAL_INVESTMENT + amount):
+        raise LookupError(f"investment {investment_id} not found")
+    return []
+
+
+def _budget_status(user, amount):
+    user.dm.get_budget_status()
+    return []
+
+
+def _dashboard(user, amount):
+    user.dashboard.compute_metrics()
+    return []
+
+
+# (weight, name, operation)
+OPERATION_MIX = [
+    (25, "add_expense", _add_expense),
+    (10, "add_income", _add_income),
+    (15, "add_debt_payment", _add_debt_payment),
+    (15, "add_goal_contribution", _add_goal_contribution),
+    (5, "deposit_to_investment", _deposit_to_investment),
+    (5, "set_investment_value", _revalue_investment),
+    (5, "get_budget_status", _budget_status),
+    (20, "dashboard", _dashboard),
+]
+
+
+class SimulatedUser:
+    """One session: its own DataManager and random stream, and a tally of what it wrote"""
+
+    def __init__(self, dm, fixture, seed):
+        self.dm = dm
+        self.dashboard = Dashboard(dm)
+        self.fixture = fixture
+        self.rng = random.Random(seed)
+        self.today = datetime.now().strftime("%Y-%m-%d")
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        # (collection, key) -> [count, total]
+        self.tally = defaultdict(lambda: [0, 0])
+
+    def run(self, duration):
+        weights = [weight for weight, _, _ in OPERATION_MIX]
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            _, name, operation = self.rng.choices(OPERATION_MIX, weights)[0]
+            # Whole amounts keep the expected totals exact
+            amount = self.rng.randint(1, 500)
+            started = time.perf_counter()
+            try:
+                keys = operation(self, amount)
+            except Exception as e:
+                self.errors[f"{name}: {type(e).__name__}"] += 1
+                continue
+            self.latencies[name].append(time.perf_counter() - started)
+            for key in keys:
+                self.tally[key][0] += 1
+                self.tally[key][1] += amount
+
+    def result(self):
+        """What the user did, in plain types so it can cross a process boundary"""
+        metrics = self.dashboard.compute_metrics()
+        return {
+            "latencies": dict(self.latencies),
+            "errors": dict(self.errors),
+            "tally": {key: tuple(value) for key, value in self.tally.items()},
+            # The session's own view of the ledger once every user has stopped
+            "final_totals": (metrics["total_income"], metrics["total_expenses"] + metrics["total_investments"]),
+        }
+
+
+def _user_session(tenant, fixture, seed, duration, barrier, client=None):
+    # No journal or report cache file: entries must be in the database when checked
+    dm = DataManager(tenant=tenant, client=client, journal_path="", report_cache_path="")
+    try:
+        user = SimulatedUser(dm, fixture, seed)
+        barrier.wait()
+        user.run(duration)
+        # Every user stops writing before any renders its final dashboard
+        barrier.wait()
+        return user.result()
+    finally:
+        dm.close()
+
+
+def _user_process(tenant, fixture, seed, duration, barrier, results):
+    try:
+        results.put(_user_session(tenant, fixture, seed, duration, barrier))
+    except Exception as e:
+        barrier.abort()
+        results.put({"failed": f"{type(e).__name__}: {e}"})
+
+
+def run_users(tenant, fixture, users, duration, seed, processes=False):
+    """Run the users concurrently; returns their results"""
+    if processes:
+        context = multiprocessing.get_context()
+        barrier, results = context.Barrier(users), context.Queue()
+        workers = [
+            context.Process(target=_user_process, args=(tenant, fixture, seed + i, duration, barrier, results))
+            for i in range(users)
+        ]
+        for worker in workers:
+            worker.start()
+        collected = [results.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        return collected
+
+    client = create_client(maxPoolSize=max(users, 10))
+    barrier, collected = threading.Barrier(users), []
+
+    def run(i):
+        try:
+            collected.append(_user_session(tenant, fixture, seed + i, duration, barrier, client))
+        except Exception as e:
+            barrier.abort()
+            collected.append({"failed": f"{type(e).__name__}: {e}"})
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    client.close()
+    return collected
+
+
+def create_fixture(dm, debts, goals, investments):
+    """Debts, goals and investments the users share, by _id"""
+    today = datetime.now().strftime("%Y-%m-%d")
+    fixture = {
+        "debts": [dm.add_debt(FIXTURE_TARGET, f"Load test debt {i}", today)["_id"] for i in range(debts)],
+        "goals": [dm.add_goal(f"Load test goal {i}", FIXTURE_TARGET, 0, None, "", today)["_id"] for i in range(goals)],
+    }
+    for kind in ("deposit", "revalued"):
+        fixture[f"{kind}_investments"] = [
+            dm.add_investment(f"Load test {kind} {i}", INITIAL_INVESTMENT, "ETF", "General", today)["_id"]
+            for i in range(investments)
+        ]
+    return fixture
+
+
+def check_consistency(dm, fixture, results):
+    """(check, passed, detail) for the ledger against the users' tallies"""
+    expected = defaultdict(lambda: [0, 0])
+    for result in results:
+        for key, (count, total) in result["tally"].items():
+            expected[key][0] += count
+            expected[key][1] += total
+    checks = []
+
+    def entries(collection, group_field):
+        found = defaultdict(lambda: [0, 0])
+        for entry in dm.db[collection].find({"tenant": dm.tenant}, {group_field: 1, "amount": 1}):
+            found[(collection, entry[group_field])][0] += 1
+            found[(collection, entry[group_field])][1] += entry["amount"]
+        return found
+
+    for collection, group_field in (("income", "source"), ("expenses", "category")):
+        found = entries(collection, group_field)
+        keys = {key for key in set(expected) | set(found) if key[0] == collection}
+        wrong = [key[1] for key in keys if found[key] != expected[key]]
+        written = sum(expected[key][0] for key in keys)
+        checks.append((f"{collection} entries", not wrong,
+                       f"{written} written" if not wrong else f"mismatch in {', '.join(sorted(wrong))}"))
+
+    for collection, field, array in (("debts", "paid", "payments"), ("goals", "saved", "contributions")):
+        wrong = []
+        for doc in dm.db[collection].find({"_id": {"$in": fixture[collection]}}):
+            count, total = expected[(collection, str(doc["_id"]))]
+            items = doc.get(array, [])
+            if doc.get(field, 0) != total or len(items) != count or sum(item["amount"] for item in items) != total:
+                wrong.append(f"{doc['_id']} ({field} {doc.get(field, 0)}, expected {total})")
+        checks.append((f"{collection} {field}", not wrong, "; ".join(wrong) or f"{len(fixture[collection])} checked"))
+
+    wrong = []
+    for doc in dm.db["investments"].find({"_id": {"$in": fixture["deposit_investments"]}}):
+        value = INITIAL_INVESTMENT + expected[("investments", str(doc["_id"]))][1]
+        if doc.get("current_value") != value:
+            wrong.append(f"{doc['_id']} ({doc.get('current_value')}, expected {value})")
+    checks.append(("investment deposits", not wrong, "; ".join(wrong) or f"{len(fixture['deposit_investments'])} checked"))
+
+    # Budget counters are incremented separately from the entries they count
+    month = datetime.now().strftime("%Y-%m")
+    spend = {counter["category"]: (counter["count"], counter["total"])
+             for counter in dm.get_category_spend(month).values() if counter["count"]}
+    month_entries = defaultdict(lambda: [0, 0])
+    for entry in dm.db["expenses"].find({"tenant": dm.tenant, "date": {"$gte": f"{month}-01", "$lte": f"{month}-31"}},
+                                        {"category": 1, "amount": 1}):
+        month_entries[entry["category"]][0] += 1
+        month_entries[entry["category"]][1] += entry["amount"]
+    wrong = [category for category in set(spend) | set(month_entries)
+             if tuple(month_entries.get(category, (0, 0))) != spend.get(category, (0, 0))]
+    checks.append(("category spend counters", not wrong,
+                   f"mismatch in {', '.join(sorted(wrong))}" if wrong else f"{len(spend)} categories"))
+
+    revisions = Counter()
+    for name in CHECKED_COLLECTIONS:
+        revisions.update(doc["revision"] for doc in dm.db[name].find({"tenant": dm.tenant}, {"revision": 1}))
+    duplicates = sum(1 for count in revisions.values() if count > 1)
+    checks.append(("unique revisions", not duplicates,
+                   f"{duplicates} revisions shared by several documents" if duplicates else f"{len(revisions)} documents"))
+
+    income = expected.get(("income", "Load Test"), (0, 0))[1]
+    spent = sum(total for (collection, _), (_, total) in expected.items() if collection == "expenses")
+    stale = sum(1 for result in results if result["final_totals"] != (income, spent))
+    checks.append(("session dashboards", not stale,
+                   f"{stale} of {len(results)} sessions saw stale totals" if stale else f"{len(results)} sessions current"))
+    return checks
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def delete_tenant(dm):
+    for name in dm.db.list_collection_names():
+        dm.db[name].delete_many({"tenant": dm.tenant})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--processes", action="store_true", help="one process per user instead of threads")
+    parser.add_argument("--debts", type=int, default=3, help="debts shared by the users")
+    parser.add_argument("--goals", type=int, default=3, help="goals shared by the users")
+    parser.add_argument("--investments", type=int, default=3, help="investments of each kind shared by the users")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tenant", help="tenant to load (default: a fresh load-test-<time>)")
+    parser.add_argument("--keep", action="store_true", help="leave the test data in the database")
+    args = parser.parse_args()
+    if args.users < 1 or min(args.debts, args.goals, args.investments) < 1:
+        parser.error("--users, --debts, --goals and --investments must be at least 1")
+    if args.processes and selected_backend() == "memory":
+        parser.error("--processes needs MongoDB: with PFA_BACKEND=memory every process has its own store")
+
+    tenant = args.tenant or f"load-test-{datetime.now():%Y%m%d%H%M%S}"
+    dm = DataManager(tenant=tenant, journal_path="", report_cache_path="")
+    try:
+        fixture = create_fixture(dm, args.debts, args.goals, args.investments)
+        started = time.perf_counter()
+        results = run_users(tenant, fixture, args.users, args.duration, args.seed, args.processes)
+        elapsed = time.perf_counter() - started
+
+        failed = [result["failed"] for result in results if "failed" in result]
+        if failed:
+            print(f"{len(failed)} user(s) failed: {failed[0]}")
+            return 1
+
+        latencies, errors = defaultdict(list), Counter()
+        for result in results:
+            for name, values in result["latencies"].items():
+                latencies[name].extend(values)
+            errors.update(result["errors"])
+        total = sum(len(values) for values in latencies.values())
+
+        mode = "processes" if args.processes else "threads"
+        print("=" * 72)
+        print(f"{args.users} users ({mode}) for {elapsed:.1f}s on tenant {tenant}")
+        print("=" * 72)
+        print(f"{'Operation':<24} {'Calls':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name in sorted(latencies):
+            values = sorted(latencies[name])
+            print(f"{name:<24} {len(values):>8} "
+                  f"{_percentile(values, 50) * 1000:>9.1f} "
+                  f"{_percentile(values, 95) * 1000:>9.1f} "
+                  f"{_percentile(values, 99) * 1000:>9.1f} "
+                  f"{values[-1] * 1000:>9.1f}")
+        print("-" * 72)
+        print(f"Throughput: {total / elapsed:,.1f} operations/second ({total} ok, {sum(errors.values())} failed)")
+        for error, count in errors.most_common():
+            print(f"  {count} x {error}")
+
+        print("\n" + "CONSISTENCY CHECKS".center(72))
+        print("-" * 72)
+        checks = check_consistency(dm, fixture, results)
+        for check, passed, detail in checks:
+            print(f"{'PASS' if passed else 'FAIL'}  {check:<26} {detail}")
+        return 0 if all(passed for _, passed, _ in checks) else 1
+    finally:
+        if not args.keep:
+            delete_tenant(dm)
+        dm.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Portfolio Simulation Scaling - Time simulate_purposes across worker counts
+
+Uses a synthetic portfolio, so no database is needed:
+
+    python benchmarks/portfolio_scaling.py --paths 200000 --years 30
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from portfolio_simulation import simulate_purposes  # noqa: E402
+
+
+SAMPLE_PORTFOLIO = [
+    {"name": "Index Fund", "amount": 40000, "current_value": 52000, "type": "ETF", "purpose": "Retirement"},
+    {"name": "401k", "amount": 60000, "current_value": 75000, "type": "Retirement Account", "purpose": "Retirement"},
+    {"name": "Treasury", "amount": 10000, "current_value": 10400, "type": "Bonds", "purpose": "Retirement"},
+    {"name": "HYSA", "amount": 15000, "current_value": 15300, "type": "Savings Account", "purpose": "Emergency Fund"},
+    {"name": "Brokerage", "amount": 20000, "current_value": 23000, "type": "Stocks", "purpose": "House Down Payment"},
+    {"name": "CD Ladder", "amount": 8000, "current_value": 8200, "type": "CD", "purpose": "House Down Payment"},
+    {"name": "BTC", "amount": 2000, "current_value": 3500, "type": "Cryptocurrency", "purpose": "Long-term Growth"},
+]
+
+SAMPLE_ASSUMPTIONS = {
+    "ETF": {"monthly_contribution": 500},
+    "Retirement Account": {"monthly_contribution": 800},
+    "Stocks": {"monthly_contribution": 300},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paths", type=int, default=100000, help="paths per purpose")
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    total_paths = args.paths * len({inv["purpose"] for inv in SAMPLE_PORTFOLIO})
+    print(f"{total_paths:,} paths x {args.years * 12} months, chunks of {args.chunk_size:,}")
+    print(f"{'Workers':>8} {'Seconds':>10} {'Paths/s':>14} {'Speedup':>9}")
+
+    baseline = None
+    for workers in counts:
+        started = time.perf_counter()
+        simulate_purposes(SAMPLE_PORTFOLIO, SAMPLE_ASSUMPTIONS, years=args.years, n_paths=args.paths,
+                          chunk_size=args.chunk_size, workers=workers, seed=42)
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{workers:>8} {elapsed:>10.2f} {total_paths / elapsed:>14,.0f} {baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Record Memory - Bytes per expense held as pymongo dicts vs ExpenseRecords
+
+Builds synthetic expenses the way pymongo decodes them (fresh strings for
+every field of every document), so no database is needed:
+
+    python benchmarks/record_memory.py --rows 1000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from records import ExpenseRecord  # noqa: E402
+
+
+CATEGORIES = ["Food", "Transportation", "Housing", "Utilities", "Healthcare", "Entertainment",
+              "Shopping", "Education", "Investment", "Other"]
+DESCRIPTIONS = ["Groceries", "Bus pass", "Rent", "Electricity", "Pharmacy", "Cinema", "Shoes",
+                "Course fee", "Index fund", "Gift"]
+
+
+def documents(rows, seed, projection=None):
+    """Expense documents with every string freshly built, like BSON decoding does"""
+    rng = random.Random(seed)
+    for i in range(rows):
+        pick = rng.randrange(len(CATEGORIES))
+        doc = {
+            "amount": round(rng.uniform(1, 500), 2),
+            # join copies the string, as decoding would
+            "category": "".join(CATEGORIES[pick]),
+            "date": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "description": f"{DESCRIPTIONS[pick]} #{i}",
+            "timestamp": f"2024-06-01T12:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}",
+        }
+        if projection is not None:
+            # The server would never send the unprojected fields
+            doc = {name: value for name, value in doc.items() if projection.get(name)}
+        yield doc
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = build()
+    elapsed = time.perf_counter() - started
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{args.rows:,} expenses")
+    print(f"{'Layout':<16} {'MiB':>10} {'Bytes/row':>10} {'Seconds':>9}")
+
+    results = {}
+    rows, size, elapsed = measure(lambda: list(documents(args.rows, args.seed)))
+    results["dicts"] = size
+    print(f"{'pymongo dicts':<16} {size / 2**20:>10,.1f} {size / args.rows:>10,.0f} {elapsed:>9.2f}")
+    del rows
+
+    projection = ExpenseRecord.projection()
+    rows, size, elapsed = measure(
+        lambda: [ExpenseRecord.from_doc(doc) for doc in documents(args.rows, args.seed, projection)])
+    results["records"] = size
+    print(f"{'ExpenseRecord':<16} {size / 2**20:>10,.1f} {size / args.rows:>10,.0f} {elapsed:>9.2f}")
+    del rows
+
+    saved = results["dicts"] - results["records"]
+    print(f"\nSaved {saved / args.rows:,.0f} bytes per row ({saved / results['dicts']:.0%})")
+
+
+if __name__ == "__main__":
+    main()
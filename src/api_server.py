@@ -0,0 +1,319 @@
+"""
+API Server - Local asyncio HTTP JSON API over a single pooled DataManager
+
+Requires aiohttp (pip install aiohttp). Every request shares one DataManager,
+and therefore one MongoClient connection pool; the blocking pymongo calls run
+on a thread pool sized to match it so the event loop never waits on MongoDB.
+"""
+
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import partial
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
+
+from data_manager import INTERNAL_PROJECTION, DataManager
+from dashboard import Dashboard
+from debt_manager import DebtManager
+from metrics import CONTENT_TYPE, REGISTRY
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+DEFAULT_POOL_SIZE = 20
+MAX_CHANGES_PAGE = 10000
+
+_dumps = partial(json.dumps, default=str)
+
+
+class BadRequest(Exception):
+    """Raised by handlers for invalid client input (HTTP 400)"""
+
+
+def _json(data, status=200):
+    return web.json_response(data, status=status, dumps=_dumps)
+
+
+def _amount(payload, key="amount", allow_zero=False):
+    try:
+        amount = float(payload[key])
+    except KeyError:
+        raise BadRequest(f"'{key}' is required")
+    except (TypeError, ValueError):
+        raise BadRequest(f"'{key}' must be a number")
+    if amount < 0 or (amount == 0 and not allow_zero):
+        raise BadRequest(f"'{key}' must be positive")
+    return amount
+
+
+def _text(payload, key, default=None):
+    value = payload.get(key, default)
+    if value is None:
+        raise BadRequest(f"'{key}' is required")
+    value = str(value).strip()
+    if not value and default is None:
+        raise BadRequest(f"'{key}' cannot be empty")
+    return value
+
+
+def _date(payload, key="date", fmt="%Y-%m-%d"):
+    value = payload.get(key)
+    if not value:
+        return datetime.now().strftime(fmt)
+    try:
+        datetime.strptime(value, fmt)
+    except (TypeError, ValueError):
+        raise BadRequest(f"'{key}' must be formatted as {fmt}")
+    return value
+
+
+def _public(document):
+    """A stored document without its bookkeeping fields (tenant, revisions), for responses"""
+    return {key: value for key, value in document.items() if key not in INTERNAL_PROJECTION}
+
+
+def _object_id(value):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise BadRequest(f"invalid id '{value}'")
+
+
+class FinanceAPI:
+    """aiohttp handlers for the ledger operations"""
+
+    def __init__(self, data_manager, pool_size=DEFAULT_POOL_SIZE):
+        self.data_manager = data_manager
+        self.dashboard = Dashboard(data_manager)
+        self.debt_manager = DebtManager(data_manager)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="pfa-api")
+
+    async def _run(self, func, *args):
+        """Run a blocking DataManager call on the worker pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args))
+
+    @staticmethod
+    async def _payload(request):
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise BadRequest("request body must be JSON")
+        if not isinstance(payload, dict):
+            raise BadRequest("request body must be a JSON object")
+        return payload
+
+    # Income
+    async def list_income(self, request):
+        return _json(await self._run(self.data_manager.get_all_income))
+
+    async def add_income(self, request):
+        payload = await self._payload(request)
+        entry = await self._run(
+            self.data_manager.add_income,
+            _amount(payload), _text(payload, "source"), _date(payload),
+            _text(payload, "description", ""), _text(payload, "currency", "") or None,
+        )
+        return _json(_public(entry), status=201)
+
+    # Expenses
+    async def list_expenses(self, request):
+        return _json(await self._run(self.data_manager.get_all_expenses))
+
+    async def add_expense(self, request):
+        payload = await self._payload(request)
+        entry = await self._run(
+            self.data_manager.add_expense,
+            _amount(payload), _text(payload, "category"), _date(payload),
+            _text(payload, "description", ""), _text(payload, "currency", "") or None,
+        )
+        return _json(_public(entry), status=201)
+
+    # Investments
+    async def list_investments(self, request):
+        return _json(await self._run(self.data_manager.get_all_investments, True))
+
+    async def add_investment(self, request):
+        payload = await self._payload(request)
+        entry = await self._run(
+            self.data_manager.add_investment,
+            _text(payload, "name"), _amount(payload), _text(payload, "type", "Other"),
+            _text(payload, "purpose", "General"), _date(payload),
+        )
+        return _json(_public(entry), status=201)
+
+    async def update_investment_value(self, request):
+        payload = await self._payload(request)
+        investment_id = _object_id(request.match_info["investment_id"])
+        updated = await self._run(
+            self.data_manager.set_investment_value, investment_id,
+            _amount(payload, "current_value", allow_zero=True),
+        )
+        if not updated:
+            raise web.HTTPNotFound(text=_dumps({"error": "investment not found"}),
+                                   content_type="application/json")
+        return _json({"updated": True})
+
+    # Debts
+    async def debt_status(self, request):
+        return _json(await self._run(self.debt_manager.get_debt_status))
+
+    async def add_debt(self, request):
+        payload = await self._payload(request)
+        month_limit = payload.get("month_limit")
+        if month_limit is not None:
+            try:
+                month_limit = int(month_limit)
+            except (TypeError, ValueError):
+                raise BadRequest("'month_limit' must be an integer")
+        target_date = payload.get("target_date")
+        if target_date is not None:
+            target_date = _date(payload, "target_date", "%Y-%m")
+        interest_rate = None
+        if payload.get("interest_rate") is not None:
+            interest_rate = _amount(payload, "interest_rate", allow_zero=True)
+        entry = await self._run(
+            self.data_manager.add_debt,
+            _amount(payload), _text(payload, "description"), _date(payload),
+            month_limit, target_date, interest_rate,
+        )
+        return _json(_public(entry), status=201)
+
+    async def payoff_plan(self, request):
+        budget = None
+        if "budget" in request.query:
+            budget = _amount(request.query, "budget")
+        return _json(await self._run(self.debt_manager.get_payoff_plan, budget))
+
+    async def add_debt_payment(self, request):
+        payload = await self._payload(request)
+        debt_id = _object_id(request.match_info["debt_id"])
+        recorded = await self._run(
+            self.data_manager.add_debt_payment, debt_id, _amount(payload), _date(payload),
+        )
+        if not recorded:
+            raise web.HTTPNotFound(text=_dumps({"error": "debt not found"}),
+                                   content_type="application/json")
+        return _json({"recorded": True}, status=201)
+
+    # Goals
+    async def list_goals(self, request):
+        return _json(await self._run(self.data_manager.get_all_goals))
+
+    async def add_goal(self, request):
+        payload = await self._payload(request)
+        deadline = payload.get("deadline")
+        if deadline is not None:
+            deadline = _date(payload, "deadline", "%Y-%m")
+        entry = await self._run(
+            self.data_manager.add_goal,
+            _text(payload, "name"), _amount(payload, "target_amount"),
+            _amount(payload, "monthly_target", allow_zero=True) if "monthly_target" in payload else 0,
+            deadline, _text(payload, "description", ""), _date(payload),
+        )
+        return _json(_public(entry), status=201)
+
+    async def add_goal_contribution(self, request):
+        payload = await self._payload(request)
+        goal_id = _object_id(request.match_info["goal_id"])
+        recorded = await self._run(
+            self.data_manager.add_goal_contribution, goal_id, _amount(payload), _date(payload),
+        )
+        if not recorded:
+            raise web.HTTPNotFound(text=_dumps({"error": "goal not found"}),
+                                   content_type="application/json")
+        return _json({"recorded": True}, status=201)
+
+    # Dashboard
+    async def dashboard_metrics(self, request):
+        return _json(await self._run(self.dashboard.compute_metrics))
+
+    # Incremental sync
+    async def changes(self, request):
+        try:
+            since = int(request.query.get("since", 0))
+            limit = int(request.query.get("limit", 1000))
+        except ValueError:
+            raise BadRequest("'since' and 'limit' must be whole numbers")
+        if since < 0 or not 0 < limit <= MAX_CHANGES_PAGE:
+            raise BadRequest(f"'since' cannot be negative and 'limit' must be 1-{MAX_CHANGES_PAGE}")
+        return _json(await self._run(self.data_manager.changes_since, since, limit))
+
+    # Monitoring
+    async def metrics(self, request):
+        return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": CONTENT_TYPE})
+
+    # Health
+    async def health(self, request):
+        try:
+            stats = await self._run(self.data_manager.get_connection_stats)
+        except PyMongoError as e:
+            return _json({"status": "unavailable", "error": str(e)}, status=503)
+        return _json({"status": "ok", **stats})
+
+
+async def _error_middleware(request, handler):
+    try:
+        return await handler(request)
+    # ValueError covers data-layer validation, e.g. a currency without exchange rates
+    except (BadRequest, ValueError) as e:
+        return _json({"error": str(e)}, status=400)
+
+
+def create_app(data_manager, pool_size=DEFAULT_POOL_SIZE):
+    """Build the aiohttp application around an existing DataManager"""
+    if web is None:
+        raise RuntimeError("The API server requires aiohttp. Install it with: pip install aiohttp")
+
+    api = FinanceAPI(data_manager, pool_size)
+    app = web.Application(middlewares=[web.middleware(_error_middleware)])
+    app.add_routes([
+        web.get("/income", api.list_income),
+        web.post("/income", api.add_income),
+        web.get("/expenses", api.list_expenses),
+        web.post("/expenses", api.add_expense),
+        web.get("/investments", api.list_investments),
+        web.post("/investments", api.add_investment),
+        web.put("/investments/{investment_id}/value", api.update_investment_value),
+        web.get("/debts", api.debt_status),
+        web.post("/debts", api.add_debt),
+        web.get("/debts/payoff", api.payoff_plan),
+        web.post("/debts/{debt_id}/payments", api.add_debt_payment),
+        web.get("/goals", api.list_goals),
+        web.post("/goals", api.add_goal),
+        web.post("/goals/{goal_id}/contributions", api.add_goal_contribution),
+        web.get("/dashboard", api.dashboard_metrics),
+        web.get("/changes", api.changes),
+        web.get("/health", api.health),
+        web.get("/metrics", api.metrics),
+    ])
+
+    async def on_cleanup(app):
+        api.executor.shutdown(wait=True)
+        data_manager.close()
+
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=None, tenant=None):
+    """Run the API server until interrupted"""
+    if web is None:
+        raise RuntimeError("The API server requires aiohttp. Install it with: pip install aiohttp")
+    if pool_size is None:
+        pool_size = int(os.getenv("PFA_API_POOL_SIZE", DEFAULT_POOL_SIZE))
+
+    # One client for the whole process, sized to the worker threads
+    data_manager = DataManager(tenant=tenant, maxPoolSize=pool_size)
+    app = create_app(data_manager, pool_size)
+    web.run_app(app, host=host, port=port)
@@ -0,0 +1,245 @@
+"""
+Backup - Streaming snapshot backups and restores of one tenant's ledger
+
+A backup is a gzip-compressed JSON Lines file: a header line, then one line
+per chunk of up to batch_size documents (one cursor batch), then a trailer
+with per-collection counts. Backups and restores hold a single chunk in
+memory at a time, so the size of the ledger does not matter.
+
+Incremental backups copy only the income and expense entries stamped after
+the previous snapshot started; entries are never edited once written, so
+that is all that can have changed. The other collections are small and are
+copied whole every time.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+from datetime import datetime
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+
+FORMAT_VERSION = 1
+DEFAULT_BATCH_SIZE = 1000
+BACKUP_DIR = 'backups'
+
+# Append-only ledgers: incremental backups only carry their new entries
+INCREMENTAL_COLLECTIONS = ('income', 'expenses')
+
+# Copied whole in every backup; a restore replaces them
+WHOLE_COLLECTIONS = (
+    'recurring_expenses', 'investments', 'debts', 'goals', 'settings',
+    'category_rules', 'fx_rates', 'yearly_totals',
+)
+
+_ARCHIVE_NAME = re.compile(r'(income|expenses)_archive_\d{4}')
+
+
+class BackupError(ValueError):
+    """Raised for unreadable, truncated or incompatible backup files"""
+
+
+def default_backup_path(tenant, kind, now=None):
+    """backups/pfa-<tenant>-<kind>-<YYYYmmdd-HHMMSS>.jsonl.gz"""
+    stamp = (now or datetime.now()).strftime('%Y%m%d-%H%M%S')
+    safe_tenant = re.sub(r'[^\w.-]', '_', tenant)
+    return os.path.join(BACKUP_DIR, f'pfa-{safe_tenant}-{kind}-{stamp}.jsonl.gz')
+
+
+def _write_line(f, record):
+    f.write(json_util.dumps(record))
+    f.write('\n')
+
+
+def backup(data_manager, path=None, incremental=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Stream the tenant's collections to a compressed backup file
+
+    An incremental backup falls back to a full one when there is no earlier
+    snapshot, or when entries were archived since (archiving moves entries
+    between collections, which only a full snapshot captures). Returns a
+    summary with the path, kind, since timestamp and per-collection counts.
+    """
+    tenant = data_manager.tenant
+    if data_manager.journal:
+        # Journaled entries are part of the ledger too
+        data_manager.journal.flush()
+
+    started = datetime.now()
+    versions = data_manager.get_versions('yearly_totals')
+    last = data_manager.get_last_backup()
+    since = None
+    if incremental and last and last.get('versions', {}).get('yearly_totals') == versions['yearly_totals']:
+        since = last['started']
+    kind = 'incremental' if since else 'full'
+
+    archives = sorted(name for name in data_manager.db.list_collection_names() if _ARCHIVE_NAME.fullmatch(name))
+    modes = {name: 'append' if since else 'replace' for name in INCREMENTAL_COLLECTIONS}
+    modes.update({name: 'replace' for name in WHOLE_COLLECTIONS + tuple(archives)})
+
+    path = path or default_backup_path(tenant, kind, started)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    counts = {}
+    temp_path = path + '.part'
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        _write_line(f, {
+            'type': 'header',
+            'format': FORMAT_VERSION,
+            'tenant': tenant,
+            'kind': kind,
+            'since': since,
+            'created': started.isoformat(),
+            'collections': modes,
+        })
+        for name, mode in modes.items():
+            query = {'tenant': tenant}
+            if mode == 'append':
+                query['timestamp'] = {'$gt': since}
+            counts[name] = 0
+            chunk = []
+            for doc in data_manager.db[name].find(query).batch_size(batch_size):
+                chunk.append(doc)
+                if len(chunk) >= batch_size:
+                    _write_line(f, {'type': 'chunk', 'collection': name, 'documents': chunk})
+                    counts[name] += len(chunk)
+                    chunk = []
+            if chunk:
+                _write_line(f, {'type': 'chunk', 'collection': name, 'documents': chunk})
+                counts[name] += len(chunk)
+        _write_line(f, {'type': 'trailer', 'counts': counts})
+    # A file under the final name is always complete
+    os.replace(temp_path, path)
+
+    data_manager.record_backup({
+        'kind': kind,
+        'since': since,
+        'started': started.isoformat(),
+        'finished': datetime.now().isoformat(),
+        'path': os.path.abspath(path),
+        'counts': counts,
+        'versions': versions,
+    })
+    return {'path': path, 'kind': kind, 'since': since, 'counts': counts}
+
+
+def _read_records(path):
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    yield json_util.loads(line)
+                except ValueError:
+                    raise BackupError(f"{path}:{line_number}: not a backup record")
+    except (OSError, EOFError) as e:
+        # gzip raises these for non-gzip or cut-off files
+        raise BackupError(f"{path}: {e}")
+
+
+def _tenant_id(doc_id, tenant):
+    """The _id a document from another tenant's backup gets under tenant
+
+    Derived from the original, so restoring the same files again (or an
+    archived entry next to its live copy) maps to the same _id.
+    """
+    if isinstance(doc_id, ObjectId):
+        return ObjectId(hashlib.sha256(f'{tenant}:{doc_id}'.encode()).digest()[:12])
+    return f'{tenant}:{doc_id}'
+
+
+def _insert_ordered(collection, documents, skip_existing):
+    """insert_many in order; with skip_existing, documents already present are passed over"""
+    inserted = 0
+    while documents:
+        try:
+            collection.insert_many(documents, ordered=True)
+            return inserted + len(documents)
+        except BulkWriteError as e:
+            error = e.details['writeErrors'][0]
+            if not skip_existing or error.get('code') != 11000:
+                raise BackupError(f"{collection.name}: {error.get('errmsg', 'write failed')}")
+            # Everything before the duplicate went in; carry on after it
+            inserted += error['index']
+            documents = documents[error['index'] + 1:]
+    return inserted
+
+
+def _read_header(records, path):
+    header = next(records, None)
+    if not header or header.get('type') != 'header':
+        raise BackupError(f"{path}: missing backup header")
+    if header.get('format') != FORMAT_VERSION:
+        raise BackupError(f"{path}: unsupported backup format {header.get('format')}")
+    return header
+
+
+def verify_backup(path):
+    """Read a backup file end to end and check it is complete
+
+    Returns its header. Raises BackupError if the file is cut off or its
+    chunks do not add up to the counts in its trailer.
+    """
+    records = _read_records(path)
+    header = _read_header(records, path)
+    counts = {name: 0 for name in header['collections']}
+    for record in records:
+        if record.get('type') == 'trailer':
+            if record['counts'] != counts:
+                raise BackupError(f"{path}: document counts do not match the trailer")
+            return header
+        if record.get('collection') not in counts:
+            raise BackupError(f"{path}: chunk for undeclared collection '{record.get('collection')}'")
+        counts[record['collection']] += len(record['documents'])
+    raise BackupError(f"{path}: backup is truncated")
+
+
+def restore(data_manager, path, batch_size=DEFAULT_BATCH_SIZE):
+    """Load a backup file into the current tenant
+
+    The file is verified in a first pass, so a damaged backup never
+    replaces anything. Collections marked "replace" lose their current
+    documents first; "append" collections (the entries of an incremental
+    backup) keep them. Restore a full backup, then its incremental ones in
+    order. A backup of another tenant is loaded with new _ids derived from
+    the originals. Returns a summary with the kind and per-collection
+    inserted counts.
+    """
+    verify_backup(path)
+    records = _read_records(path)
+    header = _read_header(records, path)
+
+    modes = dict(header['collections'])
+    if header['kind'] == 'full':
+        # Archive years created after the backup would double-count its entries
+        for name in data_manager.db.list_collection_names():
+            if _ARCHIVE_NAME.fullmatch(name):
+                modes.setdefault(name, 'replace')
+    counts = {name: 0 for name in modes}
+    cleared = set()
+    for record in records:
+        if record.get('type') == 'trailer':
+            break
+        name = record['collection']
+        collection = data_manager.db[name]
+        if modes[name] == 'replace' and name not in cleared:
+            collection.delete_many({'tenant': data_manager.tenant})
+            cleared.add(name)
+        documents = record['documents']
+        if header['tenant'] != data_manager.tenant:
+            # Restored under another tenant key: the originals' _ids may still be in use
+            for doc in documents:
+                doc['_id'] = _tenant_id(doc['_id'], data_manager.tenant)
+        for doc in documents:
+            doc['tenant'] = data_manager.tenant
+        for i in range(0, len(documents), batch_size):
+            counts[name] += _insert_ordered(collection, documents[i:i + batch_size], modes[name] == 'append')
+
+    # Replaced collections that were empty in the backup are emptied too
+    for name, mode in modes.items():
+        if mode == 'replace' and name not in cleared:
+            data_manager.db[name].delete_many({'tenant': data_manager.tenant})
+    data_manager.mark_restored(list(modes))
+    return {'path': path, 'kind': header['kind'], 'since': header['since'], 'counts': counts}
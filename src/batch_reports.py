@@ -0,0 +1,112 @@
+"""
+Batch Reports - Dashboard reports for many tenants in parallel
+
+Tenants are split into chunks and the chunks are spread over a
+ProcessPoolExecutor. Each worker process opens one pooled MongoClient when it
+starts and shares it between the data managers of all the tenants it is
+given, so a run holds one connection pool per worker instead of one per
+tenant.
+"""
+
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from pymongo.errors import PyMongoError
+
+from connection import create_client
+from dashboard import Dashboard
+from data_manager import DataManager
+
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CHUNK_SIZE = 50
+
+# The worker process's client, opened by _init_worker
+_client = None
+
+
+def _init_worker(connection_string, pool_size):
+    global _client
+    _client = create_client(connection_string, maxPoolSize=pool_size)
+
+
+def report_filename(tenant):
+    """File name for a tenant's report (tenant keys may contain any character)"""
+    return re.sub(r"[^\w.-]", "_", tenant) + ".json"
+
+
+def _report_chunk(tenants, output_dir):
+    """Dashboard metrics for each tenant: [(tenant, seconds, metrics or None, error or None)]"""
+    results = []
+    for tenant in tenants:
+        started = time.perf_counter()
+        try:
+            # No journal or report cache: each tenant is read once
+            data_manager = DataManager(client=_client, tenant=tenant, journal_path="", report_cache_path="")
+            try:
+                metrics = Dashboard(data_manager).compute_metrics()
+            finally:
+                data_manager.close()
+            if output_dir:
+                with open(os.path.join(output_dir, report_filename(tenant)), "w", encoding="utf-8") as f:
+                    json.dump({"tenant": tenant, **metrics}, f, default=str)
+                metrics = None
+            results.append((tenant, time.perf_counter() - started, metrics, None))
+        except (PyMongoError, OSError, ValueError) as e:
+            # One broken tenant should not stop the batch
+            results.append((tenant, time.perf_counter() - started, None, str(e)))
+    return results
+
+
+def generate_reports(tenants, connection_string=None, workers=None, pool_size=DEFAULT_POOL_SIZE,
+                     chunk_size=DEFAULT_CHUNK_SIZE, output_dir=None):
+    """Compute the dashboard of every tenant and measure throughput
+
+    With output_dir each report is written to <output_dir>/<tenant>.json;
+    otherwise reports are returned under "reports". workers=1 runs
+    in-process; otherwise chunks of tenants are spread over a process pool
+    (default: one worker per CPU). Returns the reports, per-tenant errors
+    and throughput figures (tenants per second and latency percentiles).
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    tenants = list(tenants)
+    chunks = [tenants[i:i + chunk_size] for i in range(0, len(tenants), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(chunks)))
+
+    started = time.perf_counter()
+    if workers == 1:
+        _init_worker(connection_string, pool_size)
+        try:
+            results = [row for chunk in chunks for row in _report_chunk(chunk, output_dir)]
+        finally:
+            _client.close()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(connection_string, pool_size)) as executor:
+            futures = [executor.submit(_report_chunk, chunk, output_dir) for chunk in chunks]
+            results = [row for future in futures for row in future.result()]
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([seconds for _, seconds, _, _ in results]) * 1000
+    summary = {
+        "tenants": len(tenants),
+        "succeeded": sum(1 for row in results if row[3] is None),
+        "errors": {tenant: error for tenant, _, _, error in results if error is not None},
+        "workers": workers,
+        "elapsed_seconds": elapsed,
+        "tenants_per_second": len(tenants) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": float(latencies.mean()),
+            "p50": float(np.percentile(latencies, 50)),
+            "p95": float(np.percentile(latencies, 95)),
+            "max": float(latencies.max()),
+        } if len(latencies) else None,
+    }
+    if not output_dir:
+        summary["reports"] = {tenant: metrics for tenant, _, metrics, error in results if error is None}
+    return summary
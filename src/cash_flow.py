@@ -0,0 +1,265 @@
+"""
+Cash Flow - Day-by-day balance projection from recurring items and history
+
+Every flow is laid out on one NumPy array with a slot per day of the
+horizon: recurring expenses on their scheduled dates, income spread over the
+days of the month it usually arrives on (scaled by the calendar month's
+historical level), everyday spending spread evenly, and debt and goal
+targets on the first of each month. Income and everyday spending are then
+perturbed per month over a few thousand paths to estimate shortfall risk.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 36
+DEFAULT_PATHS = 2000
+# Months of history used for seasonality and spending levels
+HISTORY_MONTHS = 36
+# Month-to-month variation assumed when there are too few months to measure it
+DEFAULT_VARIATION = 0.1
+MIN_HISTORY_MONTHS = 3
+LOWEST_POINTS = 5
+
+RECURRING_SUFFIX = "(Recurring)"
+
+
+def _month_start(months):
+    return months.astype("datetime64[D]")
+
+
+def recurring_occurrences(entry, start, end, today):
+    """Dates in [start, end) on which a recurring expense is due
+
+    Schedules are anchored on the day the recurring expense was created.
+    Unknown frequencies are treated as monthly, like the monthly estimate
+    in the recurring expense view. A monthly expense not yet processed this
+    month whose day has passed is due on start.
+    """
+    anchor = np.datetime64(entry['created_date'][:10], "D")
+    frequency = entry['frequency'].lower()
+
+    if frequency == "weekly":
+        first = anchor + max(0, -(-(start - anchor).astype(int) // 7)) * 7
+        return np.arange(first, end, 7)
+
+    anchor_month = anchor.astype("datetime64[M]")
+    day = (anchor - _month_start(anchor_month)).astype(int)
+    step = 12 if frequency == "yearly" else 1
+    months = np.arange(anchor_month, end.astype("datetime64[M]") + 1, step)
+    # Clip the anchor day to each month's length (e.g. the 31st in February)
+    lengths = (_month_start(months + 1) - _month_start(months)).astype(int)
+    dates = _month_start(months) + np.minimum(day, lengths - 1)
+    due = dates[(dates >= start) & (dates < end)]
+
+    if step == 1:
+        # Processing is tracked per month: once done, this month's occurrence
+        # is paid; if its day has passed without it, it is due right away
+        this_month = today.astype("datetime64[M]")
+        this_months = due.astype("datetime64[M]") == this_month
+        if (entry.get('last_processed') or "")[:7] == str(this_month):
+            due = due[~this_months]
+        elif anchor <= today and not this_months.any():
+            due = np.concatenate(([start], due))
+    return due
+
+
+def monthly_profile(entries, today, history_months=HISTORY_MONTHS):
+    """Typical monthly totals of a set of entries
+
+    Returns (level by calendar month [12], month-to-month variation, amount
+    so far this month, share of the amount landing on each day of the month
+    [31]). With a year or more of history the level follows the calendar
+    month; otherwise it is the flat average of the complete months.
+    """
+    this_month = today.astype("datetime64[M]")
+    if not entries:
+        return np.zeros(12), DEFAULT_VARIATION, 0.0, np.full(31, 1 / 31)
+
+    dates = np.array([entry['date'][:10] for entry in entries], dtype="datetime64[D]")
+    amounts = np.array([entry['amount'] for entry in entries], dtype=float)
+    months = dates.astype("datetime64[M]")
+
+    so_far = float(amounts[months == this_month].sum())
+    days = (dates - _month_start(months)).astype(int)
+    day_share = np.bincount(days, weights=amounts, minlength=31)[:31]
+    day_share = day_share / day_share.sum() if day_share.sum() > 0 else np.full(31, 1 / 31)
+
+    # Complete months only, from the first month with entries
+    first = max(months.min(), this_month - history_months)
+    window = (months >= first) & (months < this_month)
+    n_months = int((this_month - first).astype(int))
+    if n_months <= 0:
+        # Only this month so far: take it as the level
+        return np.full(12, so_far), DEFAULT_VARIATION, so_far, day_share
+
+    totals = np.bincount((months[window] - first).astype(int), weights=amounts[window], minlength=n_months)
+    calendar = (np.arange(first, this_month).astype(int)) % 12
+    level = np.full(12, totals.mean())
+    if n_months >= 12:
+        sums = np.bincount(calendar, weights=totals, minlength=12)
+        counts = np.bincount(calendar, minlength=12)
+        level = np.where(counts > 0, sums / np.maximum(counts, 1), level)
+
+    variation = DEFAULT_VARIATION
+    expected = level[calendar]
+    if n_months >= MIN_HISTORY_MONTHS and expected.mean() > 0:
+        ratios = totals[expected > 0] / expected[expected > 0]
+        if len(ratios) >= MIN_HISTORY_MONTHS:
+            variation = float(ratios.std(ddof=1))
+    return level, variation, so_far, day_share
+
+
+def debt_payments(debts, repayment_goal, n_months, today):
+    """Planned debt repayment for each month of the horizon
+
+    Each month pays the larger of the repayment goal and what the target
+    dates require, until the remaining balances are paid off.
+    """
+    remaining = sum(max(0, d['amount'] - d.get('paid', 0)) for d in debts)
+    required = 0.0
+    this_month = today.astype("datetime64[M]")
+    for debt in debts:
+        left = debt['amount'] - debt.get('paid', 0)
+        if left <= 0 or not debt.get('target_date'):
+            continue
+        months_left = (np.datetime64(debt['target_date'][:7], "M") - this_month).astype(int) + 1
+        required += left / max(1, months_left)
+
+    monthly = max(repayment_goal or 0, required)
+    payments = np.zeros(n_months)
+    if monthly <= 0:
+        return payments
+    paid_before = np.arange(n_months) * monthly
+    return np.clip(remaining - paid_before, 0, monthly)
+
+
+def goal_contributions(goals, n_months, today):
+    """Planned goal contributions for each month, stopping at each target or deadline"""
+    contributions = np.zeros(n_months)
+    this_month = today.astype("datetime64[M]")
+    offsets = np.arange(n_months)
+    for goal in goals:
+        monthly = goal.get('monthly_target') or 0
+        left = goal['target_amount'] - goal.get('saved', 0)
+        if monthly <= 0 or left <= 0:
+            continue
+        planned = np.clip(left - offsets * monthly, 0, monthly)
+        if goal.get('deadline'):
+            last = (np.datetime64(goal['deadline'][:7], "M") - this_month).astype(int)
+            planned[offsets > last] = 0
+        contributions += planned
+    return contributions
+
+
+def forecast_cash_flow(starting_balance, recurring, income, expenses, debts=(), repayment_goal=0,
+                       goals=(), months=DEFAULT_MONTHS, n_paths=DEFAULT_PATHS, seed=None, now=None):
+    """Project the cash balance day by day from tomorrow to the end of the horizon
+
+    income and expenses are past entries; expenses created from recurring
+    templates are left out of everyday spending since the schedule covers
+    them. Returns per-month totals, the lowest balance points, the first
+    projected shortfall date and the share of simulated paths in which the
+    balance goes negative.
+    """
+    months = max(1, min(MAX_MONTHS, months))
+    now = now or datetime.now()
+    today = np.datetime64(now.date(), "D")
+    start = today + 1
+    first_month = start.astype("datetime64[M]")
+    end = _month_start(first_month + months)
+
+    days = np.arange(start, end)
+    day_months = days.astype("datetime64[M]")
+    month_index = (day_months - first_month).astype(int)
+    day_of_month = (days - _month_start(day_months)).astype(int)
+    last_day = (days + 1).astype("datetime64[M]") != day_months
+    calendar = (np.arange(first_month, first_month + months).astype(int)) % 12
+    current_month_open = first_month == today.astype("datetime64[M]")
+
+    def spread(level, so_far, weights):
+        """Daily amounts for monthly levels, distributed by weights within each month"""
+        month_totals = level[calendar].copy()
+        if current_month_open:
+            month_totals[0] = max(0.0, month_totals[0] - so_far)
+        weight_sums = np.bincount(month_index, weights=weights, minlength=months)
+        scale = np.divide(month_totals, weight_sums, out=np.zeros(months), where=weight_sums > 0)
+        return scale[month_index] * weights
+
+    # Income lands on the days it usually arrives; days past a short month's
+    # end fold into its last day
+    income_level, income_variation, income_so_far, day_share = monthly_profile(income, today)
+    tail_share = np.cumsum(day_share[::-1])[::-1]
+    income_daily = spread(income_level, income_so_far,
+                          np.where(last_day, tail_share[day_of_month], day_share[day_of_month]))
+
+    everyday = [e for e in expenses if not (e.get('description') or "").endswith(RECURRING_SUFFIX)]
+    spend_level, spend_variation, spent_so_far, _ = monthly_profile(everyday, today)
+    spend_daily = spread(spend_level, spent_so_far, np.ones(len(days)))
+
+    recurring_daily = np.zeros(len(days))
+    for entry in recurring:
+        due = recurring_occurrences(entry, start, end, today)
+        np.add.at(recurring_daily, (due - start).astype(int), entry['amount'])
+
+    # Debt and goal targets are paid on the first of each month (tomorrow for this one)
+    month_first_day = np.searchsorted(month_index, np.arange(months))
+    debt_monthly = debt_payments(debts, repayment_goal, months, today)
+    goal_monthly = goal_contributions(goals, months, today)
+    planned_daily = np.zeros(len(days))
+    np.add.at(planned_daily, month_first_day, debt_monthly + goal_monthly)
+
+    fixed_daily = -recurring_daily - planned_daily
+    balance = starting_balance + np.cumsum(income_daily - spend_daily + fixed_daily)
+
+    # Shortfall risk: scale each month's income and everyday spending
+    rng = np.random.default_rng(seed)
+    income_factor = np.maximum(0, 1 + income_variation * rng.standard_normal((n_paths, months)))
+    spend_factor = np.maximum(0, 1 + spend_variation * rng.standard_normal((n_paths, months)))
+    flows = income_daily * income_factor[:, month_index]
+    flows -= spend_daily * spend_factor[:, month_index]
+    flows += fixed_daily
+    paths = np.cumsum(flows, axis=1)
+    paths += starting_balance
+    path_month_min = np.minimum.reduceat(paths, month_first_day, axis=1)
+
+    month_min_pos = [
+        month_first_day[m] + int(np.argmin(balance[month_index == m]))
+        for m in range(months)
+    ]
+    month_end_pos = np.append(month_first_day[1:], len(days)) - 1
+    monthly = []
+    for m in range(months):
+        mask = month_index == m
+        monthly.append({
+            "month": str(first_month + m),
+            "income": float(income_daily[mask].sum()),
+            "recurring": float(recurring_daily[mask].sum()),
+            "everyday": float(spend_daily[mask].sum()),
+            "debt_payments": float(debt_monthly[m]),
+            "goal_contributions": float(goal_monthly[m]),
+            "end_balance": float(balance[month_end_pos[m]]),
+            "lowest_balance": float(balance[month_min_pos[m]]),
+            "lowest_date": str(days[month_min_pos[m]]),
+            "shortfall_probability": float((path_month_min[:, m] < 0).mean()),
+        })
+
+    lowest = sorted(monthly, key=lambda row: row['lowest_balance'])[:LOWEST_POINTS]
+    negative = np.flatnonzero(balance < 0)
+    return {
+        "start_date": str(start),
+        "end_date": str(days[-1]),
+        "months": months,
+        "starting_balance": float(starting_balance),
+        "ending_balance": float(balance[-1]),
+        "monthly": monthly,
+        "lowest": [{"date": row['lowest_date'], "balance": row['lowest_balance']} for row in lowest],
+        "first_shortfall_date": str(days[negative[0]]) if len(negative) else None,
+        "shortfall_probability": float((paths.min(axis=1) < 0).mean()),
+        "income_variation": income_variation,
+        "everyday_variation": spend_variation,
+        "paths": n_paths,
+    }
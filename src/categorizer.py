@@ -0,0 +1,211 @@
+"""
+Categorizer - Suggest expense categories from descriptions
+
+User rules (keywords, merchant names and regular expressions) are compiled into
+a few combined regexes, so a description is scanned once per rule kind no
+matter how many rules exist. Exact descriptions seen before are answered from
+mappings learned from past expenses, and results are memoised in an LRU cache
+because bank exports repeat the same descriptions over and over.
+"""
+
+import re
+from functools import lru_cache
+
+
+RULE_KINDS = ("keyword", "merchant", "regex")
+DEFAULT_CACHE_SIZE = 65536
+
+_NOISE = re.compile(r"[\d#*]+|[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_description(description):
+    """Lower-case a description and drop digits, punctuation and repeated spaces
+
+    Card purchases often carry store numbers or reference codes
+    ("AMAZON MKTPL*2K4 #1234"), which would otherwise make every entry unique.
+    """
+    return _SPACES.sub(" ", _NOISE.sub(" ", description.lower())).strip()
+
+
+def _trie_pattern(words):
+    """Regex matching any of the words, factored into a character trie
+
+    Python's re tries alternatives one by one, so a flat "a|b|c|..." over
+    hundreds of keywords is slow; sharing prefixes keeps each position of the
+    scan to a single walk down the trie.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if optional else group
+
+    return emit(trie)
+
+
+def _isolate_groups(pattern, offset, prefix):
+    """Rewrite a user regex to sit inside the combined alternation
+
+    Group names get the rule's prefix, so two rules can both use (?P<x>...),
+    and numbered backreferences are shifted past the groups that come before
+    the rule. Character classes and escapes are copied as they are.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    in_class = False
+    while i < n:
+        char = pattern[i]
+        if char == "\\" and i + 1 < n:
+            digits = re.match(r"\d{1,3}", pattern[i + 1:])
+            if not in_class and digits and digits.group()[0] != "0" and not re.fullmatch(r"[0-7]{3}", digits.group()):
+                number = digits.group()[:2]
+                # Wrapped so the digits that follow are not read as part of the number
+                out.append(f"(?:\\{int(number) + offset})")
+                i += 1 + len(number)
+                continue
+            out.append(pattern[i:i + 2])
+            i += 2
+            continue
+        if in_class:
+            in_class = char != "]"
+            out.append(char)
+            i += 1
+            continue
+        if char == "[":
+            # A ] right after [ or [^ is a literal, not the end of the class
+            start = re.match(r"\[\^?\]?", pattern[i:]).group()
+            out.append(start)
+            i += len(start)
+            in_class = True
+            continue
+        reference = re.match(r"\(\?(P<|P=|\()(\w+)", pattern[i:])
+        if reference:
+            kind, name = reference.groups()
+            if name.isdigit():
+                name = str(int(name) + offset)
+            else:
+                name = prefix + name
+            out.append(f"(?{kind}{name}")
+            i += reference.end()
+            continue
+        out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def compile_rules(rules):
+    """Compile rules into (merchant regex, keyword regex, user regex) and lookup tables
+
+    Keyword and merchant rules become one trie regex each over the normalized
+    description, with the matched text mapped back to its category. Regex
+    rules are joined into one alternation over the raw description; the
+    matched group name gives the rule.
+    """
+    merchants = {}
+    keywords = {}
+    regex_rules = []
+    for rule in rules:
+        if rule['kind'] == "regex":
+            regex_rules.append(rule)
+            continue
+        key = normalize_description(rule['pattern'])
+        if key:
+            table = merchants if rule['kind'] == "merchant" else keywords
+            table.setdefault(key, rule['category'])
+
+    merchant_regex = re.compile(r"^(?:" + _trie_pattern(merchants) + r")\b") if merchants else None
+    keyword_regex = re.compile(r"\b(?:" + _trie_pattern(keywords) + r")\b") if keywords else None
+    user_regex = None
+    if regex_rules:
+        # Each rule becomes group r<i>; its own groups are numbered after the ones before it
+        parts = []
+        offset = 0
+        for i, rule in enumerate(regex_rules):
+            offset += 1
+            parts.append(f"(?P<r{i}>{_isolate_groups(rule['pattern'], offset, f'_u{i}_')})")
+            offset += re.compile(rule['pattern']).groups
+        user_regex = re.compile("|".join(parts), re.IGNORECASE)
+    return {
+        "merchant_regex": merchant_regex,
+        "merchants": merchants,
+        "keyword_regex": keyword_regex,
+        "keywords": keywords,
+        "user_regex": user_regex,
+        "regex_categories": [rule['category'] for rule in regex_rules],
+    }
+
+
+def learn_mappings(history):
+    """Most frequent category for each normalized description
+
+    history is an iterable of {"description", "category", "count"} rows
+    (count defaults to 1).
+    """
+    votes = {}
+    for row in history:
+        key = normalize_description(row.get('description') or "")
+        if not key:
+            continue
+        counts = votes.setdefault(key, {})
+        counts[row['category']] = counts.get(row['category'], 0) + row.get('count', 1)
+    return {key: max(counts, key=counts.get) for key, counts in votes.items()}
+
+
+class Categorizer:
+    """Classify expense descriptions with compiled rules and learned mappings
+
+    Learned mappings are checked first (they reflect what the user actually
+    chose for that exact description), then merchant rules, regex rules and
+    finally keywords. Among keywords the earliest match in the description
+    wins; among regex rules the first one listed.
+    """
+
+    def __init__(self, rules=(), learned=None, cache_size=DEFAULT_CACHE_SIZE):
+        for rule in rules:
+            if rule['kind'] not in RULE_KINDS:
+                raise ValueError(f"Unknown rule kind '{rule['kind']}'")
+        self.rules = list(rules)
+        self.learned = learned or {}
+        self._compiled = compile_rules(self.rules)
+        self.categorize = lru_cache(maxsize=cache_size)(self._categorize)
+
+    def _categorize(self, description):
+        key = normalize_description(description)
+        if not key:
+            return None
+        category = self.learned.get(key)
+        if category is not None:
+            return category
+
+        compiled = self._compiled
+        if compiled["merchant_regex"] is not None:
+            match = compiled["merchant_regex"].match(key)
+            if match:
+                return compiled["merchants"][match.group()]
+        if compiled["user_regex"] is not None:
+            # Regex rules see the raw text, since they may rely on digits or punctuation
+            match = compiled["user_regex"].search(description)
+            if match:
+                return compiled["regex_categories"][int(match.lastgroup[1:])]
+        if compiled["keyword_regex"] is not None:
+            match = compiled["keyword_regex"].search(key)
+            if match:
+                return compiled["keywords"][match.group()]
+        return None
+
+    def categorize_many(self, descriptions):
+        """Categories (or None) for a sequence of descriptions"""
+        categorize = self.categorize
+        return [categorize(description) for description in descriptions]
@@ -0,0 +1,655 @@
+"""
+Command Line Interface - Non-interactive subcommands for scripting and automation
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from pymongo.errors import OperationFailure
+
+from backup import DEFAULT_BATCH_SIZE, backup, restore
+from batch_reports import DEFAULT_CHUNK_SIZE, DEFAULT_POOL_SIZE, generate_reports
+from dashboard import Dashboard
+from fx import load_rates_csv
+from debt_manager import DebtManager
+from expenses import ExpenseManager
+from income import IncomeManager
+from investments import InvestmentManager
+from data_manager import ARCHIVED_COLLECTIONS, SEARCHABLE_COLLECTIONS, DataManager
+from report_renderer import OUTPUT_FORMATS, Column, Report, ReportRenderer
+from search import search_report
+
+
+def _positive_amount(value):
+    """argparse type for strictly positive amounts"""
+    try:
+        amount = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid amount: {value!r}")
+    if amount <= 0:
+        raise argparse.ArgumentTypeError("amount must be positive")
+    return amount
+
+
+def _budget_amount(value):
+    """argparse type for budgets: zero (remove the budget) or a positive amount"""
+    try:
+        amount = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid amount: {value!r}")
+    if amount < 0:
+        raise argparse.ArgumentTypeError("budget cannot be negative")
+    return amount
+
+
+def _positive_int(value):
+    """argparse type for counts of at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def _iso_date(value):
+    """argparse type for YYYY-MM-DD dates"""
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}, expected YYYY-MM-DD")
+    return value
+
+
+def _print_json(data):
+    """Write data as JSON to stdout (ObjectIds and dates become strings)"""
+    json.dump(data, sys.stdout, indent=2, default=str)
+    sys.stdout.write("\n")
+
+
+def cmd_add_income(data_manager, args):
+    date = args.date or datetime.now().strftime("%Y-%m-%d")
+    entry = data_manager.add_income(args.amount, args.source, date, args.description, args.currency)
+    if args.json:
+        _print_json(entry)
+    else:
+        amount = f"{args.amount:,.2f} {entry['currency']}" if args.currency else f"{data_manager.get_currency()}{args.amount:,.2f}"
+        print(f"Income added: {amount} from {args.source} on {date}")
+
+
+def cmd_add_expense(data_manager, args):
+    date = args.date or datetime.now().strftime("%Y-%m-%d")
+    entry = data_manager.add_expense(args.amount, args.category, date, args.description, args.currency)
+    if args.json:
+        _print_json(entry)
+    else:
+        amount = f"{args.amount:,.2f} {entry['currency']}" if args.currency else f"{data_manager.get_currency()}{args.amount:,.2f}"
+        print(f"Expense added: {amount} in {args.category} on {date}")
+
+
+def cmd_dashboard(data_manager, args):
+    dashboard = Dashboard(data_manager)
+    if args.watch:
+        dashboard.watch_dashboard()
+        return
+    metrics = dashboard.compute_metrics()
+    if args.json:
+        _print_json(metrics)
+    else:
+        dashboard.render_dashboard(metrics)
+
+
+def cmd_forecast(data_manager, args):
+    dashboard = Dashboard(data_manager)
+    if args.json:
+        _print_json(dashboard.get_cash_flow_forecast(args.months, args.balance))
+    else:
+        dashboard.view_cash_flow_forecast(args.months, args.balance)
+
+
+def cmd_debts(data_manager, args):
+    debt_manager = DebtManager(data_manager)
+    if args.json:
+        _print_json(debt_manager.get_debt_status())
+    else:
+        debt_manager.view_debt_status()
+
+
+def cmd_payoff_plan(data_manager, args):
+    debt_manager = DebtManager(data_manager)
+    if args.json:
+        _print_json(debt_manager.get_payoff_plan(args.budget))
+    else:
+        debt_manager.view_payoff_plan(args.budget)
+
+
+def cmd_simulate_portfolio(data_manager, args):
+    projections = InvestmentManager(data_manager).get_purpose_projections(
+        args.years, args.paths, args.workers)
+    if args.json:
+        _print_json(projections)
+        return
+    currency = data_manager.get_currency()
+    for purpose in sorted(projections):
+        bands = projections[purpose]['bands']
+        low, mid, high = min(bands), 50, max(bands)
+        print(f"{purpose}: in {args.years} years "
+              f"{currency}{bands[low][-1]:,.0f} (p{low}) / "
+              f"{currency}{bands[mid][-1]:,.0f} (median) / "
+              f"{currency}{bands[high][-1]:,.0f} (p{high})")
+
+
+def cmd_apply_recurring(data_manager, args):
+    result = ExpenseManager(data_manager).apply_recurring_expenses()
+    if args.json:
+        _print_json(result)
+    else:
+        print(f"Applied {len(result['applied'])} recurring expense(s), "
+              f"skipped {len(result['skipped'])} already processed this month")
+
+
+def cmd_import_expenses(data_manager, args):
+    entries = []
+    lines = []
+    problems = []
+    with open(args.file, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            try:
+                amount = float(row['amount'])
+                datetime.strptime(row['date'], "%Y-%m-%d")
+            except (KeyError, TypeError, ValueError):
+                problems.append((line, "skipped, needs a YYYY-MM-DD date and a numeric amount"))
+                continue
+            entries.append({
+                "amount": amount,
+                "date": row['date'],
+                "description": (row.get('description') or "").strip(),
+                "category": (row.get('category') or "").strip(),
+                "currency": (row.get('currency') or "").strip() or None,
+            })
+            lines.append(line)
+
+    uncategorized = ExpenseManager(data_manager).categorize_entries(entries, args.default_category)
+    unmatched = {id(entry) for entry in uncategorized}
+    problems.extend(
+        (line, f"matched no rule: {entry['date']}  {entry['description']}")
+        for line, entry in zip(lines, entries) if id(entry) in unmatched
+    )
+    # Diagnostics come in file order, ahead of the outcome
+    for line, problem in sorted(problems):
+        print(f"{args.file}:{line}: {problem}", file=sys.stderr)
+    if uncategorized:
+        print(f"{len(uncategorized)} entries matched no rule; use --default-category "
+              f"or add rules, nothing was imported", file=sys.stderr)
+        return 1
+    if not entries:
+        print(f"{args.file}: no expenses to import", file=sys.stderr)
+        return 1
+    if not args.dry_run:
+        data_manager.add_expenses(entries)
+
+    if args.json:
+        _print_json({"imported": 0 if args.dry_run else len(entries), "entries": entries})
+        return
+    by_category = {}
+    for entry in entries:
+        by_category[entry['category']] = by_category.get(entry['category'], 0) + 1
+    verb = "Would import" if args.dry_run else "Imported"
+    print(f"{verb} {len(entries)} expenses: " +
+          ", ".join(f"{category} {count}" for category, count in sorted(by_category.items())))
+
+
+def cmd_import_rates(data_manager, args):
+    count = data_manager.import_fx_rates(load_rates_csv(args.file), args.base)
+    if args.json:
+        _print_json({"imported": count, "currencies": data_manager.get_fx_table().currencies()})
+    else:
+        print(f"Imported {count} exchange rates "
+              f"({', '.join(data_manager.get_fx_table().currencies())})")
+
+
+def _render_listing(args, render):
+    """Run a listing view against stdout or the --output file"""
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8", buffering=1 << 16) as stream:
+            render(args.format, stream)
+    else:
+        render(args.format, None)
+
+
+def cmd_list_income(data_manager, args):
+    manager = IncomeManager(data_manager)
+    _render_listing(args, lambda fmt, stream: manager.view_all_income(fmt, stream))
+
+
+def cmd_list_expenses(data_manager, args):
+    manager = ExpenseManager(data_manager)
+    _render_listing(args, lambda fmt, stream: manager.view_all_expenses(fmt, stream))
+
+
+def cmd_repayments(data_manager, args):
+    manager = DebtManager(data_manager)
+    _render_listing(args, lambda fmt, stream: manager.view_repayment_history(args.limit, fmt, stream))
+
+
+def _archive_cutoff(args):
+    """First date kept live: --before, or the start of the year --keep-years back"""
+    if args.before:
+        cutoff = args.before
+    else:
+        keep_years = args.keep_years
+        if keep_years is None:
+            keep_years = int(os.getenv('PFA_ARCHIVE_KEEP_YEARS', '2'))
+        cutoff = f"{datetime.now().year - keep_years + 1:04d}-01-01"
+    # The current month always stays live
+    return min(cutoff, datetime.now().strftime("%Y-%m-01"))
+
+
+def cmd_archive(data_manager, args):
+    cutoff = _archive_cutoff(args)
+    result = {
+        name: data_manager.archive_entries(name, cutoff, args.batch_size)
+        for name in ARCHIVED_COLLECTIONS
+    }
+    if args.json:
+        _print_json({"cutoff": cutoff, "moved": result})
+        return
+    for name, moved in result.items():
+        if not moved:
+            print(f"{name}: nothing dated before {cutoff}")
+        for year, count in moved.items():
+            print(f"{name}: archived {count} entries from {year}")
+
+
+def cmd_archived(data_manager, args):
+    currency = data_manager.get_currency()
+    report = Report("ARCHIVED ENTRIES")
+    if args.collection:
+        if not args.year:
+            print("A year is required to list archived entries", file=sys.stderr)
+            return 1
+        group_field = ARCHIVED_COLLECTIONS[args.collection]
+        report.add_section(f"{args.collection.upper()} {args.year}", [
+            Column("date", "Date"),
+            Column(group_field, group_field.title()),
+            Column("amount", "Amount", kind="money"),
+            Column("description", "Description"),
+        ], sorted(data_manager.get_archived_entries(args.collection, args.year),
+                  key=lambda entry: entry['date']))
+    else:
+        report.add_section("YEARLY TOTALS", [
+            Column("collection", "Collection"),
+            Column("year", "Year"),
+            Column("count", "Entries"),
+            Column("total", "Total", kind="money"),
+        ], data_manager.get_archived_totals())
+    _render_listing(args, lambda fmt, stream: ReportRenderer(stream, fmt, currency).render(report))
+
+
+def cmd_search(data_manager, args):
+    result = data_manager.search_entries(
+        " ".join(args.text), args.type, args.min_amount, args.max_amount,
+        args.start, args.end, args.category, args.page, args.page_size,
+    )
+    report = search_report(result, " ".join(args.text))
+    currency = data_manager.get_currency()
+    _render_listing(args, lambda fmt, stream: ReportRenderer(stream, fmt, currency).render(report))
+
+
+def cmd_budgets(data_manager, args):
+    manager = ExpenseManager(data_manager)
+    _render_listing(args, lambda fmt, stream: manager.view_budgets(fmt, stream))
+
+
+def cmd_set_budget(data_manager, args):
+    data_manager.set_category_budget(args.category, args.amount)
+    if args.amount:
+        print(f"Monthly budget for {args.category} set to {data_manager.get_currency()}{args.amount:,.2f}")
+    else:
+        print(f"Budget for {args.category} removed")
+
+
+def cmd_init_db(data_manager, args):
+    data_manager.ensure_indexes()
+    recovered = data_manager.recover_units(timedelta(0))
+    stamped = data_manager.backfill_revisions()
+    sharded = []
+    if args.shard:
+        try:
+            sharded = data_manager.shard_collections()
+        except OperationFailure as e:
+            raise ValueError(f"sharding needs a sharded cluster (connect through mongos): {e}")
+    if args.json:
+        _print_json({"indexes": True, "units_recovered": recovered, "revisions_backfilled": stamped, "sharded": sharded})
+        return
+    print("Tenant indexes are in place")
+    if recovered:
+        print(f"Finished {recovered} interrupted unit(s) of work")
+    if stamped:
+        print(f"Gave revisions to {stamped} older document(s)")
+    for name in sharded:
+        print(f"{name}: sharded on hashed tenant")
+
+
+def cmd_batch_reports(data_manager, args):
+    if args.tenants_file:
+        with open(args.tenants_file, encoding="utf-8") as f:
+            tenants = [line.strip() for line in f if line.strip()]
+    else:
+        tenants = data_manager.list_tenants()
+    result = generate_reports(tenants, workers=args.workers, pool_size=args.pool_size,
+                              chunk_size=args.chunk_size, output_dir=args.output_dir)
+    if args.json:
+        _print_json(result)
+        return
+    print(f"Generated {result['succeeded']} of {result['tenants']} reports with {result['workers']} worker(s) "
+          f"in {result['elapsed_seconds']:.1f}s ({result['tenants_per_second']:,.1f} tenants/s)")
+    latency = result['latency_ms']
+    if latency:
+        print(f"Per-tenant latency: mean {latency['mean']:.1f} ms, p50 {latency['p50']:.1f} ms, "
+              f"p95 {latency['p95']:.1f} ms, max {latency['max']:.1f} ms")
+    for tenant, error in result['errors'].items():
+        print(f"{tenant}: {error}", file=sys.stderr)
+    if args.output_dir:
+        print(f"Reports written to {args.output_dir}")
+
+
+def cmd_changes(data_manager, args):
+    result = data_manager.changes_since(args.since, args.limit)
+    if args.json:
+        _print_json(result)
+        return
+    for change in result['changes']:
+        print(f"{change['revision']:>8}  {change['operation']:<6}  {change['collection']:<18}  {change['id']}")
+    more = " (more available)" if result['has_more'] else ""
+    print(f"{len(result['changes'])} change(s); continue with --since {result['revision']}{more}")
+
+
+def cmd_backup(data_manager, args):
+    result = backup(data_manager, args.output, args.incremental, args.batch_size)
+    if args.json:
+        _print_json(result)
+        return
+    if args.incremental and result['kind'] == 'full':
+        print("No usable earlier snapshot (none yet, or entries were archived since); made a full backup")
+    print(f"{result['kind'].title()} backup written to {result['path']}")
+    for name, count in result['counts'].items():
+        if count:
+            print(f"  {name}: {count} document(s)")
+
+
+def cmd_restore(data_manager, args):
+    results = [restore(data_manager, path, args.batch_size) for path in args.files]
+    if args.json:
+        _print_json(results)
+        return
+    for result in results:
+        print(f"Restored {sum(result['counts'].values())} document(s) from {result['kind']} backup {result['path']}")
+
+
+def cmd_db_stats(data_manager, args):
+    stats = data_manager.get_connection_stats()
+    if args.json:
+        _print_json(stats)
+        return
+    print(f"Ping: {stats['ping_ms']:.1f} ms")
+    for address, server_type in stats['servers'].items():
+        print(f"Server {address}: {server_type}")
+    print(f"Connections: {stats['connections_open']} open, {stats['connections_in_use']} in use, "
+          f"{stats['connections_created']} created, {stats['connections_closed']} closed")
+    print(f"Checkouts: {stats['checkouts']} ({stats['checkout_failures']} failed), "
+          f"pool cleared {stats['pool_clears']} time(s)")
+    latency = stats['checkout_ms']
+    if latency:
+        print(f"Checkout latency: mean {latency['mean']:.2f} ms, p50 {latency['p50']:.2f} ms, "
+              f"p95 {latency['p95']:.2f} ms, max {latency['max']:.2f} ms")
+
+
+def cmd_serve(args):
+    import api_server
+    try:
+        api_server.serve(args.host, args.port, args.pool_size, args.tenant)
+    except (RuntimeError, OSError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+def build_parser():
+    """Build the argument parser with one subcommand per operation"""
+    parser = argparse.ArgumentParser(
+        prog="pfa",
+        description="Personal Finance Assistant - run without arguments for the interactive menu",
+    )
+    parser.add_argument("--tenant", default=None,
+                        help="household whose ledger to use (default: $PFA_TENANT or 'default')")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    # Shared --json flag
+    output = argparse.ArgumentParser(add_help=False)
+    output.add_argument("--json", action="store_true", help="print machine-readable JSON")
+
+    add_income = subparsers.add_parser("add-income", parents=[output], help="record an income entry")
+    add_income.add_argument("amount", type=_positive_amount)
+    add_income.add_argument("source")
+    add_income.add_argument("--date", type=_iso_date, help="YYYY-MM-DD (default: today)")
+    add_income.add_argument("--description", default="")
+    add_income.add_argument("--currency", help="ISO code (default: the reporting currency)")
+    add_income.set_defaults(handler=cmd_add_income)
+
+    add_expense = subparsers.add_parser("add-expense", parents=[output], help="record an expense")
+    add_expense.add_argument("amount", type=_positive_amount)
+    add_expense.add_argument("category")
+    add_expense.add_argument("--date", type=_iso_date, help="YYYY-MM-DD (default: today)")
+    add_expense.add_argument("--description", default="")
+    add_expense.add_argument("--currency", help="ISO code (default: the reporting currency)")
+    add_expense.set_defaults(handler=cmd_add_expense)
+
+    import_expenses = subparsers.add_parser(
+        "import-expenses", parents=[output],
+        help="import expenses from a CSV file, categorizing them automatically",
+    )
+    import_expenses.add_argument("file", help="CSV with date, amount, description and optional category and currency columns")
+    import_expenses.add_argument("--default-category", help="category for entries no rule matches")
+    import_expenses.add_argument("--dry-run", action="store_true", help="categorize without saving")
+    import_expenses.set_defaults(handler=cmd_import_expenses)
+
+    import_rates = subparsers.add_parser(
+        "import-rates", parents=[output],
+        help="load exchange rates from a date,currency,rate CSV file",
+    )
+    import_rates.add_argument("file")
+    import_rates.add_argument("--base", help="currency the rates are quoted in (default: the reporting currency)")
+    import_rates.set_defaults(handler=cmd_import_rates)
+
+    dashboard = subparsers.add_parser("dashboard", parents=[output], help="show the financial dashboard")
+    dashboard.add_argument("--watch", action="store_true",
+                           help="keep the dashboard open and update it live (needs a replica set)")
+    dashboard.set_defaults(handler=cmd_dashboard)
+
+    forecast = subparsers.add_parser(
+        "forecast", parents=[output],
+        help="project the cash balance day by day and estimate shortfall risk",
+    )
+    forecast.add_argument("--months", type=_positive_int, default=12, help="horizon in months (1-36)")
+    forecast.add_argument("--balance", type=float, default=None,
+                          help="starting balance (default: the dashboard's cash remaining)")
+    forecast.set_defaults(handler=cmd_forecast)
+
+    debts = subparsers.add_parser("debts", parents=[output], help="show debt and repayment status")
+    debts.set_defaults(handler=cmd_debts)
+
+    payoff_plan = subparsers.add_parser(
+        "payoff-plan", parents=[output],
+        help="compare avalanche, snowball and deadline-first payoff schedules",
+    )
+    payoff_plan.add_argument("--budget", type=_positive_amount,
+                             help="monthly repayment budget (default: the saved goal)")
+    payoff_plan.set_defaults(handler=cmd_payoff_plan)
+
+    simulate = subparsers.add_parser(
+        "simulate-portfolio", parents=[output],
+        help="Monte Carlo outcome bands for each investment purpose",
+    )
+    simulate.add_argument("--years", type=_positive_int, default=20)
+    simulate.add_argument("--paths", type=_positive_int, default=None, help="simulated paths per purpose")
+    simulate.add_argument("--workers", type=_positive_int, default=None,
+                          help="worker processes (default: CPU count)")
+    simulate.set_defaults(handler=cmd_simulate_portfolio)
+
+    apply_recurring = subparsers.add_parser(
+        "apply-recurring", parents=[output],
+        help="add this month's pending recurring expenses without prompting",
+    )
+    apply_recurring.set_defaults(handler=cmd_apply_recurring)
+
+    # Shared listing options
+    listing = argparse.ArgumentParser(add_help=False)
+    listing.add_argument("--format", choices=OUTPUT_FORMATS, default="table")
+    listing.add_argument("--output", metavar="FILE", help="write to FILE instead of stdout")
+
+    list_income = subparsers.add_parser("list-income", parents=[listing], help="list all income entries")
+    list_income.set_defaults(handler=cmd_list_income)
+
+    list_expenses = subparsers.add_parser("list-expenses", parents=[listing], help="list all expenses")
+    list_expenses.set_defaults(handler=cmd_list_expenses)
+
+    repayments = subparsers.add_parser("repayments", parents=[listing], help="list debt repayments")
+    repayments.add_argument("--limit", type=_positive_int, default=None, help="only the most recent N payments")
+    repayments.set_defaults(handler=cmd_repayments)
+
+    archive = subparsers.add_parser(
+        "archive", parents=[output],
+        help="move old income and expenses into per-year archive collections",
+    )
+    cutoff = archive.add_mutually_exclusive_group()
+    cutoff.add_argument("--before", type=_iso_date, help="archive entries dated before YYYY-MM-DD")
+    cutoff.add_argument("--keep-years", type=int, default=None,
+                        help="calendar years to keep live, this one included "
+                             "(default: $PFA_ARCHIVE_KEEP_YEARS or 2)")
+    archive.add_argument("--batch-size", type=_positive_int, default=1000)
+    archive.set_defaults(handler=cmd_archive)
+
+    archived = subparsers.add_parser(
+        "archived", parents=[listing],
+        help="show archived yearly totals, or the entries of one archived year",
+    )
+    archived.add_argument("collection", nargs="?", choices=sorted(ARCHIVED_COLLECTIONS))
+    archived.add_argument("year", nargs="?")
+    archived.set_defaults(handler=cmd_archived)
+
+    budgets = subparsers.add_parser("budgets", parents=[listing], help="this month's spend against category budgets")
+    budgets.set_defaults(handler=cmd_budgets)
+
+    set_budget = subparsers.add_parser("set-budget", help="set a category's monthly budget (0 removes it)")
+    set_budget.add_argument("category")
+    set_budget.add_argument("amount", type=_budget_amount)
+    set_budget.set_defaults(handler=cmd_set_budget)
+
+    search = subparsers.add_parser("search", parents=[listing], help="ranked text search across all entries")
+    search.add_argument("text", nargs="+")
+    search.add_argument("--type", action="append", choices=list(SEARCHABLE_COLLECTIONS),
+                        help="only search this kind of entry (repeatable)")
+    search.add_argument("--min-amount", type=float)
+    search.add_argument("--max-amount", type=float)
+    search.add_argument("--start", type=_iso_date, help="from YYYY-MM-DD")
+    search.add_argument("--end", type=_iso_date, help="to YYYY-MM-DD")
+    search.add_argument("--category", help="expense category, income source or investment type")
+    search.add_argument("--page", type=_positive_int, default=1)
+    search.add_argument("--page-size", type=_positive_int, default=20)
+    search.set_defaults(handler=cmd_search)
+
+    init_db = subparsers.add_parser("init-db", parents=[output], help="create the tenant indexes")
+    init_db.add_argument("--shard", action="store_true",
+                         help="also shard the per-tenant collections on hashed tenant (needs mongos)")
+    init_db.set_defaults(handler=cmd_init_db)
+
+    batch_reports = subparsers.add_parser(
+        "batch-reports", parents=[output],
+        help="compute the dashboard of many tenants in parallel and report throughput",
+    )
+    batch_reports.add_argument("--tenants-file", metavar="FILE",
+                               help="one tenant per line (default: every tenant in the database)")
+    batch_reports.add_argument("--output-dir", metavar="DIR", help="write one <tenant>.json report per tenant")
+    batch_reports.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    batch_reports.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                               help="MongoDB connections per worker")
+    batch_reports.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                               help="tenants handed to a worker at a time")
+    batch_reports.set_defaults(handler=cmd_batch_reports)
+
+    changes = subparsers.add_parser(
+        "changes", parents=[output],
+        help="inserts, updates and deletes after a revision, for incremental sync",
+    )
+    changes.add_argument("--since", type=int, default=0, help="last revision already seen (default: 0, everything)")
+    changes.add_argument("--limit", type=_positive_int, default=1000, help="changes per page")
+    changes.set_defaults(handler=cmd_changes)
+
+    backup_parser = subparsers.add_parser(
+        "backup", parents=[output],
+        help="write a compressed snapshot of the ledger (full or incremental)",
+    )
+    backup_parser.add_argument("--incremental", action="store_true",
+                               help="only entries added since the last backup")
+    backup_parser.add_argument("--output", metavar="FILE",
+                               help="backup file (default: backups/pfa-<tenant>-<kind>-<time>.jsonl.gz)")
+    backup_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                               help="documents read and written per chunk")
+    backup_parser.set_defaults(handler=cmd_backup)
+
+    restore_parser = subparsers.add_parser(
+        "restore", parents=[output],
+        help="load backups into the ledger: a full one, then its incremental ones in order",
+    )
+    restore_parser.add_argument("files", nargs="+", metavar="FILE")
+    restore_parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                                help="documents per insert_many batch")
+    restore_parser.set_defaults(handler=cmd_restore)
+
+    db_stats = subparsers.add_parser("db-stats", parents=[output],
+                                     help="check the MongoDB connection and show pool statistics")
+    db_stats.set_defaults(handler=cmd_db_stats)
+
+    serve = subparsers.add_parser("serve", help="run the local HTTP JSON API")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--pool-size", type=int, default=None,
+                       help="MongoDB pool and worker thread size (default: $PFA_API_POOL_SIZE or 20)")
+    serve.set_defaults(standalone=cmd_serve)
+
+    return parser
+
+
+def main(argv=None):
+    """Entry point for non-interactive use; returns the process exit code"""
+    args = build_parser().parse_args(argv)
+
+    # Commands that manage their own DataManager
+    if getattr(args, "standalone", None):
+        return args.standalone(args)
+
+    data_manager = None
+    try:
+        data_manager = DataManager(tenant=args.tenant)
+        # Handlers return an exit code only when they fail without raising
+        status = args.handler(data_manager, args)
+    except (OSError, ValueError) as e:
+        # Unreachable server, unreadable input files and rejected values
+        # (e.g. a currency without rates)
+        print(f"pfa {args.command}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if data_manager is not None:
+            data_manager.close()
+    return status or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
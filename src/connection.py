@@ -0,0 +1,294 @@
+"""
+Connection - MongoClient construction, tuning from the environment and pool health metrics
+
+Pool sizes, timeouts, wire compression, read preference and retry settings
+come from PFA_MONGO_* variables (or a .env file). Clients are checked with a
+ping when they are created, so an unreachable server fails in a few seconds
+with a readable error instead of on the first query after a long wait.
+
+PFA_BACKEND=memory swaps MongoDB for the in-process store of
+memory_backend, for sessions that need no server.
+"""
+
+import importlib.util
+import os
+import re
+import threading
+import time
+from collections import deque
+
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ConnectionFailure, OperationFailure
+
+import memory_backend
+
+
+DEFAULT_CONNECTION_STRING = 'mongodb://localhost:27017/'
+
+# Values of PFA_BACKEND
+BACKENDS = ('mongodb', 'memory')
+
+# pymongo waits 30s to pick a server by default; an interactive tool should not
+DEFAULT_CLIENT_OPTIONS = {
+    'serverSelectionTimeoutMS': 5000,
+    'connectTimeoutMS': 5000,
+}
+
+# Environment variable -> (MongoClient option, type)
+CLIENT_SETTINGS = {
+    'PFA_MONGO_MAX_POOL_SIZE': ('maxPoolSize', int),
+    'PFA_MONGO_MIN_POOL_SIZE': ('minPoolSize', int),
+    'PFA_MONGO_MAX_IDLE_TIME_MS': ('maxIdleTimeMS', int),
+    'PFA_MONGO_WAIT_QUEUE_TIMEOUT_MS': ('waitQueueTimeoutMS', int),
+    'PFA_MONGO_SERVER_SELECTION_TIMEOUT_MS': ('serverSelectionTimeoutMS', int),
+    'PFA_MONGO_CONNECT_TIMEOUT_MS': ('connectTimeoutMS', int),
+    'PFA_MONGO_SOCKET_TIMEOUT_MS': ('socketTimeoutMS', int),
+    'PFA_MONGO_COMPRESSORS': ('compressors', str),
+    'PFA_MONGO_READ_PREFERENCE': ('readPreference', str),
+    'PFA_MONGO_RETRY_WRITES': ('retryWrites', bool),
+    'PFA_MONGO_RETRY_READS': ('retryReads', bool),
+}
+
+READ_PREFERENCES = ('primary', 'primaryPreferred', 'secondary', 'secondaryPreferred', 'nearest')
+
+# Compressors and the module each one needs (zlib ships with Python)
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': None}
+
+# Recent checkouts kept for latency percentiles
+LATENCY_SAMPLES = 1024
+
+_env_loaded = False
+
+
+class DatabaseUnavailable(ConnectionError):
+    """Raised when MongoDB cannot be reached (or refuses the connection) at startup"""
+
+
+def load_env_file(path=None):
+    """Read KEY=VALUE lines from a .env file into os.environ (existing variables win)
+
+    Without a path, PFA_ENV_FILE is used, then .env in the working directory,
+    then config/.env in the project. Only the first file found is read, once
+    per process.
+    """
+    global _env_loaded
+    if path is None:
+        if _env_loaded:
+            return None
+        _env_loaded = True
+        project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        candidates = [os.getenv('PFA_ENV_FILE'), '.env', os.path.join(project, 'config', '.env')]
+        path = next((p for p in candidates if p and os.path.isfile(p)), None)
+        if path is None:
+            return None
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            key = key.strip()
+            if key.startswith('export '):
+                key = key[len('export '):].strip()
+            os.environ.setdefault(key, value.strip().strip('"\''))
+    return path
+
+
+def _available_compressors(names):
+    """The listed compressors whose libraries are installed, in order of preference"""
+    available = []
+    for name in names.split(','):
+        name = name.strip().lower()
+        if name not in COMPRESSOR_MODULES:
+            raise ValueError(f"Unknown compressor '{name}' (use zstd, snappy or zlib)")
+        module = COMPRESSOR_MODULES[name]
+        if module is None or importlib.util.find_spec(module) is not None:
+            available.append(name)
+    return ','.join(available)
+
+
+def client_options_from_env():
+    """MongoClient options set through PFA_MONGO_* variables
+
+    Raises ValueError naming the variable when a value is invalid.
+    """
+    options = {}
+    for variable, (option, kind) in CLIENT_SETTINGS.items():
+        value = os.getenv(variable)
+        if value is None or value.strip() == '':
+            continue
+        value = value.strip()
+        if kind is int:
+            try:
+                options[option] = int(value)
+            except ValueError:
+                raise ValueError(f"{variable} must be a whole number, got {value!r}")
+            if options[option] < 0:
+                raise ValueError(f"{variable} cannot be negative")
+        elif kind is bool:
+            if value.lower() not in ('true', 'false', '1', '0', 'yes', 'no'):
+                raise ValueError(f"{variable} must be true or false, got {value!r}")
+            options[option] = value.lower() in ('true', '1', 'yes')
+        elif option == 'readPreference':
+            if value not in READ_PREFERENCES:
+                raise ValueError(f"{variable} must be one of {', '.join(READ_PREFERENCES)}")
+            options[option] = value
+        elif option == 'compressors':
+            # Missing compression libraries fall back to the next choice (or none)
+            compressors = _available_compressors(value)
+            if compressors:
+                options[option] = compressors
+        else:
+            options[option] = value
+    return options
+
+
+def selected_backend():
+    """The storage backend named by PFA_BACKEND (mongodb unless set)"""
+    backend = (os.getenv('PFA_BACKEND') or 'mongodb').strip().lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"PFA_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+    return backend
+
+
+def redact(connection_string):
+    """Connection string without its credentials, for error messages"""
+    return re.sub(r'//[^@/]*@', '//***@', connection_string)
+
+
+class ConnectionMetrics(monitoring.ConnectionPoolListener, monitoring.ServerListener):
+    """Pool and server events of one client, aggregated for health reporting"""
+
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._checkout_ms = deque(maxlen=samples)
+        # Kept apart from attributes: ServerListener already has a closed() method
+        self._counts = dict.fromkeys(
+            ('created', 'closed', 'checked_out', 'checked_in', 'checkout_failures', 'pool_clears'), 0)
+        self._servers = {}
+
+    def snapshot(self):
+        """Connection counts, checkout latency (ms) and server states"""
+        with self._lock:
+            samples = sorted(self._checkout_ms)
+            counts = self._counts
+            stats = {
+                'connections_open': counts['created'] - counts['closed'],
+                'connections_in_use': counts['checked_out'] - counts['checked_in'],
+                'connections_created': counts['created'],
+                'connections_closed': counts['closed'],
+                'checkouts': counts['checked_out'],
+                'checkout_failures': counts['checkout_failures'],
+                'pool_clears': counts['pool_clears'],
+                'servers': dict(self._servers),
+            }
+        if samples:
+            stats['checkout_ms'] = {
+                'mean': sum(samples) / len(samples),
+                'p50': samples[len(samples) // 2],
+                'p95': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                'max': samples[-1],
+            }
+        else:
+            stats['checkout_ms'] = None
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    # Connection pool events
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_clears')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('closed')
+
+    def connection_check_out_started(self, event):
+        # Checkouts block the calling thread, so a thread-local start time pairs them up
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        # pymongo 4.7+ reports the duration itself
+        duration = getattr(event, 'duration', None)
+        if duration is None:
+            duration = time.perf_counter() - getattr(self._local, 'started', time.perf_counter())
+        with self._lock:
+            self._counts['checked_out'] += 1
+            self._checkout_ms.append(duration * 1000)
+
+    def connection_checked_in(self, event):
+        self._count('checked_in')
+
+    # Server events
+    def opened(self, event):
+        with self._lock:
+            self._servers[f'{event.server_address[0]}:{event.server_address[1]}'] = 'Unknown'
+
+    def description_changed(self, event):
+        with self._lock:
+            self._servers[f'{event.server_address[0]}:{event.server_address[1]}'] = \
+                event.new_description.server_type_name
+
+    def closed(self, event):
+        with self._lock:
+            self._servers.pop(f'{event.server_address[0]}:{event.server_address[1]}', None)
+
+
+def create_client(connection_string=None, metrics=None, check=True, **options):
+    """MongoClient configured from defaults, PFA_MONGO_* variables and options (in that order)
+
+    metrics (a ConnectionMetrics) is registered for pool and server events.
+    With check, the server is pinged right away and DatabaseUnavailable is
+    raised if it cannot be reached within the server selection timeout.
+    With PFA_BACKEND=memory, the process's in-memory client is returned
+    instead and the connection settings do not apply.
+    """
+    load_env_file()
+    if selected_backend() == 'memory':
+        return memory_backend.shared_client()
+    if connection_string is None:
+        connection_string = os.getenv('MONGODB_URI', DEFAULT_CONNECTION_STRING)
+    settings = {**DEFAULT_CLIENT_OPTIONS, **client_options_from_env(), **options}
+    if metrics is not None:
+        settings['event_listeners'] = list(settings.get('event_listeners', [])) + [metrics]
+
+    client = MongoClient(connection_string, **settings)
+    if check:
+        try:
+            client.admin.command('ping')
+        except ConnectionFailure as e:
+            client.close()
+            timeout = settings['serverSelectionTimeoutMS'] / 1000
+            # The full error carries the whole topology description
+            reason = str(e).split(', Timeout:')[0]
+            raise DatabaseUnavailable(
+                f"Cannot reach MongoDB at {redact(connection_string)} within {timeout:g}s ({reason}). "
+                "Is the server running and MONGODB_URI correct?"
+            ) from None
+        except OperationFailure as e:
+            client.close()
+            raise DatabaseUnavailable(
+                f"MongoDB at {redact(connection_string)} refused the connection: {(e.details or {}).get('errmsg', e)}"
+            ) from None
+    return client
@@ -4,64 +4,306 @@ Dashboard - Financial overview and goal tracking
 
 from datetime import datetime
 
+from pymongo.errors import OperationFailure
+
+from cash_flow import DEFAULT_MONTHS, DEFAULT_PATHS, MAX_MONTHS, forecast_cash_flow
+from data_manager import DEFAULT_REPORTING_CURRENCY
+from metrics import timed_view
+
+
+class DashboardState:
+    """Running dashboard totals that can be updated one document at a time
+    
+    Every add/remove is O(1), so the same state serves a one-shot render
+    (fed from full collection reads) and the live dashboard (fed from
+    change stream events).
+    """
+    
+    def __init__(self, month, savings_goal, reporting_currency=DEFAULT_REPORTING_CURRENCY):
+        self.month = month
+        self.savings_goal = savings_goal
+        self.reporting_currency = reporting_currency
+        self.month_income = 0
+        self.month_expenses = 0
+        self.month_investments = 0
+        self.month_by_category = {}
+        self.total_income = 0
+        self.total_expenses = 0
+        self.total_investments = 0
+        self.investment_count = 0
+        self.total_invested = 0
+        self.total_investment_value = 0
+        self.emergency_fund_count = 0
+        self.emergency_fund_total = 0
+        # Investment figures by document id, so updates can replace old values
+        self.investments = {}
+    
+    def add_income(self, entry, sign=1):
+        amount = sign * entry['amount']
+        self.total_income += amount
+        if entry['date'].startswith(self.month):
+            self.month_income += amount
+    
+    def add_expense(self, entry, sign=1):
+        amount = sign * entry['amount']
+        in_month = entry['date'].startswith(self.month)
+        
+        # Separate regular expenses from investment deposits
+        if entry['category'].lower() == 'investment':
+            self.total_investments += amount
+            if in_month:
+                self.month_investments += amount
+        else:
+            self.total_expenses += amount
+            if in_month:
+                self.month_expenses += amount
+        
+        if in_month:
+            category = entry['category']
+            total = self.month_by_category.get(category, 0) + amount
+            if sign < 0 and abs(total) < 1e-9:
+                self.month_by_category.pop(category, None)
+            else:
+                self.month_by_category[category] = total
+    
+    def add_ledger(self, income, expenses):
+        """Add whole income and expense ledgers at once (LedgerColumns, see ledger_cache)"""
+        self.total_income += float(income.amounts.sum())
+        self.month_income += float(income.amounts[income.in_month(self.month)].sum())
+        
+        totals, _ = expenses.group_totals()
+        month_totals, month_counts = expenses.group_totals(expenses.in_month(self.month))
+        for code, category in enumerate(expenses.labels):
+            if category.lower() == 'investment':
+                self.total_investments += float(totals[code])
+                self.month_investments += float(month_totals[code])
+            else:
+                self.total_expenses += float(totals[code])
+                self.month_expenses += float(month_totals[code])
+            if month_counts[code]:
+                self.month_by_category[category] = self.month_by_category.get(category, 0) + float(month_totals[code])
+    
+    def add_archived_totals(self, totals):
+        """Add the precomputed totals of an archived year (never the current month)"""
+        if totals['collection'] == 'income':
+            self.total_income += totals['total']
+            return
+        for category, group in totals['groups'].items():
+            if category.lower() == 'investment':
+                self.total_investments += group['total']
+            else:
+                self.total_expenses += group['total']
+    
+    def add_investment(self, inv, key=None):
+        """Add an investment; pass its _id as key to allow later updates/removal"""
+        if key is not None:
+            self.remove_investment(key)
+        # Emergency Fund (assuming Emergency Fund is an investment purpose)
+        record = (
+            inv['amount'],
+            inv.get('current_value', inv['amount']),
+            'emergency' in inv.get('purpose', '').lower(),
+        )
+        if key is not None:
+            self.investments[key] = record
+        self._apply_investment(record, 1)
+    
+    def remove_investment(self, key):
+        record = self.investments.pop(key, None)
+        if record is not None:
+            self._apply_investment(record, -1)
+    
+    def _apply_investment(self, record, sign):
+        amount, current_value, emergency = record
+        self.investment_count += sign
+        self.total_invested += sign * amount
+        self.total_investment_value += sign * current_value
+        if emergency:
+            self.emergency_fund_count += sign
+            self.emergency_fund_total += sign * current_value
+    
+    def snapshot(self):
+        """Derived dashboard metrics for the current totals"""
+        # Calculations - Investments count as savings!
+        month_net_cash = self.month_income - self.month_expenses - self.month_investments  # Cash left after expenses AND investments
+        month_total_saved = month_net_cash + self.month_investments  # Total saved = cash kept + money invested
+        month_savings_rate = (month_total_saved / self.month_income * 100) if self.month_income > 0 else 0
+        
+        total_net_cash = self.total_income - self.total_expenses - self.total_investments
+        total_saved = total_net_cash + self.total_investments
+        
+        return {
+            "month": self.month,
+            "savings_goal": self.savings_goal,
+            "month_income": self.month_income,
+            "month_expenses": self.month_expenses,
+            "month_investments": self.month_investments,
+            "month_net_cash": month_net_cash,
+            "month_total_saved": month_total_saved,
+            "month_savings_rate": month_savings_rate,
+            "month_by_category": dict(self.month_by_category),
+            "total_income": self.total_income,
+            "total_expenses": self.total_expenses,
+            "total_investments": self.total_investments,
+            "total_net_cash": total_net_cash,
+            "total_saved": total_saved,
+            "investment_count": self.investment_count,
+            "total_invested": self.total_invested,
+            "total_investment_value": self.total_investment_value,
+            "emergency_fund_count": self.emergency_fund_count,
+            "emergency_fund_total": self.emergency_fund_total,
+        }
+
 
 class Dashboard:
     def __init__(self, data_manager):
         self.data_manager = data_manager
     
+    def load_state(self, track_investments=False):
+        """Build dashboard state from a full read of the ledger
+        
+        With track_investments, investments are keyed by _id so the state
+        can later apply change stream updates to them.
+        """
+        current_month = datetime.now().strftime("%Y-%m")
+        state = DashboardState(
+            current_month,
+            self.data_manager.get_savings_goal(),
+            self.data_manager.get_reporting_currency(),
+        )
+        
+        for totals in self.data_manager.get_archived_totals():
+            state.add_archived_totals(totals)
+        state.add_ledger(
+            self.data_manager.get_ledger_columns('income'),
+            self.data_manager.get_ledger_columns('expenses'),
+        )
+        for inv in self.data_manager.get_investment_records():
+            state.add_investment(inv, inv.id if track_investments else None)
+        
+        return state
+    
+    @timed_view
+    def compute_metrics(self):
+        """Compute all dashboard figures without printing anything"""
+        return self.load_state().snapshot()
+    
+    def apply_change(self, state, change):
+        """Apply one change stream event to the state
+        
+        Returns False when the event cannot be applied incrementally (e.g. a
+        delete without a pre-image) and the state must be reloaded.
+        """
+        collection = change['ns']['coll']
+        operation = change['operationType']
+        if operation not in ('insert', 'update', 'replace', 'delete'):
+            return False
+        
+        after = change.get('fullDocument')
+        before = change.get('fullDocumentBeforeChange')
+        
+        if collection == 'yearly_totals':
+            # An archive run moved entries; reread instead of subtracting them
+            return False
+        
+        if collection == 'settings':
+            if after is None:
+                return False
+            if after.get('reporting_currency', DEFAULT_REPORTING_CURRENCY) != state.reporting_currency:
+                # Every foreign-currency total has to be converted again
+                return False
+            state.savings_goal = after.get('savings_goal_percentage', 20.0)
+            return True
+        
+        if collection == 'investments':
+            # The state remembers each investment, so no pre-image is needed
+            key = change['documentKey']['_id']
+            if operation == 'delete':
+                state.remove_investment(key)
+            elif after is None:
+                return False
+            else:
+                state.add_investment(after, key)
+            return True
+        
+        add = state.add_income if collection == 'income' else state.add_expense
+        if operation != 'insert':
+            if before is None:
+                return False
+            add(self.data_manager.to_reporting_currency([before])[0], -1)
+        if operation != 'delete':
+            if after is None:
+                return False
+            add(self.data_manager.to_reporting_currency([after])[0])
+        return True
+    
+    def watch_dashboard(self, clear_screen=True):
+        """Live dashboard: compute once, then apply change stream events incrementally"""
+        state = self.load_state(track_investments=True)
+        # Start the stream from after the initial read
+        start = self.data_manager.operation_time()
+        self._redraw(state, clear_screen)
+        
+        try:
+            with self.data_manager.watch_ledger(start) as stream:
+                dirty = False
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        if not self.apply_change(state, change):
+                            state = self.load_state(track_investments=True)
+                        dirty = True
+                        continue
+                    
+                    # Quiet period: redraw once per burst of events, reload on a new month
+                    if state.month != datetime.now().strftime("%Y-%m"):
+                        state = self.load_state(track_investments=True)
+                        dirty = True
+                    if dirty:
+                        self._redraw(state, clear_screen)
+                        dirty = False
+        except OperationFailure as e:
+            print(f"\nLive updates unavailable: {e}")
+            print("Change streams need MongoDB running as a replica set (e.g. mongod --replSet rs0).")
+        except KeyboardInterrupt:
+            print("\nStopped watching.")
+    
+    def _redraw(self, state, clear_screen):
+        if clear_screen:
+            print("\033[2J\033[H", end="")
+        self.render_dashboard(state.snapshot())
+        print(f"Live - updated {datetime.now().strftime('%H:%M:%S')} (Ctrl+C to stop)")
+    
+    @timed_view
     def show_dashboard(self):
         """Display comprehensive financial dashboard"""
+        self.render_dashboard(self.compute_metrics())
+    
+    def render_dashboard(self, metrics):
+        """Print the dashboard for a set of computed metrics"""
         print("\n" + "="*60)
         print("FINANCIAL DASHBOARD".center(60))
         print("="*60)
         
         currency = self.data_manager.get_currency()
-        current_month = datetime.now().strftime("%Y-%m")
-        current_month_name = datetime.now().strftime("%B %Y")
-        
-        # Get all data
-        all_income = self.data_manager.get_all_income()
-        all_expenses = self.data_manager.get_all_expenses()
-        all_investments = self.data_manager.get_all_investments()
-        savings_goal = self.data_manager.get_savings_goal()
-        
-        # Current month data
-        month_income = sum(
-            entry['amount'] for entry in all_income
-            if entry['date'].startswith(current_month)
-        )
-        # Separate regular expenses from investment deposits
-        month_expenses = sum(
-            entry['amount'] for entry in all_expenses
-            if entry['date'].startswith(current_month) and entry['category'].lower() != 'investment'
-        )
-        month_investments = sum(
-            entry['amount'] for entry in all_expenses
-            if entry['date'].startswith(current_month) and entry['category'].lower() == 'investment'
-        )
+        current_month_name = datetime.strptime(metrics['month'], "%Y-%m").strftime("%B %Y")
         
-        # Total data
-        total_income = sum(entry['amount'] for entry in all_income)
-        total_expenses = sum(
-            entry['amount'] for entry in all_expenses
-            if entry['category'].lower() != 'investment'
-        )
-        total_investments = sum(
-            entry['amount'] for entry in all_expenses
-            if entry['category'].lower() == 'investment'
-        )
-        total_invested = sum(inv['amount'] for inv in all_investments)
-        total_investment_value = sum(
-            inv.get('current_value', inv['amount']) for inv in all_investments
-        )
-        
-        # Calculations - Investments count as savings!
-        month_net_cash = month_income - month_expenses - month_investments  # Cash left after expenses AND investments
-        month_total_saved = month_net_cash + month_investments  # Total saved = cash kept + money invested
-        month_savings_rate = (month_total_saved / month_income * 100) if month_income > 0 else 0
-        
-        total_net_cash = total_income - total_expenses - total_investments
-        total_saved = total_net_cash + total_investments
+        savings_goal = metrics['savings_goal']
+        month_income = metrics['month_income']
+        month_expenses = metrics['month_expenses']
+        month_investments = metrics['month_investments']
+        month_net_cash = metrics['month_net_cash']
+        month_total_saved = metrics['month_total_saved']
+        month_savings_rate = metrics['month_savings_rate']
+        total_income = metrics['total_income']
+        total_expenses = metrics['total_expenses']
+        total_investments = metrics['total_investments']
+        total_net_cash = metrics['total_net_cash']
+        total_saved = metrics['total_saved']
+        total_invested = metrics['total_invested']
+        total_investment_value = metrics['total_investment_value']
+        has_investments = metrics['investment_count'] > 0
+        has_emergency_fund = metrics['emergency_fund_count'] > 0
         
         # Display Current Month Summary
         print(f"\n{current_month_name}")
@@ -109,7 +351,7 @@ class Dashboard:
         print(f"Cash Remaining:  {currency}{total_net_cash:>15,.2f}")
         
         # Investment Summary
-        if all_investments:
+        if has_investments:
             investment_gain = total_investment_value - total_invested
             investment_gain_pct = (investment_gain / total_invested * 100) if total_invested > 0 else 0
             
@@ -124,24 +366,13 @@ class Dashboard:
                 print(f"Loss:            {currency}{investment_gain:>15,.2f} ({investment_gain_pct:.1f}%)")
         
         # Expense Breakdown (Current Month)
-        month_expenses_list = [
-            entry for entry in all_expenses
-            if entry['date'].startswith(current_month)
-        ]
+        by_category = metrics['month_by_category']
         
-        if month_expenses_list:
+        if by_category:
             print("\n" + "-" * 60)
             print(f"EXPENSE BREAKDOWN - {current_month_name}".center(60))
             print("-" * 60)
             
-            # Group by category
-            by_category = {}
-            for entry in month_expenses_list:
-                category = entry['category']
-                if category not in by_category:
-                    by_category[category] = 0
-                by_category[category] += entry['amount']
-            
             # Sort by amount and display top categories
             sorted_categories = sorted(by_category.items(), key=lambda x: x[1], reverse=True)
             for category, amount in sorted_categories[:5]:  # Top 5
@@ -172,17 +403,13 @@ class Dashboard:
             else:
                 print("Alert: You're spending at or above your income!")
         
-        if all_investments:
+        if has_investments:
             investment_ratio = (total_investment_value / total_income * 100) if total_income > 0 else 0
             print(f"Investment-to-Income Ratio: {investment_ratio:.1f}%")
         
         # Emergency Fund Check (assuming Emergency Fund is an investment purpose)
-        emergency_funds = [
-            inv for inv in all_investments
-            if 'emergency' in inv.get('purpose', '').lower()
-        ]
-        if emergency_funds:
-            emergency_total = sum(inv.get('current_value', inv['amount']) for inv in emergency_funds)
+        if has_emergency_fund:
+            emergency_total = metrics['emergency_fund_total']
             print(f"\nEmergency Fund: {currency}{emergency_total:,.2f}")
             
             # Typically 3-6 months of expenses is recommended
@@ -209,10 +436,79 @@ class Dashboard:
         if month_income > 0 and month_savings_rate > savings_goal:
             print(f"   • Great job! You're exceeding your savings goal by {month_savings_rate - savings_goal:.1f}%")
         
-        if not all_investments:
+        if not has_investments:
             print(f"   • Start building your investment portfolio for long-term growth")
         
-        if not emergency_funds and all_investments:
+        if not has_emergency_fund and has_investments:
             print(f"   • Consider allocating some investments to an emergency fund")
         
         print("="*60)
+    
+    @timed_view
+    def get_cash_flow_forecast(self, months=DEFAULT_MONTHS, starting_balance=None, n_paths=DEFAULT_PATHS):
+        """Day-by-day cash balance projection (see cash_flow.forecast_cash_flow)
+        
+        Starts from the dashboard's all-time cash remaining unless a
+        starting balance is given.
+        """
+        if starting_balance is None:
+            starting_balance = self.compute_metrics()['total_net_cash']
+        return forecast_cash_flow(
+            starting_balance,
+            self.data_manager.get_recurring_expenses(),
+            self.data_manager.get_income_records(),
+            # Everyday spending is told apart from recurring by its description
+            self.data_manager.get_all_expenses(),
+            [debt for debt in self.data_manager.get_debt_records() if debt.amount > debt.paid],
+            self.data_manager.get_debt_repayment_goal(),
+            [goal for goal in self.data_manager.get_goal_records() if goal.target_amount > goal.saved],
+            months=months,
+            n_paths=n_paths,
+        )
+    
+    def view_cash_flow_forecast(self, months=None, starting_balance=None):
+        """Display the cash-flow forecast with its low points and shortfall risk"""
+        if months is None:
+            months_input = input(f"Months to forecast (1-{MAX_MONTHS}, Enter for {DEFAULT_MONTHS}): ").strip()
+            try:
+                months = int(months_input) if months_input else DEFAULT_MONTHS
+            except ValueError:
+                print("Invalid number. Using 12 months.")
+                months = DEFAULT_MONTHS
+        
+        forecast = self.get_cash_flow_forecast(months, starting_balance)
+        currency = self.data_manager.get_currency()
+        
+        print("\n" + "="*60)
+        print("CASH-FLOW FORECAST".center(60))
+        print("="*60)
+        print(f"\n{forecast['start_date']} to {forecast['end_date']}")
+        print(f"Starting Balance: {currency}{forecast['starting_balance']:,.2f}")
+        print(f"Projected Ending Balance: {currency}{forecast['ending_balance']:,.2f}")
+        
+        print(f"\n{'Month':<9} {'In':>11} {'Out':>11} {'Lowest':>12} {'End':>12} {'Risk':>6}")
+        print("-"*66)
+        for row in forecast['monthly']:
+            outflow = row['recurring'] + row['everyday'] + row['debt_payments'] + row['goal_contributions']
+            amounts = [f"{currency}{value:,.0f}" for value in
+                       (row['income'], outflow, row['lowest_balance'], row['end_balance'])]
+            print(f"{row['month']:<9} {amounts[0]:>11} {amounts[1]:>11} {amounts[2]:>12} {amounts[3]:>12} "
+                  f"{row['shortfall_probability'] * 100:>5.0f}%")
+        
+        print("\n" + "-"*60)
+        print("LOWEST BALANCE DATES")
+        print("-"*60)
+        for point in forecast['lowest']:
+            print(f"   {point['date']}: {currency}{point['balance']:,.2f}")
+        
+        print("\n" + "-"*60)
+        risk = forecast['shortfall_probability'] * 100
+        if forecast['first_shortfall_date']:
+            print(f"⚠️  Projected to run short on {forecast['first_shortfall_date']}")
+        if risk >= 50:
+            print(f"⚠️  SHORTFALL RISK: HIGH ({risk:.0f}% of simulated paths go negative)")
+        elif risk >= 10:
+            print(f"⚠️  Shortfall risk: moderate ({risk:.0f}% of simulated paths go negative)")
+        else:
+            print(f"✓ Shortfall risk: low ({risk:.0f}% of simulated paths go negative)")
+        print("-"*60)
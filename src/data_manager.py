@@ -2,18 +2,117 @@
 Data Manager - Handles all data persistence using MongoDB
 """
 
-from pymongo import MongoClient
-from datetime import datetime
+from pymongo import ASCENDING, HASHED, TEXT, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from bson import ObjectId
+from datetime import datetime, timedelta
 import os
+import threading
+import weakref
 
+from connection import ConnectionMetrics, create_client, load_env_file
+from fx import FxTable
+from journal import WriteJournal
+from ledger_cache import LedgerCache
+from metrics import instrumented, start_exporters
+from records import DebtRecord, ExpenseRecord, GoalRecord, IncomeRecord, InvestmentRecord
+from report_cache import ReportCache
+from unit_of_work import RECOVERY_AGE, UnitOfWork, recover_units
 
+
+# Collections that can be archived and the field their yearly totals are grouped by
+ARCHIVED_COLLECTIONS = {'income': 'source', 'expenses': 'category'}
+
+
+DEFAULT_REPORTING_CURRENCY = 'USD'
+
+
+# Every document carries the tenant (household) it belongs to
+DEFAULT_TENANT = 'default'
+
+# Indexes of the per-tenant collections, each led by the tenant key
+TENANT_INDEXES = {
+    'income': [[('date', ASCENDING)], [('source', ASCENDING)]],
+    'expenses': [[('date', ASCENDING)], [('category', ASCENDING), ('date', ASCENDING)]],
+    'recurring_expenses': [[]],
+    'investments': [[('purpose', ASCENDING)]],
+    'debts': [[]],
+    'goals': [[]],
+    'category_rules': [[('created_date', ASCENDING)]],
+    'yearly_totals': [[('collection', ASCENDING), ('year', ASCENDING)]],
+    'fx_rates': [[('currency', ASCENDING), ('date', ASCENDING)]],
+    'backups': [[('started', ASCENDING)]],
+    'deletions': [[('revision', ASCENDING)]],
+    'pending_units': [[('created', ASCENDING)]],
+}
+
+# One document per tenant (or per tenant and key)
+UNIQUE_TENANT_INDEXES = ('settings', 'yearly_totals', 'fx_rates')
+
+# Collections that grow with the number of tenants; a hashed tenant index
+# lets them be sharded by tenant
+SHARDED_COLLECTIONS = ('income', 'expenses', 'recurring_expenses', 'investments', 'debts', 'goals')
+
+# Single-tenant indexes replaced by the tenant-led ones
+LEGACY_INDEXES = {'fx_rates': 'currency_1_date_1', 'yearly_totals': 'collection_1_year_1'}
+
+# Collections whose writes are stamped with a revision and reported by changes_since
+FEED_COLLECTIONS = (
+    'income', 'expenses', 'recurring_expenses', 'investments', 'debts', 'goals',
+    'settings', 'category_rules', 'fx_rates', 'yearly_totals',
+)
+
+# A reserved revision holds changes_since back until its write is in; a
+# lease older than this is taken to belong to a write that failed
+REVISION_LEASE_TIMEOUT = timedelta(minutes=1)
+
+# Bookkeeping fields readers never see
+INTERNAL_PROJECTION = {'tenant': 0, 'revision': 0, 'created_revision': 0, 'pending_units': 0}
+
+# Entries are returned without their _id and bookkeeping fields
+ENTRY_PROJECTION = {'_id': 0, **INTERNAL_PROJECTION}
+
+# Record type of each collection kept as ledger columns
+LEDGER_RECORDS = {'income': IncomeRecord, 'expenses': ExpenseRecord}
+
+# Clients whose database already has the tenant indexes
+_indexed_clients = weakref.WeakSet()
+
+
+def category_key(category):
+    """Case-insensitive key for a category, safe to use as a MongoDB field name"""
+    return category.strip().lower().replace('.', '_').replace('$', '_')
+
+
+# Searchable collections: text fields (with weights) and the fields the
+# amount and category filters apply to
+SEARCHABLE_COLLECTIONS = {
+    'expenses': {'text': {'description': 1}, 'amount': 'amount', 'category': 'category'},
+    'income': {'text': {'description': 1, 'source': 2}, 'amount': 'amount', 'category': 'source'},
+    'investments': {'text': {'name': 1}, 'amount': 'amount', 'category': 'type'},
+    'debts': {'text': {'description': 1}, 'amount': 'amount', 'category': None},
+    'goals': {'text': {'name': 1}, 'amount': 'target_amount', 'category': None},
+}
+
+
+@instrumented('data_manager')
 class DataManager:
-    def __init__(self, connection_string=None):
-        # Use environment variable or default to local MongoDB
-        if connection_string is None:
-            connection_string = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+    def __init__(self, connection_string=None, journal_path=None, report_cache_path=None,
+                 tenant=None, client=None, **client_options):
+        # Settings may come from a .env file as well as the environment
+        load_env_file()
+        start_exporters()
         
-        self.client = MongoClient(connection_string)
+        # Extra keyword arguments (e.g. maxPoolSize) are passed to MongoClient and
+        # override PFA_MONGO_* settings; an existing client can be shared by the
+        # data managers of many tenants. Raises DatabaseUnavailable if MongoDB
+        # cannot be reached.
+        self._owns_client = client is None
+        self.connection_metrics = ConnectionMetrics() if self._owns_client else None
+        if client is None:
+            client = create_client(connection_string, self.connection_metrics, **client_options)
+        self.client = client
+        self.tenant = tenant or os.getenv('PFA_TENANT') or DEFAULT_TENANT
         self.db = self.client['personal_finance']
         self.income_collection = self.db['income']
         self.expenses_collection = self.db['expenses']
@@ -22,82 +121,712 @@ class DataManager:
         self.settings_collection = self.db['settings']
         self.debts_collection = self.db['debts']
         self.goals_collection = self.db['goals']
+        self.yearly_totals_collection = self.db['yearly_totals']
+        self.category_rules_collection = self.db['category_rules']
+        self.fx_rates_collection = self.db['fx_rates']
+        self.category_spend_collection = self.db['category_spend']
+        self.counters_collection = self.db['counters']
+        self.backups_collection = self.db['backups']
+        self.deletions_collection = self.db['deletions']
+        self._fx_table = None
+        self._search_indexes_ready = False
+        # First revisions this thread reserved and has not released yet
+        self._leases = threading.local()
         
         # Initialize settings if not exists
         self._initialize_settings()
     
         # Initialize settings if not exists
         self._initialize_settings()
+        if self.client not in _indexed_clients:
+            self.ensure_indexes()
+            _indexed_clients.add(self.client)
+        
+        # Income and expense columns shared by every manager of this session
+        self.ledger = LedgerCache()
+        
+        # Optional write-behind journal for new income/expense entries
+        if journal_path is None:
+            journal_path = os.getenv('PFA_JOURNAL')
+        self.journal = WriteJournal(journal_path, self._write_journaled) if journal_path else None
+        
+        # Computed reports, optionally kept on disk between runs
+        if report_cache_path is None:
+            report_cache_path = os.getenv('PFA_REPORT_CACHE')
+        self.report_cache = ReportCache(path=report_cache_path or None)
+        
+        # Finish units of work a crash left half-written on a standalone server
+        self.recover_units()
     
     def _initialize_settings(self):
         """Initialize default settings if not exists"""
-        if self.settings_collection.count_documents({}) == 0:
+        if self.settings_collection.count_documents(self._scope()) == 0 and self.tenant == DEFAULT_TENANT:
+            self._adopt_untenanted()
+        if self.settings_collection.count_documents(self._scope()) == 0:
             default_settings = {
+                "tenant": self.tenant,
                 "savings_goal_percentage": 20.0,
                 "currency": "$"
             }
+            self._stamp_new([default_settings])
             self.settings_collection.insert_one(default_settings)
+            self._bump_version('settings')
     
     def close(self):
         """Close MongoDB connection"""
-        self.client.close()
+        if self.journal:
+            self.journal.close()
+        self.report_cache.save()
+        if self._owns_client:
+            self.client.close()
+    
+    def get_connection_stats(self):
+        """Pool and server health of this data manager's client"""
+        stats = {'ping_ms': None}
+        started = datetime.now()
+        self.client.admin.command('ping')
+        stats['ping_ms'] = (datetime.now() - started).total_seconds() * 1000
+        if self.connection_metrics is not None:
+            stats.update(self.connection_metrics.snapshot())
+        return stats
+    
+    # Tenants
+    def _scope(self, query=None):
+        """query restricted to this tenant's documents"""
+        scoped = {'tenant': self.tenant}
+        if query:
+            scoped.update(query)
+        return scoped
+    
+    def _adopt_untenanted(self):
+        """Assign documents written before tenants existed to this tenant"""
+        for name in self.db.list_collection_names():
+            if name in ('counters', 'category_spend'):
+                # Keyed by _id only; rebuilt per tenant on demand
+                self.db[name].delete_many({'tenant': {'$exists': False}})
+            else:
+                self.db[name].update_many({'tenant': {'$exists': False}}, {'$set': {'tenant': self.tenant}})
+        self.backfill_revisions()
+    
+    def ensure_indexes(self):
+        """Create the tenant-led indexes every query relies on (a no-op once they exist)"""
+        for name, index_name in LEGACY_INDEXES.items():
+            if index_name in self.db[name].index_information():
+                self.db[name].drop_index(index_name)
+        for name, indexes in TENANT_INDEXES.items():
+            if name in FEED_COLLECTIONS:
+                indexes = indexes + [[('revision', ASCENDING)]]
+            for fields in indexes:
+                self.db[name].create_index(
+                    [('tenant', ASCENDING)] + fields,
+                    unique=name in UNIQUE_TENANT_INDEXES and bool(fields)
+                )
+        self.settings_collection.create_index([('tenant', ASCENDING)], unique=True)
+        for name in SHARDED_COLLECTIONS:
+            self.db[name].create_index([('tenant', HASHED)])
+    
+    def shard_collections(self):
+        """Shard the per-tenant collections on the hashed tenant key (needs a sharded cluster)"""
+        self.ensure_indexes()
+        self.client.admin.command('enableSharding', self.db.name)
+        for name in SHARDED_COLLECTIONS:
+            self.client.admin.command('shardCollection', f'{self.db.name}.{name}', key={'tenant': 'hashed'})
+        return list(SHARDED_COLLECTIONS)
+    
+    def list_tenants(self):
+        """Every tenant with settings in the database"""
+        return sorted(self.settings_collection.distinct('tenant'))
+    
+    # Data versions
+    def _bump_version(self, *collection_names):
+        """Record a write to collections, invalidating reports computed from them
+        
+        Also releases the revisions this thread reserved, whose writes are
+        done by now. Returns the collections' new counters.
+        """
+        counters = self.counters_collection.find_one_and_update(
+            {'_id': f'{self.tenant}:versions', 'tenant': self.tenant},
+            {'$inc': {name: 1 for name in collection_names}, '$pull': self._lease_release()},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        self._held_revisions().clear()
+        return {name: counters[name] for name in collection_names}
+    
+    def get_versions(self, *collection_names):
+        """Write counters of the given collections"""
+        doc = self.counters_collection.find_one({'_id': f'{self.tenant}:versions'}) or {}
+        return {name: doc.get(name, 0) for name in collection_names}
+    
+    def _counters_with_epoch(self):
+        """The tenant's counter document, given a random epoch when it has none yet"""
+        counters = self.counters_collection.find_one({'_id': f'{self.tenant}:versions'})
+        if counters is None or 'epoch' not in counters:
+            counters = self.counters_collection.find_one_and_update(
+                {'_id': f'{self.tenant}:versions', 'tenant': self.tenant},
+                [{'$set': {'epoch': {'$ifNull': ['$epoch', str(ObjectId())]}}}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        return counters
+    
+    # Revisions
+    def _next_revisions(self, count=1):
+        """Reserve count consecutive revisions of this tenant; returns the first
+        
+        The reservation is leased in the counter document until this thread
+        releases it (_bump_version or _release_revisions), so changes_since
+        never moves past a revision whose write is not visible yet.
+        """
+        revision = {'$ifNull': ['$revision', 0]}
+        counters = self.counters_collection.find_one_and_update(
+            {'_id': f'{self.tenant}:versions', 'tenant': self.tenant},
+            [{'$set': {
+                'revision': {'$add': [revision, count]},
+                'in_flight': {'$concatArrays': [
+                    {'$ifNull': ['$in_flight', []]},
+                    [{'first': {'$add': [revision, 1]}, 'at': datetime.now()}],
+                ]},
+            }}],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        first = counters['revision'] - count + 1
+        self._held_revisions().append(first)
+        return first
+    
+    def _held_revisions(self):
+        if not hasattr(self._leases, 'firsts'):
+            self._leases.firsts = []
+        return self._leases.firsts
+    
+    def _lease_release(self):
+        """$pull of this thread's leases, and of any that timed out"""
+        return {'in_flight': {'$or': [
+            {'first': {'$in': self._held_revisions()}},
+            {'at': {'$lt': datetime.now() - REVISION_LEASE_TIMEOUT}},
+        ]}}
+    
+    def _release_revisions(self):
+        """Release this thread's reserved revisions after writes that bump no version"""
+        if self._held_revisions():
+            self.counters_collection.update_one(
+                {'_id': f'{self.tenant}:versions', 'tenant': self.tenant},
+                {'$pull': self._lease_release()}
+            )
+            self._held_revisions().clear()
+    
+    def _stamp_new(self, documents):
+        """Give each new document its own revision"""
+        if documents:
+            first = self._next_revisions(len(documents))
+            for revision, doc in enumerate(documents, first):
+                doc['revision'] = revision
+                doc['created_revision'] = revision
+        return documents
+    
+    def _stamp_update(self, update):
+        """update with a fresh revision added to its $set"""
+        update.setdefault('$set', {})['revision'] = self._next_revisions()
+        return update
+    
+    def _record_deletions(self, collection_name, ids):
+        """Leave a tombstone per deleted document so changes_since can report it"""
+        if ids:
+            first = self._next_revisions(len(ids))
+            self.deletions_collection.insert_many([
+                {'tenant': self.tenant, 'collection': collection_name, 'document_id': doc_id, 'revision': revision}
+                for revision, doc_id in enumerate(ids, first)
+            ])
+    
+    def backfill_revisions(self, batch_size=1000):
+        """Stamp documents written before revisions existed, so changes_since(0) returns them"""
+        stamped = 0
+        for name in FEED_COLLECTIONS:
+            collection = self.db[name]
+            while True:
+                ids = [doc['_id'] for doc in collection.find(
+                    self._scope({'revision': {'$exists': False}}), {'_id': 1}
+                ).limit(batch_size)]
+                if not ids:
+                    break
+                first = self._next_revisions(len(ids))
+                collection.bulk_write([
+                    UpdateOne({'_id': doc_id}, {'$set': {'revision': revision, 'created_revision': revision}})
+                    for revision, doc_id in enumerate(ids, first)
+                ], ordered=False)
+                stamped += len(ids)
+        self._release_revisions()
+        return stamped
+    
+    def changes_since(self, revision=0, limit=1000):
+        """Inserts, updates and deletes after a revision, oldest first
+        
+        Returns {"since", "revision", "has_more", "changes"}; each change has
+        its "revision", "collection", "operation" (insert, update or delete),
+        the document "id" and the current "document" (None for deletes).
+        Pass the returned revision to the next call to continue. A document
+        changed several times is reported once, at its latest revision.
+        
+        Revisions are reserved before the writes that use them, and writes
+        finish out of order. Changes stop short of the oldest revision still
+        leased to a write in progress, so a later call cannot turn up a change
+        below the revision it was given. A lease is ignored once it is
+        REVISION_LEASE_TIMEOUT old (its write most likely failed).
+        """
+        if self.journal:
+            # Journaled entries get their revisions when they are written
+            self.journal.flush()
+        counters = self.counters_collection.find_one({'_id': f'{self.tenant}:versions'}) or {}
+        cutoff = datetime.now() - REVISION_LEASE_TIMEOUT
+        leased = [lease['first'] for lease in counters.get('in_flight', []) if lease['at'] >= cutoff]
+        horizon = min(leased) - 1 if leased else counters.get('revision', 0)
+        query = self._scope({'revision': {'$gt': revision, '$lte': horizon}})
+        changes = []
+        # limit + 1 from each source tells whether anything is left after this page
+        for name in FEED_COLLECTIONS:
+            for doc in self.db[name].find(query, {'tenant': 0}).sort('revision', ASCENDING).limit(limit + 1):
+                doc_revision = doc.pop('revision')
+                created = doc.pop('created_revision', None)
+                changes.append({
+                    'revision': doc_revision,
+                    'collection': name,
+                    'operation': 'insert' if created == doc_revision else 'update',
+                    'id': doc['_id'],
+                    'document': doc,
+                })
+        for tombstone in self.deletions_collection.find(query).sort('revision', ASCENDING).limit(limit + 1):
+            changes.append({
+                'revision': tombstone['revision'],
+                'collection': tombstone['collection'],
+                'operation': 'delete',
+                'id': tombstone['document_id'],
+                'document': None,
+            })
+        
+        changes.sort(key=lambda change: change['revision'])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return {
+            'since': revision,
+            'revision': changes[-1]['revision'] if changes else revision,
+            'has_more': has_more,
+            'changes': changes,
+        }
+    
+    def cached_report(self, name, collection_names, compute, params=()):
+        """compute() memoised until one of the collections it reads is written
+        
+        params are any other inputs of the report (e.g. the current month).
+        The result is shared between callers and must not be modified.
+        """
+        counters = self._counters_with_epoch()
+        versions = {collection_name: counters.get(collection_name, 0) for collection_name in collection_names}
+        if self.journal:
+            # Journaled entries are visible before they bump a version
+            for collection_name in collection_names:
+                versions[f'{collection_name}:pending'] = self.journal.pending_count(collection_name)
+        key = ReportCache.make_key(f'{self.tenant}:{name}', versions, params, counters['epoch'])
+        return self.report_cache.get_or_compute(key, compute)
+    
+    # Backups
+    def record_backup(self, record):
+        """Remember a finished backup (incremental backups start from the latest)"""
+        self.backups_collection.insert_one({'tenant': self.tenant, **record})
+    
+    def get_last_backup(self):
+        """The most recent backup of this tenant, or None"""
+        return self.backups_collection.find_one(self._scope(), ENTRY_PROJECTION, sort=[('started', -1)])
+    
+    def mark_restored(self, collection_names):
+        """Drop everything derived from collections that were just restored
+        
+        Restored documents keep their revisions, so the revision counter is
+        moved past them; change consumers should sync again from revision 0.
+        """
+        self._bump_version(*collection_names)
+        self.category_spend_collection.delete_many(self._scope())
+        self._fx_table = None
+        latest = [
+            doc['revision']
+            for name in collection_names if name in FEED_COLLECTIONS
+            for doc in self.db[name].find(self._scope(), {'revision': 1}).sort('revision', -1).limit(1)
+            if 'revision' in doc
+        ]
+        if latest:
+            self.counters_collection.update_one(
+                {'_id': f'{self.tenant}:versions', 'tenant': self.tenant},
+                {'$max': {'revision': max(latest)}},
+                upsert=True
+            )
+    
+    def unit_of_work(self):
+        """Queue related writes and commit them as one unit (see unit_of_work for standalone servers)
+        
+            with data_manager.unit_of_work() as uow:
+                uow.update('investments', {'_id': investment_id}, {'$inc': {'current_value': 100}})
+                uow.insert('expenses', entry)
+        """
+        return UnitOfWork(self)
+    
+    def recover_units(self, min_age=RECOVERY_AGE):
+        """Roll forward units of work left half-written (default: those over a minute old)
+        
+        Returns how many were found. Younger ones may still be committing in
+        another process; init-db passes min_age=timedelta(0) to take them all.
+        """
+        return recover_units(self, min_age)
+    
+    # Write-behind journal
+    def _write_journaled(self, collection_name, documents):
+        """Flush journaled documents (called from the journal's background thread)"""
+        # Revisions are given out as entries become visible, not when they are journaled
+        self._stamp_new(documents)
+        try:
+            if collection_name != 'expenses':
+                self.db[collection_name].insert_many(documents, ordered=False)
+                return
+            try:
+                self.expenses_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                # Only count the entries this flush actually stored
+                failed = {err['index'] for err in e.details.get('writeErrors', [])}
+                self._increment_category_spend([doc for i, doc in enumerate(documents) if i not in failed])
+                raise
+            self._increment_category_spend(documents)
+        finally:
+            # The ledger columns got these entries when they were journaled
+            self.ledger.advance(collection_name, self._bump_version(collection_name)[collection_name])
+    
+    def _insert_entry(self, collection, entry):
+        """Insert a new entry, through the journal when one is configured"""
+        # Client-generated ids make journal replays idempotent
+        entry['_id'] = ObjectId()
+        entry['tenant'] = self.tenant
+        records, version = (), None
+        self.ledger.begin_write()
+        try:
+            if self.journal:
+                self.journal.append(collection.name, entry)
+            else:
+                self._stamp_new([entry])
+                collection.insert_one(entry)
+                version = self._bump_version(collection.name)[collection.name]
+            records = self._ledger_records(collection.name, [entry])
+        finally:
+            self.ledger.end_write(collection.name, records, version)
+    
+    def _ledger_records(self, collection_name, documents):
+        """New entries as records for the ledger columns, in the reporting currency"""
+        return self.to_reporting_currency([LEDGER_RECORDS[collection_name].from_doc(doc) for doc in documents])
+    
+    def get_ledger_columns(self, collection_name):
+        """Income or expense columns shared by every manager of this session (see ledger_cache)"""
+        versions = self.get_versions(collection_name, 'fx_rates')
+        key = (versions[collection_name], versions['fx_rates'], self.get_reporting_currency())
+        return self.ledger.get(
+            collection_name, key,
+            lambda: self._find_records(self.db[collection_name], LEDGER_RECORDS[collection_name])
+        )
+    
+    def _find_entries(self, collection, query, pending_filter=None):
+        """Find entries (without _id), including ones still waiting in the journal"""
+        query = self._scope(query)
+        pending = self._pending(collection.name)
+        if not pending:
+            return self.to_reporting_currency(list(collection.find(query, ENTRY_PROJECTION)))
+        
+        # A flush may be in flight, so skip stored copies of pending entries
+        pending_ids = {doc['_id'] for doc in pending}
+        results = [doc for doc in collection.find(query, INTERNAL_PROJECTION) if doc['_id'] not in pending_ids]
+        results.extend(doc for doc in pending if pending_filter is None or pending_filter(doc))
+        for doc in results:
+            for field in ENTRY_PROJECTION:
+                doc.pop(field, None)
+        return self.to_reporting_currency(results)
+    
+    def _find_records(self, collection, record_type, query=None):
+        """Find documents as compact records, including entries still waiting in the journal"""
+        projection = record_type.projection()
+        pending = self._pending(collection.name)
+        if pending:
+            projection['_id'] = 1
+        cursor = collection.find(self._scope(query), projection)
+        if pending:
+            # A flush may be in flight, so skip stored copies of pending entries
+            pending_ids = {doc['_id'] for doc in pending}
+            cursor = (doc for doc in cursor if doc['_id'] not in pending_ids)
+        records = [record_type.from_doc(doc) for doc in cursor]
+        records.extend(record_type.from_doc(doc) for doc in pending)
+        return self.to_reporting_currency(records)
+    
+    def _pending(self, collection_name):
+        """This tenant's documents still waiting in the journal"""
+        if not self.journal:
+            return []
+        return [doc for doc in self.journal.pending(collection_name) if doc.get('tenant') == self.tenant]
+    
+    # Currencies
+    def get_reporting_currency(self):
+        """ISO code that totals are reported in (and the currency of entries without one)"""
+        settings = self.settings_collection.find_one(self._scope())
+        return settings.get('reporting_currency', DEFAULT_REPORTING_CURRENCY) if settings else DEFAULT_REPORTING_CURRENCY
+    
+    def set_reporting_currency(self, code):
+        """Set the reporting currency ISO code"""
+        self.settings_collection.update_one(
+            self._scope(),
+            self._stamp_update({'$set': {'reporting_currency': code.upper()}}),
+            upsert=True
+        )
+        self._bump_version('settings')
+    
+    def import_fx_rates(self, rates, base=None):
+        """Store exchange rates (rows of date, currency, rate in base currency units)
+        
+        All stored rates share one base currency, the reporting currency by
+        default. Re-importing a (currency, date) pair replaces its rate.
+        """
+        base = (base or self.get_reporting_currency()).upper()
+        existing = self.fx_rates_collection.find_one(self._scope(), {'base': 1})
+        if existing and existing['base'] != base:
+            raise ValueError(f"Stored rates are against {existing['base']}, not {base}")
+        
+        if rates:
+            first = self._next_revisions(len(rates))
+            self.fx_rates_collection.bulk_write([
+                UpdateOne(
+                    self._scope({'currency': row['currency'], 'date': row['date']}),
+                    {
+                        '$set': {'rate': row['rate'], 'base': base, 'revision': revision},
+                        '$setOnInsert': {'created_revision': revision},
+                    },
+                    upsert=True
+                )
+                for revision, row in enumerate(rates, first)
+            ], ordered=False)
+        self._fx_table = None
+        self._bump_version('fx_rates')
+        return len(rates)
+    
+    def get_fx_table(self):
+        """Exchange-rate table, loaded once and kept until new rates are imported"""
+        if self._fx_table is None:
+            rates = list(self.fx_rates_collection.find(self._scope(), ENTRY_PROJECTION))
+            base = rates[0]['base'] if rates else self.get_reporting_currency()
+            self._fx_table = FxTable(rates, base)
+        return self._fx_table
+    
+    def _check_currency(self, currency):
+        """Upper-cased currency code; ValueError when it cannot be converted"""
+        currency = currency.upper()
+        if currency != self.get_reporting_currency() and currency not in self.get_fx_table().currencies():
+            raise ValueError(f"No exchange rates for {currency}; import them with 'pfa import-rates'")
+        return currency
+    
+    def to_reporting_currency(self, entries):
+        """Convert entry amounts into the reporting currency in place
+        
+        Converted entries keep their currency and gain original_amount.
+        Ledgers without foreign-currency entries are returned untouched.
+        """
+        foreign = [entry for entry in entries if entry.get('currency')]
+        if not foreign:
+            return entries
+        reporting = self.get_reporting_currency()
+        foreign = [entry for entry in foreign if entry['currency'] != reporting]
+        if not foreign:
+            return entries
+        
+        converted = self.get_fx_table().convert(
+            [entry['amount'] for entry in foreign],
+            [entry['currency'] for entry in foreign],
+            [entry['date'] for entry in foreign],
+            reporting,
+        )
+        for entry, amount in zip(foreign, converted.tolist()):
+            entry['original_amount'] = entry['amount']
+            entry['amount'] = amount
+        return entries
+    
+    # Change streams (require a replica set; a single-node one is enough)
+    def operation_time(self):
+        """Current cluster operation time, for starting a change stream after a read"""
+        return self.db.command('ping').get('operationTime')
+    
+    def watch_ledger(self, start_at_operation_time=None):
+        """Open a change stream over income, expenses, investments and settings
+        
+        Deletes without a pre-image are passed through whatever their tenant,
+        since nothing in the event says whose document it was.
+        """
+        # Pre-images let deletes and edits of entries be subtracted without a re-read
+        for name in ('income', 'expenses', 'investments'):
+            try:
+                self.db.command('collMod', name, changeStreamPreAndPostImages={'enabled': True})
+            except OperationFailure:
+                pass
+        
+        return self.db.watch(
+            self._ledger_watch_pipeline(),
+            full_document='updateLookup',
+            full_document_before_change='whenAvailable',
+            start_at_operation_time=start_at_operation_time,
+        )
+    
+    def _ledger_watch_pipeline(self):
+        return [{'$match': {
+            'ns.coll': {'$in': ['income', 'expenses', 'investments', 'settings', 'yearly_totals']},
+            '$or': [
+                {'fullDocument.tenant': self.tenant},
+                {'fullDocumentBeforeChange.tenant': self.tenant},
+                # Without a pre-image a delete's tenant is unknown; the watcher reloads
+                {'operationType': 'delete', 'fullDocumentBeforeChange': None},
+            ],
+        }}]
     
     # Income methods
-    def add_income(self, amount, source, date, description=""):
-        """Add an income entry"""
+    def _new_entry(self, amount, group_field, group, date, description, currency=None):
+        """Income or expense document (group_field is "source" or "category")"""
         entry = {
             "amount": amount,
-            "source": source,
+            group_field: group,
             "date": date,
             "description": description,
             "timestamp": datetime.now().isoformat()
         }
-        self.income_collection.insert_one(entry)
+        if currency:
+            # Entries without a currency are in the reporting currency
+            entry["currency"] = self._check_currency(currency)
+        return entry
+    
+    def add_income(self, amount, source, date, description="", currency=None):
+        """Add an income entry"""
+        entry = self._new_entry(amount, "source", source, date, description, currency)
+        self._insert_entry(self.income_collection, entry)
         return entry
     
     def get_all_income(self):
         """Get all income entries"""
-        return list(self.income_collection.find({}, {'_id': 0}))
+        return self._find_entries(self.income_collection, {})
+    
+    def get_income_records(self):
+        """All income as IncomeRecords (amount, source, date and currency only)"""
+        return self._find_records(self.income_collection, IncomeRecord)
     
     def get_income_by_date_range(self, start_date, end_date):
         """Get income within a date range"""
-        return list(self.income_collection.find({
+        return self._find_entries(self.income_collection, {
             "date": {"$gte": start_date, "$lte": end_date}
-        }, {'_id': 0}))
+        }, lambda doc: start_date <= doc['date'] <= end_date)
     
     # Expense methods
-    def add_expense(self, amount, category, date, description=""):
+    def add_expense(self, amount, category, date, description="", currency=None):
         """Add an expense entry"""
-        entry = {
-            "amount": amount,
-            "category": category,
-            "date": date,
-            "description": description,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.expenses_collection.insert_one(entry)
+        entry = self._new_entry(amount, "category", category, date, description, currency)
+        self._insert_entry(self.expenses_collection, entry)
+        if not self.journal:
+            self._increment_category_spend([entry])
         return entry
     
+    def add_expenses(self, entries):
+        """Add many expense entries at once (entries are amount/category/date/description dicts)"""
+        timestamp = datetime.now().isoformat()
+        documents = [{
+            "_id": ObjectId(),
+            "tenant": self.tenant,
+            "amount": entry['amount'],
+            "category": entry['category'],
+            "date": entry['date'],
+            "description": entry.get('description', ""),
+            "timestamp": timestamp
+        } for entry in entries]
+        for document, entry in zip(documents, entries):
+            if entry.get('currency'):
+                document["currency"] = self._check_currency(entry['currency'])
+        records, version = (), None
+        self.ledger.begin_write()
+        try:
+            if self.journal:
+                for doc in documents:
+                    self.journal.append(self.expenses_collection.name, doc)
+            elif documents:
+                self._stamp_new(documents)
+                self.expenses_collection.insert_many(documents)
+                self._increment_category_spend(documents)
+                version = self._bump_version('expenses')['expenses']
+            records = self._ledger_records('expenses', documents)
+        finally:
+            self.ledger.end_write('expenses', records, version)
+        return documents
+    
     def get_all_expenses(self):
         """Get all expense entries"""
-        return list(self.expenses_collection.find({}, {'_id': 0}))
+        return self._find_entries(self.expenses_collection, {})
+    
+    def get_expense_records(self):
+        """All expenses as ExpenseRecords (amount, category, date and currency only)"""
+        return self._find_records(self.expenses_collection, ExpenseRecord)
     
     def get_expenses_by_category(self, category):
         """Get expenses by category"""
-        return list(self.expenses_collection.find({
+        return self._find_entries(self.expenses_collection, {
             "category": {"$regex": f"^{category}$", "$options": "i"}
-        }, {'_id': 0}))
+        }, lambda doc: doc['category'].lower() == category.lower())
     
     def get_expenses_by_date_range(self, start_date, end_date):
         """Get expenses within a date range"""
-        return list(self.expenses_collection.find({
+        return self._find_entries(self.expenses_collection, {
             "date": {"$gte": start_date, "$lte": end_date}
-        }, {'_id': 0}))
+        }, lambda doc: start_date <= doc['date'] <= end_date)
+    
+    def get_description_categories(self):
+        """Distinct (description, category) pairs of past expenses with how often each was used"""
+        return [
+            {'description': row['_id']['description'], 'category': row['_id']['category'], 'count': row['count']}
+            for row in self.expenses_collection.aggregate([
+                {'$match': self._scope({'description': {'$nin': ['', None]}})},
+                {'$group': {
+                    '_id': {'description': '$description', 'category': '$category'},
+                    'count': {'$sum': 1},
+                }},
+            ])
+        ]
+    
+    # Category rule methods
+    def add_category_rule(self, pattern, category, kind):
+        """Add an auto-categorization rule (kind: keyword, merchant or regex)"""
+        rule = {
+            "tenant": self.tenant,
+            "pattern": pattern,
+            "category": category,
+            "kind": kind,
+            "created_date": datetime.now().isoformat()
+        }
+        self._stamp_new([rule])
+        self.category_rules_collection.insert_one(rule)
+        self._bump_version('category_rules')
+        return rule
+    
+    def get_category_rules(self):
+        """Get auto-categorization rules in the order they were added"""
+        return list(self.category_rules_collection.find(self._scope(), ENTRY_PROJECTION).sort('created_date', ASCENDING))
+    
+    def delete_category_rule(self, index):
+        """Delete a rule by its position in get_category_rules()"""
+        rules = list(self.category_rules_collection.find(self._scope(), {'_id': 1}).sort('created_date', ASCENDING))
+        if 0 <= index < len(rules):
+            self.category_rules_collection.delete_one({'_id': rules[index]['_id']})
+            self._record_deletions('category_rules', [rules[index]['_id']])
+            self._bump_version('category_rules')
+            return True
+        return False
     
     # Recurring expense methods
     def add_recurring_expense(self, amount, category, description, frequency):
         """Add a recurring expense"""
         entry = {
+            "tenant": self.tenant,
             "amount": amount,
             "category": category,
             "description": description,
@@ -105,26 +834,29 @@ class DataManager:
             "created_date": datetime.now().isoformat(),
             "last_processed": None
         }
+        self._stamp_new([entry])
         self.recurring_expenses_collection.insert_one(entry)
+        self._bump_version('recurring_expenses')
         return entry
     
     def get_recurring_expenses(self):
         """Get all recurring expenses"""
-        return list(self.recurring_expenses_collection.find({}, {'_id': 0}))
+        return list(self.recurring_expenses_collection.find(self._scope(), ENTRY_PROJECTION))
     
     def update_recurring_expense_processed(self, index, date):
         """Update the last processed date for a recurring expense"""
-        recurring = list(self.recurring_expenses_collection.find({}))
+        recurring = list(self.recurring_expenses_collection.find(self._scope(), {'_id': 1}))
         if 0 <= index < len(recurring):
             self.recurring_expenses_collection.update_one(
                 {'_id': recurring[index]['_id']},
-                {'$set': {'last_processed': date}}
+                self._stamp_update({'$set': {'last_processed': date}})
             )
+            self._bump_version('recurring_expenses')
     
     # Investment methods
-    def add_investment(self, name, amount, type_name, purpose, date):
-        """Add an investment entry"""
-        entry = {
+    def _new_investment(self, name, amount, type_name, purpose, date):
+        return {
+            "tenant": self.tenant,
             "name": name,
             "amount": amount,
             "type": type_name,
@@ -133,53 +865,140 @@ class DataManager:
             "current_value": amount,
             "timestamp": datetime.now().isoformat()
         }
+    
+    def add_investment(self, name, amount, type_name, purpose, date):
+        """Add an investment entry"""
+        entry = self._new_investment(name, amount, type_name, purpose, date)
+        self._stamp_new([entry])
         self.investments_collection.insert_one(entry)
+        self._bump_version('investments')
         return entry
     
-    def get_all_investments(self):
+    def get_all_investments(self, include_ids=False):
         """Get all investment entries"""
-        return list(self.investments_collection.find({}, {'_id': 0}))
+        projection = INTERNAL_PROJECTION if include_ids else ENTRY_PROJECTION
+        return list(self.investments_collection.find(self._scope(), projection))
+    
+    def get_investment_records(self):
+        """All investments as InvestmentRecords"""
+        return self._find_records(self.investments_collection, InvestmentRecord)
     
     def get_investments_by_purpose(self, purpose):
         """Get investments by purpose"""
-        return list(self.investments_collection.find({
+        return list(self.investments_collection.find(self._scope({
             "purpose": {"$regex": f"^{purpose}$", "$options": "i"}
-        }, {'_id': 0}))
+        }), ENTRY_PROJECTION))
     
     def update_investment_value(self, index, new_value):
-        """Update the current value of an investment"""
-        investments = list(self.investments_collection.find({}))
+        """Update the current value of the investment at a position of get_all_investments()
+        
+        Positions shift when investments are added concurrently; prefer
+        set_investment_value with the investment's _id.
+        """
+        investments = list(self.investments_collection.find(self._scope(), {'_id': 1}))
         if 0 <= index < len(investments):
-            self.investments_collection.update_one(
-                {'_id': investments[index]['_id']},
-                {'$set': {'current_value': new_value}}
-            )
-            return True
+            return self.set_investment_value(investments[index]['_id'], new_value)
         return False
     
+    def set_investment_value(self, investment_id, new_value):
+        """Update the current value of an investment"""
+        result = self.investments_collection.update_one(
+            self._scope({'_id': investment_id}),
+            self._stamp_update({'$set': {'current_value': new_value}})
+        )
+        if not result.matched_count:
+            self._release_revisions()
+            return False
+        self._bump_version('investments')
+        return True
+    
+    def deposit_to_investment(self, name, amount, date, investment_id=None, type_name="Other", purpose="General"):
+        """Move cash into an investment, recording the deposit as an Investment expense
+        
+        Adds to the investment with investment_id, or creates a new one called
+        name. Both writes commit as one unit of work. Returns the expense entry.
+        """
+        with self.unit_of_work() as uow:
+            if investment_id is None:
+                uow.insert('investments', self._new_investment(name, amount, type_name, purpose, date))
+            else:
+                uow.update('investments', {'_id': investment_id}, {'$inc': {'current_value': amount}})
+            return uow.insert('expenses', self._new_entry(
+                amount, "category", "Investment", date, f"Investment deposit to {name}"
+            ))
+    
+    def withdraw_from_investment(self, investment_id, name, amount, date):
+        """Take cash out of an investment, recording it as Investment Withdrawal income
+        
+        Both writes commit as one unit of work. Returns the income entry.
+        """
+        with self.unit_of_work() as uow:
+            uow.update('investments', {'_id': investment_id}, {'$inc': {'current_value': -amount}})
+            return uow.insert('income', self._new_entry(
+                amount, "source", "Investment Withdrawal", date, f"Withdrawal from {name}"
+            ))
+    
     # Settings methods
     def set_savings_goal(self, percentage):
         """Set the savings goal percentage"""
         self.settings_collection.update_one(
-            {},
-            {'$set': {'savings_goal_percentage': percentage}},
+            self._scope(),
+            self._stamp_update({'$set': {'savings_goal_percentage': percentage}}),
             upsert=True
         )
+        self._bump_version('settings')
     
     def get_savings_goal(self):
         """Get the savings goal percentage"""
-        settings = self.settings_collection.find_one({})
+        settings = self.settings_collection.find_one(self._scope())
         return settings.get('savings_goal_percentage', 20.0) if settings else 20.0
     
+    def set_return_assumption(self, type_name, mean_return, volatility, monthly_contribution):
+        """Set the simulation assumptions (annual %, annual %, per month) for an investment type
+        
+        Raises ValueError for a blank type, a return of -100% or less (which
+        has no log return), or a negative volatility or contribution.
+        """
+        key = category_key(type_name)
+        if not key:
+            raise ValueError("Investment type cannot be empty")
+        if mean_return <= -100:
+            raise ValueError("Expected return must be above -100%")
+        if volatility < 0 or monthly_contribution < 0:
+            raise ValueError("Volatility and contribution cannot be negative")
+        self.settings_collection.update_one(
+            self._scope(),
+            self._stamp_update({'$set': {f'return_assumptions.{key}': {
+                "type": type_name.strip(),
+                "mean_return": mean_return,
+                "volatility": volatility,
+                "monthly_contribution": monthly_contribution,
+            }}}),
+            upsert=True
+        )
+        self._bump_version('settings')
+    
+    def get_return_assumptions(self):
+        """Get user-defined simulation assumptions keyed by investment type"""
+        settings = self.settings_collection.find_one(self._scope())
+        stored = settings.get('return_assumptions', {}) if settings else {}
+        # Stored under category keys, with the type's own spelling alongside
+        assumptions = {}
+        for key, values in stored.items():
+            values = dict(values)
+            assumptions[values.pop('type', key)] = values
+        return assumptions
+    
     def get_currency(self):
         """Get the currency symbol"""
-        settings = self.settings_collection.find_one({})
+        settings = self.settings_collection.find_one(self._scope())
         return settings.get('currency', '$') if settings else '$'
     
     # Debt methods
-    def add_debt(self, amount, description, date, month_limit=None, target_date=None):
-        """Add a debt/overexpense entry"""
+    def add_debt(self, amount, description, date, month_limit=None, target_date=None, interest_rate=None):
+        """Add a debt/overexpense entry (interest_rate is an optional annual %)"""
         entry = {
+            "tenant": self.tenant,
             "amount": amount,
             "description": description,
             "date": date,
@@ -187,54 +1006,166 @@ class DataManager:
             "payments": [],
             "month_limit": month_limit,
             "target_date": target_date,
+            "interest_rate": interest_rate,
             "timestamp": datetime.now().isoformat()
         }
+        self._stamp_new([entry])
         self.debts_collection.insert_one(entry)
+        self._bump_version('debts')
         return entry
     
     def get_all_debts(self):
         """Get all debt entries"""
-        return list(self.debts_collection.find({}))
+        return list(self.debts_collection.find(self._scope(), INTERNAL_PROJECTION))
+    
+    def get_debt_records(self):
+        """All debts as DebtRecords (without their payment history)"""
+        return self._find_records(self.debts_collection, DebtRecord)
     
     def get_active_debts(self):
         """Get debts that are not fully paid"""
-        all_debts = list(self.debts_collection.find({}))
+        all_debts = list(self.debts_collection.find(self._scope(), INTERNAL_PROJECTION))
         return [d for d in all_debts if d['amount'] > d.get('paid', 0)]
     
     def add_debt_payment(self, debt_id, amount, date):
         """Record a payment towards a debt"""
-        debt = self.debts_collection.find_one({'_id': debt_id})
-        if debt:
-            new_paid = debt.get('paid', 0) + amount
-            payment = {"amount": amount, "date": date}
-            
-            self.debts_collection.update_one(
-                {'_id': debt_id},
-                {
-                    '$set': {'paid': new_paid},
-                    '$push': {'payments': payment}
-                }
-            )
-            return True
-        return False
+        # One atomic update, so concurrent payments all count
+        payment = {"amount": amount, "date": date}
+        result = self.debts_collection.update_one(
+            self._scope({'_id': debt_id}),
+            self._stamp_update({
+                '$inc': {'paid': amount},
+                '$push': {'payments': payment}
+            })
+        )
+        if not result.matched_count:
+            self._release_revisions()
+            return False
+        self._bump_version('debts')
+        return True
     
     def set_debt_repayment_goal(self, amount):
         """Set monthly debt repayment goal"""
         self.settings_collection.update_one(
-            {},
-            {'$set': {'debt_repayment_goal': amount}},
+            self._scope(),
+            self._stamp_update({'$set': {'debt_repayment_goal': amount}}),
             upsert=True
         )
+        self._bump_version('settings')
     
     def get_debt_repayment_goal(self):
         """Get monthly debt repayment goal"""
-        settings = self.settings_collection.find_one({})
+        settings = self.settings_collection.find_one(self._scope())
         return settings.get('debt_repayment_goal', 0) if settings else 0
     
+    # Category budget methods
+    def set_category_budget(self, category, amount):
+        """Set a monthly budget for a category (None or 0 removes it)"""
+        field = f'category_budgets.{category_key(category)}'
+        if amount:
+            update = {'$set': {field: {'category': category, 'amount': amount}}}
+        else:
+            update = {'$unset': {field: ''}}
+        self.settings_collection.update_one(self._scope(), self._stamp_update(update), upsert=True)
+        self._bump_version('settings')
+    
+    def get_category_budgets(self):
+        """Monthly budgets as {category key: {"category", "amount"}}"""
+        settings = self.settings_collection.find_one(self._scope(), {'category_budgets': 1})
+        return settings.get('category_budgets', {}) if settings else {}
+    
+    def _increment_category_spend(self, entries):
+        """Add newly stored expenses to the per-month spend counters"""
+        updates = self._category_spend_updates(entries)
+        if updates:
+            self.category_spend_collection.bulk_write(updates, ordered=False)
+    
+    def _category_spend_updates(self, entries):
+        """Upserts adding expenses to their months' spend counters"""
+        return [UpdateOne(query, update, upsert=True) for query, update in self._category_spend_changes(entries)]
+    
+    def _category_spend_changes(self, entries):
+        """(filter, update) of each month's spend counters the expenses add to"""
+        # Copies, so converting to the reporting currency leaves the entries alone
+        rows = self.to_reporting_currency([
+            {'amount': e['amount'], 'currency': e.get('currency'), 'date': e['date'], 'category': e['category']}
+            for e in entries
+        ])
+        by_month = {}
+        for row in rows:
+            month = by_month.setdefault(row['date'][:7], {'$inc': {}, '$set': {}})
+            key = category_key(row['category'])
+            month['$inc'][f'categories.{key}.total'] = month['$inc'].get(f'categories.{key}.total', 0) + row['amount']
+            month['$inc'][f'categories.{key}.count'] = month['$inc'].get(f'categories.{key}.count', 0) + 1
+            month['$set'][f'categories.{key}.category'] = row['category']
+        return [({'_id': self._spend_id(month), 'tenant': self.tenant}, update) for month, update in by_month.items()]
+    
+    def _spend_id(self, month):
+        return f'{self.tenant}:{month}'
+    
+    def _rebuild_category_spend(self, month, reporting):
+        """Recount one month's spend counters from the expense entries"""
+        groups = self._group_totals(
+            self.expenses_collection,
+            self._scope({'date': {'$gte': f'{month}-01', '$lte': f'{month}-31'}}),
+            'category'
+        )
+        categories = {}
+        for category, group in groups.items():
+            counter = categories.setdefault(category_key(category), {'category': category, 'total': 0, 'count': 0})
+            counter['total'] += group['total']
+            counter['count'] += group['count']
+        doc = {
+            '_id': self._spend_id(month), 'tenant': self.tenant, 'month': month,
+            'complete': True, 'currency': reporting, 'categories': categories,
+        }
+        self.category_spend_collection.replace_one({'_id': doc['_id']}, doc, upsert=True)
+        return doc
+    
+    def get_category_spend(self, month=None):
+        """Spend per category for a month as {category key: {"category", "total", "count"}}
+        
+        Reads one counter document kept up to date by add_expense. A month
+        is recounted from its entries only the first time it is read, or
+        after the reporting currency changes.
+        """
+        month = month or datetime.now().strftime("%Y-%m")
+        reporting = self.get_reporting_currency()
+        doc = self.category_spend_collection.find_one({'_id': self._spend_id(month)})
+        if doc is None or not doc.get('complete') or doc.get('currency') != reporting:
+            # Increments can create the document before it was ever counted
+            doc = self._rebuild_category_spend(month, reporting)
+        spend = doc.get('categories', {})
+        
+        # Journaled entries reach the counters when they are flushed
+        pending = self._pending('expenses')
+        for entry in self.to_reporting_currency([e for e in pending if e['date'].startswith(month)]):
+            counter = spend.setdefault(category_key(entry['category']),
+                                       {'category': entry['category'], 'total': 0, 'count': 0})
+            counter['total'] += entry['amount']
+            counter['count'] += 1
+        return spend
+    
+    def get_budget_status(self, month=None):
+        """Budget, spend and remaining amount for every budgeted category this month"""
+        spend = self.get_category_spend(month)
+        status = {}
+        for key, budget in self.get_category_budgets().items():
+            spent = spend.get(key, {}).get('total', 0)
+            status[key] = {
+                'category': budget['category'],
+                'budget': budget['amount'],
+                'spent': spent,
+                'remaining': budget['amount'] - spent,
+                'percent_used': spent / budget['amount'] * 100,
+            }
+        return status
+    
     # Goals methods
     def add_goal(self, name, target_amount, monthly_target, deadline, description, date):
         """Add a savings goal"""
         entry = {
+            "tenant": self.tenant,
             "name": name,
             "target_amount": target_amount,
             "monthly_target": monthly_target,
@@ -245,39 +1176,253 @@ class DataManager:
             "contributions": [],
             "timestamp": datetime.now().isoformat()
         }
+        self._stamp_new([entry])
         self.goals_collection.insert_one(entry)
+        self._bump_version('goals')
         return entry
     
     def get_all_goals(self):
         """Get all savings goals"""
-        return list(self.goals_collection.find({}))
+        return list(self.goals_collection.find(self._scope(), INTERNAL_PROJECTION))
+    
+    def get_goal_records(self):
+        """All savings goals as GoalRecords (without their contributions)"""
+        return self._find_records(self.goals_collection, GoalRecord)
     
     def get_active_goals(self):
         """Get goals that are not fully funded"""
-        all_goals = list(self.goals_collection.find({}))
+        all_goals = list(self.goals_collection.find(self._scope(), INTERNAL_PROJECTION))
         return [g for g in all_goals if g['target_amount'] > g.get('saved', 0)]
     
     def add_goal_contribution(self, goal_id, amount, date):
         """Record a contribution towards a goal"""
-        goal = self.goals_collection.find_one({'_id': goal_id})
-        if goal:
-            new_saved = goal.get('saved', 0) + amount
-            contribution = {"amount": amount, "date": date}
-            
-            self.goals_collection.update_one(
-                {'_id': goal_id},
-                {
-                    '$set': {'saved': new_saved},
-                    '$push': {'contributions': contribution}
-                }
-            )
-            return True
-        return False
+        # One atomic update, so concurrent contributions all count
+        contribution = {"amount": amount, "date": date}
+        result = self.goals_collection.update_one(
+            self._scope({'_id': goal_id}),
+            self._stamp_update({
+                '$inc': {'saved': amount},
+                '$push': {'contributions': contribution}
+            })
+        )
+        if not result.matched_count:
+            self._release_revisions()
+            return False
+        self._bump_version('goals')
+        return True
     
     def update_goal_monthly_target(self, goal_id, new_target):
         """Update the monthly target for a goal"""
-        self.goals_collection.update_one(
-            {'_id': goal_id},
-            {'$set': {'monthly_target': new_target}}
+        result = self.goals_collection.update_one(
+            self._scope({'_id': goal_id}),
+            self._stamp_update({'$set': {'monthly_target': new_target}})
         )
+        if not result.matched_count:
+            self._release_revisions()
+            return False
+        self._bump_version('goals')
         return True
+    
+    # Archive methods
+    def archive_entries(self, collection_name, cutoff_date, batch_size=1000):
+        """Move entries dated before cutoff_date into per-year archive collections
+        
+        Each year's totals are recomputed from its archive collection, so an
+        interrupted run can simply be repeated. Returns {year: entries moved}.
+        Raises ValueError for a batch_size below 1, before anything is written.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        live = self.db[collection_name]
+        years = sorted(row['_id'] for row in live.aggregate([
+            {'$match': self._scope({'date': {'$lt': cutoff_date}})},
+            {'$group': {'_id': {'$substrBytes': ['$date', 0, 4]}}},
+        ]))
+        
+        moved = {}
+        for year in years:
+            archive = self.db[f'{collection_name}_archive_{year}']
+            query = self._scope({'date': {'$gte': f'{year}-01-01', '$lt': min(cutoff_date, f'{int(year) + 1}-01-01')}})
+            
+            ids = []
+            batch = []
+            for doc in live.find(query).batch_size(batch_size):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    ids.extend(self._copy_to_archive(archive, batch))
+                    batch = []
+            if batch:
+                ids.extend(self._copy_to_archive(archive, batch))
+            
+            self._refresh_yearly_totals(collection_name, year)
+            for i in range(0, len(ids), batch_size):
+                live.delete_many({'_id': {'$in': ids[i:i + batch_size]}})
+                self._record_deletions(collection_name, ids[i:i + batch_size])
+            moved[year] = len(ids)
+        if moved:
+            self._bump_version(collection_name, 'yearly_totals')
+        return moved
+    
+    def _copy_to_archive(self, archive, documents):
+        try:
+            archive.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Copied by an earlier interrupted run
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+        return [doc['_id'] for doc in documents]
+    
+    def _group_totals(self, collection, query, group_field):
+        """{group: {"total", "count"}} in the reporting currency for matching entries"""
+        # Foreign-currency entries are summed per date so each day's rate applies
+        rows = [
+            {
+                'group': row['_id']['group'],
+                'currency': row['_id']['currency'],
+                'date': row['_id']['date'],
+                'amount': row['total'],
+                'count': row['count'],
+            }
+            for row in collection.aggregate([
+                {'$match': query},
+                {'$group': {
+                    '_id': {
+                        'group': f'${group_field}',
+                        'currency': '$currency',
+                        'date': {'$cond': [{'$ifNull': ['$currency', False]}, '$date', None]},
+                    },
+                    'total': {'$sum': '$amount'},
+                    'count': {'$sum': 1},
+                }},
+            ])
+        ]
+        groups = {}
+        for row in self.to_reporting_currency(rows):
+            group = groups.setdefault(row['group'], {'total': 0, 'count': 0})
+            group['total'] += row['amount']
+            group['count'] += row['count']
+        return groups
+    
+    def _refresh_yearly_totals(self, collection_name, year):
+        """Recompute the stored totals for one archived year, in the reporting currency"""
+        group_field = ARCHIVED_COLLECTIONS[collection_name]
+        archive = self.db[f'{collection_name}_archive_{year}']
+        groups = self._group_totals(archive, self._scope(), group_field)
+        
+        revision = self._next_revisions()
+        self.yearly_totals_collection.update_one(
+            self._scope({'collection': collection_name, 'year': year}),
+            {
+                '$set': {
+                    'group_field': group_field,
+                    'currency': self.get_reporting_currency(),
+                    'total': sum(g['total'] for g in groups.values()),
+                    'count': sum(g['count'] for g in groups.values()),
+                    'groups': groups,
+                    'revision': revision,
+                },
+                '$setOnInsert': {'created_revision': revision},
+            },
+            upsert=True
+        )
+    
+    def get_archived_totals(self, collection_name=None):
+        """Get precomputed yearly totals of archived entries
+        
+        Totals stored in another currency (the reporting currency changed
+        since they were computed) are recomputed from the archive first.
+        """
+        query = self._scope({'collection': collection_name} if collection_name else None)
+        totals = list(self.yearly_totals_collection.find(query, ENTRY_PROJECTION).sort('year', ASCENDING))
+        reporting = self.get_reporting_currency()
+        stale = [t for t in totals if t.get('currency') != reporting]
+        if not stale:
+            return totals
+        for t in stale:
+            self._refresh_yearly_totals(t['collection'], t['year'])
+        self._bump_version('yearly_totals')
+        return list(self.yearly_totals_collection.find(query, ENTRY_PROJECTION).sort('year', ASCENDING))
+    
+    def get_archived_group_totals(self, collection_name):
+        """Archived totals and counts per source/category, summed over all years"""
+        groups = {}
+        for totals in self.get_archived_totals(collection_name):
+            for name, group in totals['groups'].items():
+                merged = groups.setdefault(name, {'total': 0, 'count': 0})
+                merged['total'] += group['total']
+                merged['count'] += group['count']
+        return groups
+    
+    def get_archived_entries(self, collection_name, year):
+        """Get the archived entries of one year"""
+        return list(self.db[f'{collection_name}_archive_{year}'].find(self._scope(), ENTRY_PROJECTION))
+    
+    # Search
+    def ensure_search_indexes(self):
+        """Create the text indexes used by search (a no-op once they exist)"""
+        for name, spec in SEARCHABLE_COLLECTIONS.items():
+            collection = self.db[name]
+            # Replaced by the tenant-prefixed index (a collection can have only one text index)
+            if 'search_text' in collection.index_information():
+                collection.drop_index('search_text')
+            collection.create_index(
+                [('tenant', ASCENDING)] + [(field, TEXT) for field in spec['text']],
+                weights=spec['text'],
+                name='tenant_search_text',
+                default_language='english',
+            )
+        self._search_indexes_ready = True
+    
+    def search_entries(self, text, collections=None, min_amount=None, max_amount=None,
+                       start_date=None, end_date=None, category=None, page=1, page_size=20):
+        """Ranked full-text search across income, expenses, investments, debts and goals
+        
+        Filters are combined with the text match; collections without a category
+        field are skipped when category is given. Entries still waiting in the
+        write journal show up once flushed. Returns {"total", "page", "page_size",
+        "results"} where each result carries its "collection" and "score".
+        """
+        if not self._search_indexes_ready:
+            self.ensure_search_indexes()
+        
+        # Every collection contributes its best page * page_size hits; merging
+        # those by score gives the exact requested page
+        limit = page * page_size
+        total = 0
+        hits = []
+        for name in collections or SEARCHABLE_COLLECTIONS:
+            spec = SEARCHABLE_COLLECTIONS[name]
+            query = self._scope({'$text': {'$search': text}})
+            if category is not None:
+                if spec['category'] is None:
+                    continue
+                query[spec['category']] = category
+            if min_amount is not None or max_amount is not None:
+                amount = query[spec['amount']] = {}
+                if min_amount is not None:
+                    amount['$gte'] = min_amount
+                if max_amount is not None:
+                    amount['$lte'] = max_amount
+            if start_date or end_date:
+                date = query['date'] = {}
+                if start_date:
+                    date['$gte'] = start_date
+                if end_date:
+                    date['$lte'] = end_date
+            
+            collection = self.db[name]
+            total += collection.count_documents(query)
+            cursor = collection.find(
+                query, {**ENTRY_PROJECTION, 'score': {'$meta': 'textScore'}}
+            ).sort([('score', {'$meta': 'textScore'})]).limit(limit)
+            for doc in cursor:
+                doc['collection'] = name
+                hits.append(doc)
+        
+        hits.sort(key=lambda doc: doc['score'], reverse=True)
+        return {
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'results': hits[(page - 1) * page_size:limit],
+        }
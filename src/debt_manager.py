@@ -4,6 +4,10 @@ Debt & Overexpense Manager - Track overspending and repayment goals
 
 from datetime import datetime
 
+from debt_payoff import solve_payoff
+from metrics import timed_view
+from report_renderer import Column, Report, ReportRenderer
+
 
 class DebtManager:
     def __init__(self, data_manager):
@@ -50,9 +54,21 @@ class DebtManager:
                     print("Note: Install python-dateutil for precise date calculations")
                     month_limit = None
             
+            # Optional interest rate, used by the payoff planner
+            rate_input = input("Annual interest rate % (or press Enter for none): ").strip()
+            interest_rate = None
+            if rate_input:
+                try:
+                    interest_rate = float(rate_input)
+                    if interest_rate < 0:
+                        print("Interest rate cannot be negative, skipping.")
+                        interest_rate = None
+                except ValueError:
+                    print("Invalid rate, skipping interest.")
+            
             date = datetime.now().strftime("%Y-%m-%d")
             
-            entry = self.data_manager.add_debt(amount, description, date, month_limit, target_date)
+            entry = self.data_manager.add_debt(amount, description, date, month_limit, target_date, interest_rate)
             currency = self.data_manager.get_currency()
             print(f"\nOverexpense recorded!")
             print(f"   Amount: {currency}{amount:,.2f}")
@@ -60,6 +76,8 @@ class DebtManager:
             print(f"   Date: {date}")
             if month_limit:
                 print(f"   Deadline: {month_limit} months (target: {target_date})")
+            if interest_rate:
+                print(f"   Interest rate: {interest_rate:.2f}% per year")
             
         except ValueError:
             print("Invalid amount. Please enter a number.")
@@ -158,22 +176,13 @@ class DebtManager:
         except ValueError:
             print("Invalid amount. Please enter a number.")
     
-    def view_debt_status(self):
-        """View all debts and repayment status"""
+    @timed_view
+    def get_debt_status(self):
+        """Compute debt totals and per-debt progress without printing anything"""
         all_debts = self.data_manager.get_all_debts()
-        
-        if not all_debts:
-            print("\nNo debts recorded. Great job!")
-            return
-        
-        currency = self.data_manager.get_currency()
         current_month = datetime.now().strftime("%Y-%m")
         repayment_goal = self.data_manager.get_debt_repayment_goal()
         
-        print("\n" + "="*60)
-        print("DEBT & OVEREXPENSE STATUS".center(60))
-        print("="*60)
-        
         active_debts = [d for d in all_debts if d['amount'] > d.get('paid', 0)]
         paid_debts = [d for d in all_debts if d['amount'] <= d.get('paid', 0)]
         
@@ -188,7 +197,70 @@ class DebtManager:
                 if payment['date'].startswith(current_month):
                     month_payments += payment['amount']
         
-        print(f"\nTotal Outstanding Debt: {currency}{total_remaining:,.2f}")
+        months_to_payoff = None
+        if repayment_goal > 0 and total_remaining > 0:
+            months_to_payoff = total_remaining / repayment_goal
+        
+        active = []
+        for debt in active_debts:
+            remaining = debt['amount'] - debt.get('paid', 0)
+            required_monthly = None
+            if debt.get('month_limit') and debt.get('target_date'):
+                required_monthly = remaining / debt['month_limit']
+            active.append({
+                "_id": debt['_id'],
+                "description": debt['description'],
+                "date": debt['date'],
+                "amount": debt['amount'],
+                "paid": debt.get('paid', 0),
+                "remaining": remaining,
+                "progress_pct": (debt.get('paid', 0) / debt['amount']) * 100,
+                "payment_count": len(debt.get('payments', [])),
+                "month_limit": debt.get('month_limit'),
+                "target_date": debt.get('target_date'),
+                "required_monthly": required_monthly,
+            })
+        
+        paid = []
+        for debt in paid_debts:
+            payments = debt.get('payments', [])
+            paid.append({
+                "_id": debt['_id'],
+                "description": debt['description'],
+                "date": debt['date'],
+                "amount": debt['amount'],
+                "paid_off": payments[-1]['date'] if payments else None,
+            })
+        
+        return {
+            "month": current_month,
+            "debt_count": len(all_debts),
+            "total_remaining": total_remaining,
+            "repayment_goal": repayment_goal,
+            "month_payments": month_payments,
+            "months_to_payoff": months_to_payoff,
+            "active": active,
+            "paid": paid,
+        }
+    
+    @timed_view
+    def view_debt_status(self):
+        """View all debts and repayment status"""
+        status = self.get_debt_status()
+        
+        if not status['debt_count']:
+            print("\nNo debts recorded. Great job!")
+            return
+        
+        currency = self.data_manager.get_currency()
+        repayment_goal = status['repayment_goal']
+        month_payments = status['month_payments']
+        
+        print("\n" + "="*60)
+        print("DEBT & OVEREXPENSE STATUS".center(60))
+        print("="*60)
+        
+        print(f"\nTotal Outstanding Debt: {currency}{status['total_remaining']:,.2f}")
         print(f"Monthly Repayment Goal: {currency}{repayment_goal:,.2f}")
         print(f"Paid This Month: {currency}{month_payments:,.2f}")
         
@@ -203,70 +275,124 @@ class DebtManager:
                 print(f"   Remaining to meet goal: {currency}{remaining_goal:,.2f}")
         
         # Check if any debt has deadline that won't be met
-        if repayment_goal > 0 and total_remaining > 0:
-            months_to_payoff = total_remaining / repayment_goal
-            print(f"\nAt current goal, payoff in: {months_to_payoff:.1f} months")
+        if status['months_to_payoff'] is not None:
+            print(f"\nAt current goal, payoff in: {status['months_to_payoff']:.1f} months")
         
-        if active_debts:
+        if status['active']:
             print("\n" + "-"*60)
             print("ACTIVE DEBTS".center(60))
             print("-"*60)
             
-            for i, debt in enumerate(active_debts, 1):
-                remaining = debt['amount'] - debt.get('paid', 0)
-                progress_pct = (debt.get('paid', 0) / debt['amount']) * 100
-                
+            for i, debt in enumerate(status['active'], 1):
                 print(f"\n[{i}] {debt['description']}")
                 print(f"    Date: {debt['date']}")
                 print(f"    Total: {currency}{debt['amount']:,.2f}")
-                print(f"    Paid: {currency}{debt.get('paid', 0):,.2f} ({progress_pct:.1f}%)")
-                print(f"    Remaining: {currency}{remaining:,.2f}")
+                print(f"    Paid: {currency}{debt['paid']:,.2f} ({debt['progress_pct']:.1f}%)")
+                print(f"    Remaining: {currency}{debt['remaining']:,.2f}")
                 
-                if debt.get('payments'):
-                    print(f"    Payments made: {len(debt['payments'])}")
+                if debt['payment_count']:
+                    print(f"    Payments made: {debt['payment_count']}")
                 
                 # Show deadline info
-                if debt.get('month_limit') and debt.get('target_date'):
-                    target_date = debt['target_date']
-                    print(f"    ⏰ Deadline: {target_date} ({debt['month_limit']} months)")
+                if debt['required_monthly'] is not None:
+                    print(f"    ⏰ Deadline: {debt['target_date']} ({debt['month_limit']} months)")
                     
                     # Calculate required monthly payment
                     if repayment_goal > 0:
-                        required_monthly = remaining / debt['month_limit']
+                        required_monthly = debt['required_monthly']
                         print(f"    Required monthly: {currency}{required_monthly:,.2f}")
                         
                         if required_monthly > repayment_goal:
                             print(f"    ⚠️  Current goal ({currency}{repayment_goal:,.2f}/mo) is too low!")
                             print(f"        Need to increase by {currency}{required_monthly - repayment_goal:,.2f}/mo")
         
-        if paid_debts:
+        if status['paid']:
             print("\n" + "-"*60)
             print("PAID OFF DEBTS".center(60))
             print("-"*60)
             
-            for debt in paid_debts:
+            for debt in status['paid']:
                 print(f"\n✓ {debt['description']}")
                 print(f"    Amount: {currency}{debt['amount']:,.2f}")
                 print(f"    Date created: {debt['date']}")
-                if debt.get('payments'):
-                    last_payment = debt['payments'][-1]['date']
-                    print(f"    Paid off: {last_payment}")
+                if debt['paid_off']:
+                    print(f"    Paid off: {debt['paid_off']}")
         
         print("\n" + "="*60)
     
-    def view_repayment_history(self):
-        """View detailed repayment history"""
-        all_debts = self.data_manager.get_all_debts()
+    @timed_view
+    def get_payoff_plan(self, monthly_budget=None):
+        """Payoff schedules for every strategy at the given (default: goal) monthly budget"""
+        if monthly_budget is None:
+            monthly_budget = self.data_manager.get_debt_repayment_goal()
+        return solve_payoff(self.data_manager.get_active_debts(), monthly_budget)
+    
+    @timed_view
+    def view_payoff_plan(self, monthly_budget=None):
+        """Compare avalanche, snowball and deadline-first payoff schedules"""
+        debts = self.data_manager.get_active_debts()
         
-        if not all_debts:
-            print("\nNo debt history found.")
+        if not debts:
+            print("\nNo active debts found.")
             return
         
         currency = self.data_manager.get_currency()
+        budget = monthly_budget
+        if budget is None:
+            budget = self.data_manager.get_debt_repayment_goal()
+        
         print("\n" + "="*60)
-        print("REPAYMENT HISTORY".center(60))
+        print("DEBT PAYOFF PLAN".center(60))
         print("="*60)
         
+        if budget <= 0:
+            print("\nSet a monthly repayment goal first to plan your payoff.")
+            return
+        
+        plans = solve_payoff(debts, budget)
+        
+        print(f"\nMonthly budget: {currency}{budget:,.2f}")
+        print("\n" + "-"*60)
+        print("STRATEGY COMPARISON".center(60))
+        print("-"*60)
+        for plan in plans:
+            print(f"\n{plan['strategy'].title()} ({plan['description']})")
+            if plan['debt_free_date']:
+                print(f"   Debt-free: {plan['debt_free_date']} ({plan['months']} months)")
+            else:
+                print("   ⚠️  Not paid off within 30 years at this budget")
+            print(f"   Total interest: {currency}{plan['total_interest']:,.2f}")
+            if plan['targets_missed']:
+                print(f"   ⚠️  Misses {plan['targets_missed']} target date(s)")
+        
+        # Recommend the cheapest plan that meets the most deadlines
+        best = min(plans, key=lambda p: (p['targets_missed'], p['total_interest']))
+        
+        print("\n" + "-"*60)
+        print(f"RECOMMENDED: {best['strategy'].upper()}".center(60))
+        print("-"*60)
+        for debt in sorted(best['debts'], key=lambda d: d['order']):
+            print(f"\n[{debt['order']}] {debt['description']}")
+            print(f"    Remaining: {currency}{debt['remaining']:,.2f}", end="")
+            print(f" at {debt['interest_rate']:.2f}%" if debt['interest_rate'] else "")
+            print(f"    Paid off: {debt['payoff_date'] or 'not within 30 years'}")
+            if debt['target_date']:
+                status = "✓ met" if debt['target_met'] else "✗ missed"
+                print(f"    Target: {debt['target_date']} ({status})")
+        
+        print("\n" + "="*60)
+    
+    @timed_view
+    def view_repayment_history(self, limit=10, output_format="table", stream=None):
+        """View detailed repayment history (most recent `limit` payments, None for all)"""
+        all_debts = self.data_manager.get_all_debts()
+        
+        if not all_debts and output_format == "table":
+            print("\nNo debt history found.", file=stream)
+            return
+        
+        currency = self.data_manager.get_currency()
+        
         all_payments = []
         for debt in all_debts:
             for payment in debt.get('payments', []):
@@ -276,27 +402,27 @@ class DebtManager:
                     'debt': debt['description']
                 })
         
-        if not all_payments:
-            print("\nNo repayments recorded yet.")
+        if not all_payments and output_format == "table":
+            print("\nNo repayments recorded yet.", file=stream)
             return
         
         # Sort by date
         all_payments.sort(key=lambda x: x['date'], reverse=True)
         
         total_repaid = sum(p['amount'] for p in all_payments)
+        shown = all_payments if limit is None else all_payments[:limit]
         
-        print(f"\nTotal Amount Repaid: {currency}{total_repaid:,.2f}")
-        print(f"Total Payments: {len(all_payments)}")
-        
-        print("\n" + "-"*60)
-        print("RECENT PAYMENTS".center(60))
-        print("-"*60)
+        note = None
+        if len(all_payments) > len(shown):
+            note = f"... and {len(all_payments) - len(shown)} more payment(s)"
         
-        for payment in all_payments[:10]:  # Show last 10 payments
-            print(f"\n{payment['date']}: {currency}{payment['amount']:,.2f}")
-            print(f"   → {payment['debt']}")
+        report = Report("REPAYMENT HISTORY")
+        report.add_section("RECENT PAYMENTS", [
+            Column("date", "Date"),
+            Column("amount", "Amount", "money"),
+            Column("debt", "Debt"),
+        ], shown, note)
+        report.add_summary("Total Amount Repaid", total_repaid)
+        report.add_summary("Total Payments", len(all_payments), "text")
         
-        if len(all_payments) > 10:
-            print(f"\n... and {len(all_payments) - 10} more payment(s)")
-        
-        print("="*60)
+        ReportRenderer(stream, output_format, currency).render(report)
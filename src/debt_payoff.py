@@ -0,0 +1,125 @@
+"""
+Debt Payoff - Month-by-month payoff schedules for avalanche, snowball and deadline-first
+
+Every strategy is simulated at once: balances are a (strategy x debt) array in
+which each row is sorted in that strategy's payment order, so one month of
+interest and payments is a handful of array operations regardless of how many
+debts there are.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+
+STRATEGIES = ("avalanche", "snowball", "deadline")
+STRATEGY_DESCRIPTIONS = {
+    "avalanche": "highest interest rate first",
+    "snowball": "smallest balance first",
+    "deadline": "earliest target date first",
+}
+DEFAULT_HORIZON_MONTHS = 360
+
+# Balances below this are treated as paid off (floating point leftovers)
+_PAID_EPSILON = 0.005
+
+
+def _month_index(year, month):
+    return year * 12 + (month - 1)
+
+
+def _month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def _payment_order(strategy, balances, rates, deadlines):
+    """Indices of the debts in the order a strategy pays them"""
+    if strategy == "avalanche":
+        # Highest rate first, smaller balance breaks ties
+        return np.lexsort((balances, -rates))
+    if strategy == "snowball":
+        return np.argsort(balances, kind="stable")
+    if strategy == "deadline":
+        # Earliest target date first; debts without one go last, by rate
+        return np.lexsort((-rates, deadlines))
+    raise ValueError(f"Unknown strategy '{strategy}'")
+
+
+def solve_payoff(debts, monthly_budget, strategies=STRATEGIES,
+                 horizon_months=DEFAULT_HORIZON_MONTHS, now=None):
+    """Simulate paying down active debts with a fixed monthly budget
+
+    debts are DataManager debt documents; interest_rate is an optional
+    annual percentage. The first payment is made in the current month.
+    Returns one result dict per strategy with the month each debt is paid
+    off (None if not within the horizon), total interest and whether each
+    target_date is met.
+    """
+    now = now or datetime.now()
+    start = _month_index(now.year, now.month)
+
+    active = [d for d in debts if d['amount'] - d.get('paid', 0) > 0]
+    n = len(active)
+    balances = np.array([d['amount'] - d.get('paid', 0) for d in active], dtype=float)
+    rates = np.array([(d.get('interest_rate') or 0) / 100 / 12 for d in active], dtype=float)
+    no_deadline = np.iinfo(np.int64).max
+    deadlines = np.array([
+        _month_index(int(d['target_date'][:4]), int(d['target_date'][5:7])) if d.get('target_date') else no_deadline
+        for d in active
+    ], dtype=np.int64)
+
+    orders = np.array([_payment_order(s, balances, rates, deadlines) for s in strategies]).reshape(len(strategies), n)
+    owed = balances[orders]
+    monthly_rates = rates[orders]
+    payoff = np.full(owed.shape, -1, dtype=np.int64)
+    interest = np.zeros(len(strategies))
+
+    for month in range(horizon_months):
+        if not (owed > 0).any():
+            break
+        accrued = owed * monthly_rates
+        interest += accrued.sum(axis=1)
+        owed += accrued
+
+        # Pour the budget down each row in payment order
+        paid_before = np.cumsum(owed, axis=1) - owed
+        payment = np.clip(monthly_budget - paid_before, 0, owed)
+        owed -= payment
+
+        cleared = (owed <= _PAID_EPSILON) & (payoff < 0)
+        payoff[cleared] = month
+        owed[owed <= _PAID_EPSILON] = 0
+
+    results = []
+    for row, strategy in enumerate(strategies):
+        per_debt = [None] * n
+        for position, index in enumerate(orders[row]):
+            debt = active[index]
+            month = int(payoff[row, position])
+            payoff_index = start + month if month >= 0 else None
+            target_met = None
+            if debt.get('target_date'):
+                target_met = payoff_index is not None and bool(payoff_index <= deadlines[index])
+            per_debt[index] = {
+                "description": debt['description'],
+                "remaining": float(balances[index]),
+                "interest_rate": debt.get('interest_rate') or 0,
+                "target_date": debt.get('target_date'),
+                "payoff_date": _month_label(payoff_index) if payoff_index is not None else None,
+                "months": month + 1 if month >= 0 else None,
+                "target_met": target_met,
+                "order": position + 1,
+            }
+
+        all_paid = bool((payoff[row] >= 0).all())
+        results.append({
+            "strategy": strategy,
+            "description": STRATEGY_DESCRIPTIONS[strategy],
+            "monthly_budget": monthly_budget,
+            "debt_free_date": _month_label(start + int(payoff[row].max())) if all_paid and n else None,
+            "months": int(payoff[row].max()) + 1 if all_paid and n else None,
+            "total_interest": float(interest[row]),
+            "targets_missed": sum(1 for d in per_debt if d['target_met'] is False),
+            "debts": per_debt,
+        })
+    return results
@@ -2,8 +2,18 @@
 Expense Manager - Handles expense tracking including recurring expenses
 """
 
+import re
 from datetime import datetime
 
+from categorizer import Categorizer, learn_mappings
+from data_manager import category_key
+from metrics import timed_view
+from report_renderer import Column, Report, ReportRenderer
+
+
+# Share of a category budget used before add/simulate start warning
+BUDGET_WARNING_THRESHOLD = 0.9
+
 
 class ExpenseManager:
     def __init__(self, data_manager):
@@ -13,6 +23,38 @@ class ExpenseManager:
             "Healthcare", "Entertainment", "Shopping", "Education",
             "Insurance", "Debt", "Savings", "Other"
         ]
+        self._categorizer = None
+    
+    def get_categorizer(self):
+        """Categorizer built from the saved rules and past expenses (built once, then reused)"""
+        if self._categorizer is None:
+            self._categorizer = Categorizer(
+                self.data_manager.get_category_rules(),
+                learn_mappings(self.data_manager.get_description_categories()),
+            )
+        return self._categorizer
+    
+    def _budget_warning(self, category, amount, month, added=False):
+        """Print where a category stands against its monthly budget after an expense
+        
+        With added=True the expense is already in the counters; otherwise
+        (simulations) amount is added on top.
+        """
+        status = self.data_manager.get_budget_status(month).get(category_key(category))
+        if status is None:
+            return
+        currency = self.data_manager.get_currency()
+        spent = status['spent'] if added else status['spent'] + amount
+        budget = status['budget']
+        print(f"\nBudget for {status['category']} ({month}): {currency}{spent:,.2f} of {currency}{budget:,.2f}")
+        if spent > budget:
+            print(f"⚠️  OVER BUDGET by {currency}{spent - budget:,.2f}")
+        elif spent >= budget * BUDGET_WARNING_THRESHOLD:
+            print(f"⚠️  {spent / budget * 100:.0f}% of this month's budget used")
+    
+    def suggest_category(self, description):
+        """Suggested category for a description, or None"""
+        return self.get_categorizer().categorize(description) if description else None
     
     def add_expense(self):
         """Add a new expense entry"""
@@ -26,12 +68,28 @@ class ExpenseManager:
                 print("Amount must be positive.")
                 return
             
+            # Only offered once exchange rates have been imported
+            currency = None
+            reporting = self.data_manager.get_reporting_currency()
+            others = [c for c in self.data_manager.get_fx_table().currencies() if c != reporting]
+            if others:
+                currency = input(f"Enter currency ({', '.join(others)}) or press Enter for {reporting}: ").strip().upper()
+                if currency and currency != reporting and currency not in others:
+                    print(f"No exchange rates for {currency}. Using {reporting}.")
+                currency = currency if currency in others else None
+            
+            description = input("Enter description (optional): ").strip()
+            suggested = self.suggest_category(description)
+            
             print("\nCommon categories:")
             for i, cat in enumerate(self.common_categories, 1):
                 print(f"  [{i}] {cat}", end="   " if i % 3 != 0 else "\n")
             print()
             
-            category = input("\nEnter category (or select number): ").strip()
+            if suggested:
+                category = input(f"\nEnter category (or select number) [{suggested}]: ").strip() or suggested
+            else:
+                category = input("\nEnter category (or select number): ").strip()
             
             # Check if user entered a number
             try:
@@ -56,14 +114,15 @@ class ExpenseManager:
             else:
                 date = datetime.now().strftime("%Y-%m-%d")
             
-            description = input("Enter description (optional): ").strip()
-            
-            entry = self.data_manager.add_expense(amount, category, date, description)
-            currency = self.data_manager.get_currency()
+            entry = self.data_manager.add_expense(amount, category, date, description, currency)
             print(f"\nExpense added successfully!")
-            print(f"   Amount: {currency}{amount:,.2f}")
+            if currency:
+                print(f"   Amount: {amount:,.2f} {currency}")
+            else:
+                print(f"   Amount: {self.data_manager.get_currency()}{amount:,.2f}")
             print(f"   Category: {category}")
             print(f"   Date: {date}")
+            self._budget_warning(category, amount, date[:7], added=True)
             
         except ValueError:
             print("Invalid amount. Please enter a number.")
@@ -124,78 +183,107 @@ class ExpenseManager:
         except ValueError:
             print("Invalid amount. Please enter a number.")
     
-    def view_all_expenses(self):
+    @timed_view
+    def view_all_expenses(self, output_format="table", stream=None):
         """Display all expense entries"""
         expense_entries = self.data_manager.get_all_expenses()
         
-        if not expense_entries:
-            print("\nNo expense entries found.")
+        if not expense_entries and output_format == "table":
+            print("\nNo expense entries found.", file=stream)
             return
         
         currency = self.data_manager.get_currency()
-        print("\n" + "="*60)
-        print("ALL EXPENSE ENTRIES".center(60))
-        print("="*60)
         
         # Sort by date (newest first)
         sorted_expenses = sorted(expense_entries, key=lambda x: x['date'], reverse=True)
         
         total = 0
         total_investments = 0
-        for i, entry in enumerate(sorted_expenses, 1):
-            print(f"\n[{i}] {currency}{entry['amount']:,.2f}")
-            print(f"    Category: {entry['category']}")
-            print(f"    Date: {entry['date']}")
-            if entry.get('description'):
-                print(f"    Description: {entry['description']}")
-            
+        for entry in sorted_expenses:
             if entry['category'].lower() == 'investment':
                 total_investments += entry['amount']
             else:
                 total += entry['amount']
         
-        print("\n" + "-"*60)
-        print(f"TOTAL EXPENSES: {currency}{total:,.2f}")
+        report = Report("ALL EXPENSE ENTRIES")
+        report.add_section(None, [
+            Column("date", "Date"),
+            Column("amount", "Amount", "money"),
+            Column("category", "Category"),
+            Column("description", "Description"),
+        ], sorted_expenses)
+        report.add_summary("TOTAL EXPENSES", total)
         if total_investments > 0:
-            print(f"TOTAL INVESTMENTS: {currency}{total_investments:,.2f}")
-            print(f"COMBINED TOTAL: {currency}{total + total_investments:,.2f}")
-        print("-"*60)
+            report.add_summary("TOTAL INVESTMENTS", total_investments)
+            report.add_summary("COMBINED TOTAL", total + total_investments)
+        
+        ReportRenderer(stream, output_format, currency).render(report)
     
-    def view_by_category(self):
-        """Display expenses grouped by category"""
-        expense_entries = self.data_manager.get_all_expenses()
+    @timed_view
+    def get_category_totals(self):
+        """Totals and entry counts per category, live and archived (None if there are no expenses)
         
-        if not expense_entries:
-            print("\nNo expense entries found.")
-            return
+        Memoised until expenses, archives, settings or exchange rates change.
+        """
+        return self.data_manager.cached_report(
+            'expenses_by_category', ('expenses', 'yearly_totals', 'settings', 'fx_rates'),
+            self._compute_category_totals
+        )
+    
+    def _compute_category_totals(self):
+        expenses = self.data_manager.get_ledger_columns('expenses')
+        # Archived years only keep per-category totals
+        archived = self.data_manager.get_archived_group_totals('expenses')
         
-        currency = self.data_manager.get_currency()
+        if not len(expenses) and not archived:
+            return None
         
         # Group by category
         by_category = {}
-        for entry in expense_entries:
-            category = entry['category']
+        for category, group in archived.items():
+            by_category[category] = dict(group)
+        for category, group in expenses.by_label().items():
             if category not in by_category:
-                by_category[category] = []
-            by_category[category].append(entry)
+                by_category[category] = {'total': 0, 'count': 0}
+            by_category[category]['total'] += group['total']
+            by_category[category]['count'] += group['count']
         
         # Separate regular expenses from investments
         total_expenses = sum(
-            entry['amount'] for entry in expense_entries
-            if entry['category'].lower() != 'investment'
+            group['total'] for category, group in by_category.items()
+            if category.lower() != 'investment'
         )
         total_investments = sum(
-            entry['amount'] for entry in expense_entries
-            if entry['category'].lower() == 'investment'
+            group['total'] for category, group in by_category.items()
+            if category.lower() == 'investment'
         )
         
+        return {
+            'by_category': by_category,
+            'total_expenses': total_expenses,
+            'total_investments': total_investments,
+        }
+    
+    @timed_view
+    def view_by_category(self):
+        """Display expenses grouped by category"""
+        totals = self.get_category_totals()
+        
+        if totals is None:
+            print("\nNo expense entries found.")
+            return
+        
+        currency = self.data_manager.get_currency()
+        by_category = totals['by_category']
+        total_expenses = totals['total_expenses']
+        total_investments = totals['total_investments']
+        
         print("\n" + "="*60)
         print("EXPENSES BY CATEGORY".center(60))
         print("="*60)
         
         for category in sorted(by_category.keys()):
-            entries = by_category[category]
-            category_total = sum(entry['amount'] for entry in entries)
+            category_total = by_category[category]['total']
             
             # Calculate percentage based on appropriate total
             if category.lower() == 'investment':
@@ -209,7 +297,7 @@ class ExpenseManager:
             
             print(f"\n{category} {label}")
             print(f"   Total: {currency}{category_total:,.2f} ({percentage:.1f}%)")
-            print(f"   Entries: {len(entries)}")
+            print(f"   Entries: {by_category[category]['count']}")
         
         print("\n" + "-"*60)
         print(f"CONSUMPTION EXPENSES: {currency}{total_expenses:,.2f}")
@@ -218,6 +306,7 @@ class ExpenseManager:
         print(f"TOTAL OUTFLOWS: {currency}{total_expenses + total_investments:,.2f}")
         print("-"*60)
     
+    @timed_view
     def view_recurring_expenses(self):
         """Display all recurring expenses"""
         recurring = self.data_manager.get_recurring_expenses()
@@ -255,51 +344,74 @@ class ExpenseManager:
         print(f"ESTIMATED MONTHLY TOTAL: {currency}{total_monthly:,.2f}")
         print("-"*60)
     
-    def process_recurring_expenses(self):
-        """Process recurring expenses for the current month"""
-        recurring = self.data_manager.get_recurring_expenses()
+    def apply_recurring_expenses(self, confirm=None, on_skipped=None):
+        """Add this month's recurring expenses that have not been processed yet
         
-        if not recurring:
-            print("\nNo recurring expenses found.")
-            return
+        confirm is an optional callback taking the recurring entry and returning
+        True to add it; without one every pending entry is added. on_skipped
+        is called, in order, with each entry already processed this month.
+        """
+        recurring = self.data_manager.get_recurring_expenses()
         
         current_month = datetime.now().strftime("%Y-%m")
         today = datetime.now().strftime("%Y-%m-%d")
-        processed_count = 0
-        
-        print("\n" + "="*60)
-        print("PROCESSING RECURRING EXPENSES".center(60))
-        print("="*60)
+        applied = []
+        skipped = []
         
         for i, entry in enumerate(recurring):
             last_processed = entry.get('last_processed', '')
             
             # Check if already processed this month
             if last_processed and last_processed.startswith(current_month):
-                print(f"\nSkipping: {entry['description']} (already processed this month)")
+                skipped.append(entry)
+                if on_skipped is not None:
+                    on_skipped(entry)
                 continue
             
+            if confirm is not None and not confirm(entry):
+                continue
+            
+            self.data_manager.add_expense(
+                entry['amount'],
+                entry['category'],
+                today,
+                f"{entry['description']} (Recurring)"
+            )
+            self.data_manager.update_recurring_expense_processed(i, today)
+            applied.append(entry)
+        
+        return {"date": today, "applied": applied, "skipped": skipped}
+    
+    def process_recurring_expenses(self):
+        """Process recurring expenses for the current month"""
+        if not self.data_manager.get_recurring_expenses():
+            print("\nNo recurring expenses found.")
+            return
+        
+        currency = self.data_manager.get_currency()
+        
+        print("\n" + "="*60)
+        print("PROCESSING RECURRING EXPENSES".center(60))
+        print("="*60)
+        
+        def confirm(entry):
             # Ask user to confirm
-            currency = self.data_manager.get_currency()
             print(f"\n{entry['description']}")
             print(f"   Amount: {currency}{entry['amount']:,.2f}")
             print(f"   Category: {entry['category']}")
             
-            confirm = input("   Add this expense? (y/n): ").strip().lower()
-            
-            if confirm == 'y':
-                self.data_manager.add_expense(
-                    entry['amount'],
-                    entry['category'],
-                    today,
-                    f"{entry['description']} (Recurring)"
-                )
-                self.data_manager.update_recurring_expense_processed(i, today)
-                processed_count += 1
+            if input("   Add this expense? (y/n): ").strip().lower() == 'y':
                 print("   Added!")
+                return True
+            return False
+        
+        def report_skipped(entry):
+            print(f"\nSkipping: {entry['description']} (already processed this month)")
+        
+        result = self.apply_recurring_expenses(confirm, report_skipped)
         
         print("\n" + "-"*60)
-        print(f"Processed {processed_count} recurring expense(s)")
+        print(f"Processed {len(result['applied'])} recurring expense(s)")
         print("-"*60)
     
     def investment_deposit(self):
@@ -315,7 +427,7 @@ class ExpenseManager:
                 return
             
             # List existing investments
-            investments = self.data_manager.get_all_investments()
+            investments = self.data_manager.get_all_investments(include_ids=True)
             
             print("\n[0] Create New Investment")
             if investments:
@@ -333,6 +445,7 @@ class ExpenseManager:
                 return
             
             investment_name = ""
+            date = datetime.now().strftime("%Y-%m-%d")
             
             if choice_num == 0:
                 # Create new investment
@@ -349,8 +462,8 @@ class ExpenseManager:
                 if not purpose:
                     purpose = "General"
                 
-                date = datetime.now().strftime("%Y-%m-%d")
-                self.data_manager.add_investment(investment_name, amount, inv_type, purpose, date)
+                # The investment and its deposit expense are written together
+                self.data_manager.deposit_to_investment(investment_name, amount, date, type_name=inv_type, purpose=purpose)
                 print(f"\nNew investment '{investment_name}' created!")
             
             elif 1 <= choice_num <= len(investments):
@@ -360,7 +473,7 @@ class ExpenseManager:
                 current_value = inv.get('current_value', inv['amount'])
                 new_value = current_value + amount
                 
-                self.data_manager.update_investment_value(choice_num - 1, new_value)
+                self.data_manager.deposit_to_investment(investment_name, amount, date, investment_id=inv['_id'])
                 print(f"\nInvestment '{investment_name}' updated!")
                 currency = self.data_manager.get_currency()
                 print(f"   Previous value: {currency}{current_value:,.2f}")
@@ -370,11 +483,6 @@ class ExpenseManager:
                 print("Invalid selection.")
                 return
             
-            # Create expense entry
-            date = datetime.now().strftime("%Y-%m-%d")
-            description = f"Investment deposit to {investment_name}"
-            self.data_manager.add_expense(amount, "Investment", date, description)
-            
             currency = self.data_manager.get_currency()
             print(f"\nExpense recorded: {currency}{amount:,.2f} (Investment)")
             print("Your available balance has been reduced accordingly.")
@@ -417,19 +525,25 @@ class ExpenseManager:
             
             # Calculate current financial status
             currency = self.data_manager.get_currency()
-            all_income = self.data_manager.get_all_income()
-            all_expenses = self.data_manager.get_all_expenses()
+            income = self.data_manager.get_ledger_columns('income')
+            expenses = self.data_manager.get_ledger_columns('expenses')
             
-            total_income = sum(entry['amount'] for entry in all_income)
+            total_income = float(income.amounts.sum())
             # Separate regular expenses from investments
-            total_expenses = sum(
-                entry['amount'] for entry in all_expenses
-                if entry['category'].lower() != 'investment'
-            )
-            total_investments = sum(
-                entry['amount'] for entry in all_expenses
-                if entry['category'].lower() == 'investment'
-            )
+            category_totals, _ = expenses.group_totals()
+            is_investment = expenses.labels_matching(lambda name: name.lower() == 'investment')
+            total_expenses = float(category_totals[~is_investment].sum())
+            total_investments = float(category_totals[is_investment].sum())
+            
+            # Include archived years so all-time figures stay exact
+            archived_expenses = self.data_manager.get_archived_group_totals('expenses')
+            total_income += sum(g['total'] for g in self.data_manager.get_archived_group_totals('income').values())
+            for name, group in archived_expenses.items():
+                if name.lower() == 'investment':
+                    total_investments += group['total']
+                else:
+                    total_expenses += group['total']
+            
             current_balance = total_income - total_expenses - total_investments
             
             # Calculate after simulation (only affects balance if it's a regular expense)
@@ -479,9 +593,15 @@ class ExpenseManager:
                 print(f"\n⚠️  WARNING: This expense would result in a negative balance!")
                 print(f"   Shortfall: {currency}{abs(balance_after):,.2f}")
             
+            self._budget_warning(category, amount, datetime.now().strftime("%Y-%m"))
+            
             # Category comparison
             category_expenses = self.data_manager.get_expenses_by_category(category)
             category_total = sum(entry['amount'] for entry in category_expenses)
+            category_total += sum(
+                group['total'] for name, group in archived_expenses.items()
+                if name.lower() == category.lower()
+            )
             new_category_total = category_total + amount
             
             print(f"\nCategory Impact ({category}):")
@@ -518,3 +638,148 @@ class ExpenseManager:
             
         except ValueError:
             print("Invalid amount. Please enter a number.")
+    
+    def categorize_entries(self, entries, default_category=None):
+        """Fill in missing categories of imported entries; returns the entries left uncategorized"""
+        categorize = self.get_categorizer().categorize
+        uncategorized = []
+        for entry in entries:
+            if entry.get('category'):
+                continue
+            entry['category'] = categorize(entry.get('description') or "") or default_category
+            if not entry['category']:
+                uncategorized.append(entry)
+        return uncategorized
+    
+    def manage_category_rules(self):
+        """List, add, delete and try out auto-categorization rules"""
+        while True:
+            rules = self.data_manager.get_category_rules()
+            
+            print("\n" + "="*60)
+            print("AUTO-CATEGORIZATION RULES".center(60))
+            print("="*60)
+            
+            if rules:
+                for i, rule in enumerate(rules, 1):
+                    print(f"  [{i}] {rule['kind']:<9} {rule['pattern']!r} → {rule['category']}")
+            else:
+                print("\nNo rules yet. Past expenses with the same description are still used.")
+            
+            print("\n[1] Add Rule")
+            print("[2] Delete Rule")
+            print("[3] Test a Description")
+            print("[0] Back")
+            print("\n" + "-"*60)
+            
+            choice = input("Select an option: ").strip()
+            
+            if choice == "1":
+                print("\nRule kinds:")
+                print("  [1] Keyword  - word or phrase anywhere in the description")
+                print("  [2] Merchant - description starts with this name")
+                print("  [3] Regex    - regular expression on the raw description")
+                kind_choice = input("Select kind: ").strip()
+                kinds = {"1": "keyword", "2": "merchant", "3": "regex"}
+                if kind_choice not in kinds:
+                    print("Invalid option.")
+                    continue
+                kind = kinds[kind_choice]
+                pattern = input("Enter pattern: ").strip()
+                category = input("Enter category: ").strip()
+                if not pattern or not category:
+                    print("Pattern and category cannot be empty.")
+                    continue
+                try:
+                    Categorizer([{"pattern": pattern, "category": category, "kind": kind}])
+                except re.error as e:
+                    print(f"Invalid regular expression: {e}")
+                    continue
+                self.data_manager.add_category_rule(pattern, category, kind)
+                self._categorizer = None
+                print("\nRule added successfully!")
+            elif choice == "2":
+                try:
+                    index = int(input("Enter rule number to delete: ").strip()) - 1
+                except ValueError:
+                    print("Invalid input. Please enter a number.")
+                    continue
+                if self.data_manager.delete_category_rule(index):
+                    self._categorizer = None
+                    print("\nRule deleted.")
+                else:
+                    print("Invalid rule number.")
+            elif choice == "3":
+                description = input("Enter description: ").strip()
+                category = self.suggest_category(description)
+                print(f"\nSuggested category: {category or '(no match)'}")
+            elif choice == "0":
+                break
+            else:
+                print("Invalid option. Please try again.")
+    
+    def set_budget(self):
+        """Set or remove a monthly budget for a category"""
+        print("\n" + "="*60)
+        print("SET CATEGORY BUDGET".center(60))
+        print("="*60)
+        
+        print("\nCommon categories:")
+        for i, cat in enumerate(self.common_categories, 1):
+            print(f"  [{i}] {cat}", end="   " if i % 3 != 0 else "\n")
+        print()
+        
+        category = input("\nEnter category (or select number): ").strip()
+        try:
+            cat_num = int(category)
+            if 1 <= cat_num <= len(self.common_categories):
+                category = self.common_categories[cat_num - 1]
+        except ValueError:
+            pass
+        
+        if not category:
+            print("Category cannot be empty.")
+            return
+        
+        try:
+            amount = float(input("Enter monthly budget (0 to remove): ").strip())
+            if amount < 0:
+                print("Budget cannot be negative.")
+                return
+        except ValueError:
+            print("Invalid amount. Please enter a number.")
+            return
+        
+        self.data_manager.set_category_budget(category, amount)
+        currency = self.data_manager.get_currency()
+        if amount:
+            print(f"\nMonthly budget for {category} set to {currency}{amount:,.2f}")
+        else:
+            print(f"\nBudget for {category} removed.")
+    
+    @timed_view
+    def view_budgets(self, output_format="table", stream=None):
+        """Display this month's spend against each category budget"""
+        status = self.data_manager.get_budget_status()
+        
+        if not status and output_format == "table":
+            print("\nNo category budgets set.", file=stream)
+            return
+        
+        currency = self.data_manager.get_currency()
+        rows = sorted(status.values(), key=lambda row: row['category'])
+        for row in rows:
+            row['used'] = f"{row['percent_used']:.0f}%" + (" OVER" if row['spent'] > row['budget'] else "")
+        
+        report = Report(f"CATEGORY BUDGETS - {datetime.now().strftime('%Y-%m')}")
+        report.add_section(None, [
+            Column("category", "Category"),
+            Column("budget", "Budget", "money"),
+            Column("spent", "Spent", "money"),
+            Column("remaining", "Remaining", "money"),
+            Column("used", "Used"),
+        ], rows)
+        report.add_summary("TOTAL BUDGETED", sum(row['budget'] for row in rows))
+        report.add_summary("TOTAL SPENT", sum(row['spent'] for row in rows))
+        
+        ReportRenderer(stream, output_format, currency).render(report)
@@ -0,0 +1,86 @@
+"""
+FX Rates - Local exchange-rate table and vectorized currency conversion
+
+Rates are loaded from CSV files (no network access) and kept per currency as
+sorted NumPy arrays of dates and rates, so converting a whole ledger is one
+searchsorted and one multiply per currency instead of a lookup per entry.
+"""
+
+import csv
+from datetime import datetime
+
+import numpy as np
+
+
+class FxTable:
+    """Exchange rates against a single base currency
+
+    rates are {"date", "currency", "rate"} rows where rate is the value of
+    one unit of currency in the base currency. An entry uses the latest rate
+    on or before its date; dates before a currency's first rate use that
+    first rate.
+    """
+
+    def __init__(self, rates, base):
+        self.base = base
+        by_currency = {}
+        for row in rates:
+            by_currency.setdefault(row['currency'], []).append((row['date'], row['rate']))
+        self._dates = {}
+        self._rates = {}
+        for currency, rows in by_currency.items():
+            rows.sort()
+            self._dates[currency] = np.array([date for date, _ in rows], dtype="datetime64[D]")
+            self._rates[currency] = np.array([rate for _, rate in rows], dtype=float)
+
+    def currencies(self):
+        """Every currency the table can convert"""
+        return sorted(set(self._dates) | {self.base})
+
+    def rates(self, currency, dates):
+        """Value of one unit of currency in the base currency on each date"""
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        if currency == self.base:
+            return np.ones(dates.shape)
+        if currency not in self._dates:
+            raise ValueError(f"No exchange rates for {currency}; import them with 'pfa import-rates'")
+        index = np.searchsorted(self._dates[currency], dates, side="right") - 1
+        np.maximum(index, 0, out=index)
+        return self._rates[currency][index]
+
+    def convert(self, amounts, currencies, dates, target):
+        """Convert amounts, each in its own currency on its own date, into target"""
+        amounts = np.asarray(amounts, dtype=float)
+        currencies = np.asarray(currencies)
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        converted = amounts.copy()
+        target_rates = None if target == self.base else self.rates(target, dates)
+        for currency in np.unique(currencies):
+            if currency == target:
+                continue
+            mask = currencies == currency
+            factor = self.rates(currency, dates[mask])
+            if target_rates is not None:
+                factor = factor / target_rates[mask]
+            converted[mask] = amounts[mask] * factor
+        return converted
+
+
+def load_rates_csv(path):
+    """Read date,currency,rate rows from a CSV file
+
+    Raises ValueError naming the first bad line.
+    """
+    rates = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for line, row in enumerate(csv.DictReader(f), 2):
+            try:
+                datetime.strptime(row['date'], "%Y-%m-%d")
+                rate = float(row['rate'])
+                currency = row['currency'].strip().upper()
+            except (KeyError, TypeError, AttributeError, ValueError):
+                raise ValueError(f"{path}:{line}: expected date (YYYY-MM-DD), currency and rate columns")
+            if rate <= 0 or not currency:
+                raise ValueError(f"{path}:{line}: rate must be positive and currency non-empty")
+            rates.append({"date": row['date'], "currency": currency, "rate": rate})
+    return rates
@@ -0,0 +1,123 @@
+"""
+Goal Projection - Monte Carlo estimates of when savings goals will be reached
+
+Monthly contributions are modelled as a normal distribution fitted to each
+goal's contribution history (falling back to its monthly target), and every
+goal is simulated as one (paths x months) NumPy array.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+
+DEFAULT_PATHS = 20000
+# Longest horizon simulated for goals without a deadline, and how many
+# times the expected months-to-goal is simulated before giving up
+MAX_HORIZON_MONTHS = 120
+HORIZON_FACTOR = 3
+# Relative spread assumed when there are too few months of history to measure one
+DEFAULT_VOLATILITY = 0.25
+MIN_HISTORY_MONTHS = 3
+
+
+def _month_index(year, month):
+    return year * 12 + (month - 1)
+
+
+def _parse_month(value):
+    """Month index for a 'YYYY-MM' or 'YYYY-MM-DD' string"""
+    return _month_index(int(value[0:4]), int(value[5:7]))
+
+
+def contribution_stats(goal, now=None):
+    """Mean and standard deviation of a goal's monthly contributions
+
+    Months without contributions count as zero. Returns None when there is
+    neither history nor a monthly target to project from.
+    """
+    now = now or datetime.now()
+    current = _month_index(now.year, now.month)
+    contributions = goal.get('contributions', [])
+
+    start = _parse_month(goal['date']) if goal.get('date') else current
+    if contributions:
+        start = min(start, min(_parse_month(c['date']) for c in contributions))
+    months = max(1, current - start + 1)
+
+    monthly = np.zeros(months)
+    for contribution in contributions:
+        index = _parse_month(contribution['date']) - start
+        if 0 <= index < months:
+            monthly[index] += contribution['amount']
+
+    target = goal.get('monthly_target', 0) or 0
+    if months >= MIN_HISTORY_MONTHS and monthly.sum() > 0:
+        return float(monthly.mean()), float(monthly.std(ddof=1))
+
+    # Not enough history: centre on the target (or what was saved so far)
+    mean = target if target > 0 else float(monthly.mean())
+    if mean <= 0:
+        return None
+    return mean, mean * DEFAULT_VOLATILITY
+
+
+def months_until(deadline, now=None):
+    """Whole months from now until a 'YYYY-MM' deadline (the deadline month included)"""
+    now = now or datetime.now()
+    return _parse_month(deadline) - _month_index(now.year, now.month)
+
+
+def project_goal(goal, n_paths=DEFAULT_PATHS, rng=None, now=None):
+    """Simulate future contributions for one goal
+
+    Returns a dict with the probability of reaching the target by the
+    deadline (None without a deadline) and the median and 90th percentile
+    months to completion (None when most paths never get there within the
+    horizon), or None when the goal cannot be projected.
+    """
+    remaining = goal['target_amount'] - goal.get('saved', 0)
+    if remaining <= 0:
+        return None
+
+    stats = contribution_stats(goal, now)
+    if stats is None:
+        return None
+    mean, std = stats
+
+    # Simulate a few times the expected duration, enough to reach any deadline
+    horizon = min(MAX_HORIZON_MONTHS, int(np.ceil(HORIZON_FACTOR * remaining / mean)))
+    deadline_months = None
+    if goal.get('deadline'):
+        deadline_months = months_until(goal['deadline'], now)
+        horizon = max(horizon, deadline_months)
+    horizon = max(horizon, 1)
+
+    rng = rng if rng is not None else np.random.default_rng()
+
+    # One row per path, one column per month; contributions cannot be negative
+    draws = rng.standard_normal(size=(n_paths, horizon), dtype=np.float32)
+    draws *= std
+    draws += mean
+    np.maximum(draws, 0, out=draws)
+    saved = np.cumsum(draws, axis=1)
+    reached = saved >= remaining
+
+    # First month each path reaches the target (horizon + 1 if it never does)
+    ever = reached[:, -1]
+    first = np.where(ever, reached.argmax(axis=1) + 1, horizon + 1)
+    median, p90 = np.percentile(first, [50, 90])
+
+    probability = None
+    if deadline_months is not None:
+        probability = float(reached[:, deadline_months - 1].mean()) if deadline_months > 0 else 0.0
+
+    return {
+        "mean_contribution": mean,
+        "std_contribution": std,
+        "paths": n_paths,
+        "deadline_months": deadline_months,
+        "probability_by_deadline": probability,
+        "median_months": float(median) if median <= horizon else None,
+        "p90_months": float(p90) if p90 <= horizon else None,
+    }
@@ -4,6 +4,9 @@ Goals Manager - Track savings goals for future expenses
 
 from datetime import datetime
 
+from goal_projection import project_goal
+from metrics import timed_view
+
 
 class GoalsManager:
     def __init__(self, data_manager):
@@ -117,6 +120,7 @@ class GoalsManager:
         except ValueError:
             print("Invalid input. Please enter valid numbers.")
     
+    @timed_view
     def view_all_goals(self):
         """View all savings goals"""
         all_goals = self.data_manager.get_all_goals()
@@ -203,6 +207,18 @@ class GoalsManager:
                 
                 if goal.get('contributions'):
                     print(f"    Contributions made: {len(goal['contributions'])}")
+                
+                # Monte Carlo projection from contribution history
+                projection = project_goal(goal)
+                if projection:
+                    if projection['median_months'] is not None:
+                        print(f"    Projected months to goal: {projection['median_months']:.0f}", end="")
+                        if projection['p90_months'] is not None:
+                            print(f" (90% chance within {projection['p90_months']:.0f})")
+                        else:
+                            print()
+                    if projection['probability_by_deadline'] is not None:
+                        print(f"    Chance of meeting deadline: {projection['probability_by_deadline'] * 100:.1f}%")
         
         if completed_goals:
             print("\n" + "-"*60)
@@ -267,6 +283,7 @@ class GoalsManager:
         except ValueError:
             print("Invalid input.")
     
+    @timed_view
     def view_contribution_history(self):
         """View contribution history across all goals"""
         all_goals = self.data_manager.get_all_goals()
@@ -4,6 +4,9 @@ Income Manager - Handles income tracking and reporting
 
 from datetime import datetime
 
+from metrics import timed_view
+from report_renderer import Column, Report, ReportRenderer
+
 
 class IncomeManager:
     def __init__(self, data_manager):
@@ -21,6 +24,16 @@ class IncomeManager:
                 print("Amount must be positive.")
                 return
             
+            # Only offered once exchange rates have been imported
+            currency = None
+            reporting = self.data_manager.get_reporting_currency()
+            others = [c for c in self.data_manager.get_fx_table().currencies() if c != reporting]
+            if others:
+                currency = input(f"Enter currency ({', '.join(others)}) or press Enter for {reporting}: ").strip().upper()
+                if currency and currency != reporting and currency not in others:
+                    print(f"No exchange rates for {currency}. Using {reporting}.")
+                currency = currency if currency in others else None
+            
             print("\nCommon sources: Salary, Freelance, Bonus, Investment Return, Gift, Other")
             source = input("Enter income source: ").strip()
             if not source:
@@ -40,85 +53,110 @@ class IncomeManager:
             
             description = input("Enter description (optional): ").strip()
             
-            entry = self.data_manager.add_income(amount, source, date, description)
-            currency = self.data_manager.get_currency()
+            entry = self.data_manager.add_income(amount, source, date, description, currency)
             print(f"\nIncome added successfully!")
-            print(f"   Amount: {currency}{amount:,.2f}")
+            if currency:
+                print(f"   Amount: {amount:,.2f} {currency}")
+            else:
+                print(f"   Amount: {self.data_manager.get_currency()}{amount:,.2f}")
             print(f"   Source: {source}")
             print(f"   Date: {date}")
             
         except ValueError:
             print("Invalid amount. Please enter a number.")
     
-    def view_all_income(self):
+    @timed_view
+    def view_all_income(self, output_format="table", stream=None):
         """Display all income entries"""
         income_entries = self.data_manager.get_all_income()
         
-        if not income_entries:
-            print("\nNo income entries found.")
+        if not income_entries and output_format == "table":
+            print("\nNo income entries found.", file=stream)
             return
         
         currency = self.data_manager.get_currency()
-        print("\n" + "="*60)
-        print("ALL INCOME ENTRIES".center(60))
-        print("="*60)
+        total = sum(entry['amount'] for entry in income_entries)
+        
+        report = Report("ALL INCOME ENTRIES")
+        report.add_section(None, [
+            Column("date", "Date"),
+            Column("amount", "Amount", "money"),
+            Column("source", "Source"),
+            Column("description", "Description"),
+        ], income_entries)
+        report.add_summary("TOTAL INCOME", total)
+        
+        ReportRenderer(stream, output_format, currency).render(report)
+    
+    @timed_view
+    def get_summary(self):
+        """Income totals, per-source amounts and this month's income (None if there is no income)
         
-        total = 0
-        for i, entry in enumerate(income_entries, 1):
-            print(f"\n[{i}] {currency}{entry['amount']:,.2f}")
-            print(f"    Source: {entry['source']}")
-            print(f"    Date: {entry['date']}")
-            if entry.get('description'):
-                print(f"    Description: {entry['description']}")
-            total += entry['amount']
+        Memoised until income, archives, settings or exchange rates change.
+        """
+        current_month = datetime.now().strftime("%Y-%m")
+        return self.data_manager.cached_report(
+            'income_summary', ('income', 'yearly_totals', 'settings', 'fx_rates'),
+            lambda: self._compute_summary(current_month), (current_month,)
+        )
+    
+    def _compute_summary(self, current_month):
+        income = self.data_manager.get_ledger_columns('income')
+        # Archived years only keep per-source totals
+        archived = self.data_manager.get_archived_group_totals('income')
         
-        print("\n" + "-"*60)
-        print(f"TOTAL INCOME: {currency}{total:,.2f}")
-        print("-"*60)
+        if not len(income) and not archived:
+            return None
+        
+        # Group by source
+        by_source = {}
+        entry_count = len(income)
+        for source, group in archived.items():
+            by_source[source] = group['total']
+            entry_count += group['count']
+        for source, group in income.by_label().items():
+            by_source[source] = by_source.get(source, 0) + group['total']
+        
+        # Calculate statistics
+        total_income = sum(by_source.values())
+        
+        # Get current month income
+        month_income = float(income.amounts[income.in_month(current_month)].sum())
+        
+        return {
+            'total_income': total_income,
+            'average_income': total_income / entry_count,
+            'entry_count': entry_count,
+            'month_income': month_income,
+            'by_source': sorted(by_source.items(), key=lambda x: x[1], reverse=True),
+        }
     
+    @timed_view
     def view_summary(self):
         """Display income summary with statistics"""
-        income_entries = self.data_manager.get_all_income()
+        summary = self.get_summary()
         
-        if not income_entries:
+        if summary is None:
             print("\nNo income entries found.")
             return
         
         currency = self.data_manager.get_currency()
-        
-        # Calculate statistics
-        total_income = sum(entry['amount'] for entry in income_entries)
-        avg_income = total_income / len(income_entries)
-        
-        # Group by source
-        by_source = {}
-        for entry in income_entries:
-            source = entry['source']
-            if source not in by_source:
-                by_source[source] = 0
-            by_source[source] += entry['amount']
-        
-        # Get current month income
-        current_month = datetime.now().strftime("%Y-%m")
-        month_income = sum(
-            entry['amount'] for entry in income_entries
-            if entry['date'].startswith(current_month)
-        )
+        total_income = summary['total_income']
         
         print("\n" + "="*60)
         print("INCOME SUMMARY".center(60))
         print("="*60)
         
         print(f"\nTotal Income: {currency}{total_income:,.2f}")
-        print(f"Average Income per Entry: {currency}{avg_income:,.2f}")
-        print(f"Total Entries: {len(income_entries)}")
-        print(f"Current Month Income: {currency}{month_income:,.2f}")
+        print(f"Average Income per Entry: {currency}{summary['average_income']:,.2f}")
+        print(f"Total Entries: {summary['entry_count']}")
+        print(f"Current Month Income: {currency}{summary['month_income']:,.2f}")
         
         print("\n" + "-"*60)
         print("INCOME BY SOURCE".center(60))
         print("-"*60)
         
-        for source, amount in sorted(by_source.items(), key=lambda x: x[1], reverse=True):
+        for source, amount in summary['by_source']:
             percentage = (amount / total_income) * 100
             print(f"{source:.<30} {currency}{amount:>12,.2f} ({percentage:>5.1f}%)")
         
@@ -130,7 +168,7 @@ class IncomeManager:
         print("INVESTMENT WITHDRAWAL".center(60))
         print("="*60)
         
-        investments = self.data_manager.get_all_investments()
+        investments = self.data_manager.get_all_investments(include_ids=True)
         
         if not investments:
             print("\nNo investments found. Create an investment first.")
@@ -167,14 +205,10 @@ class IncomeManager:
                 if confirm != 'y':
                     return
             
-            # Update investment value
+            # Lower the investment and record the income in one commit
             new_value = current_value - amount
-            self.data_manager.update_investment_value(choice - 1, new_value)
-            
-            # Create income entry
             date = datetime.now().strftime("%Y-%m-%d")
-            description = f"Withdrawal from {investment_name}"
-            self.data_manager.add_income(amount, "Investment Withdrawal", date, description)
+            self.data_manager.withdraw_from_investment(inv['_id'], investment_name, amount, date)
             
             print(f"\nWithdrawal successful!")
             print(f"   Withdrawn: {currency}{amount:,.2f}")
@@ -4,6 +4,9 @@ Investment Manager - Handles investment tracking and portfolio management
 
 from datetime import datetime
 
+from metrics import timed_view
+from portfolio_simulation import DEFAULT_YEARS, PERCENTILES, resolve_assumptions, simulate_purposes
+
 
 class InvestmentManager:
     def __init__(self, data_manager):
@@ -97,6 +100,7 @@ class InvestmentManager:
         print(f"   Purpose: {purpose}")
         print(f"   Date: {date}")
     
+    @timed_view
     def view_all_investments(self):
         """Display all investment entries"""
         investments = self.data_manager.get_all_investments()
@@ -146,6 +150,7 @@ class InvestmentManager:
             print(f"Total Loss: {currency}{total_gain_loss:,.2f} ({total_gain_loss_pct:.1f}%)")
         print("-"*60)
     
+    @timed_view
     def view_by_purpose(self):
         """Display investments grouped by purpose"""
         investments = self.data_manager.get_all_investments()
@@ -181,38 +186,66 @@ class InvestmentManager:
         
         print("="*60)
     
-    def view_summary(self):
-        """Display investment summary with statistics"""
-        investments = self.data_manager.get_all_investments()
+    @timed_view
+    def get_summary(self):
+        """Invested and current totals, by type and by purpose (None if there are no investments)
+        
+        Memoised until the investments change.
+        """
+        return self.data_manager.cached_report(
+            'investment_summary', ('investments',), self._compute_summary
+        )
+    
+    def _compute_summary(self):
+        investments = self.data_manager.get_investment_records()
         
         if not investments:
-            print("\nNo investments found.")
-            return
+            return None
         
-        currency = self.data_manager.get_currency()
-        
-        total_invested = sum(inv['amount'] for inv in investments)
-        total_current = sum(inv.get('current_value', inv['amount']) for inv in investments)
-        total_gain_loss = total_current - total_invested
-        total_gain_loss_pct = (total_gain_loss / total_invested) * 100 if total_invested > 0 else 0
+        total_invested = sum(inv.amount for inv in investments)
+        total_current = sum(inv.get('current_value', inv.amount) for inv in investments)
         
         # Group by type
         by_type = {}
         for inv in investments:
-            inv_type = inv['type']
+            inv_type = inv.type
             if inv_type not in by_type:
                 by_type[inv_type] = {'invested': 0, 'current': 0, 'count': 0}
-            by_type[inv_type]['invested'] += inv['amount']
-            by_type[inv_type]['current'] += inv.get('current_value', inv['amount'])
+            by_type[inv_type]['invested'] += inv.amount
+            by_type[inv_type]['current'] += inv.get('current_value', inv.amount)
             by_type[inv_type]['count'] += 1
         
         # Group by purpose
         by_purpose = {}
         for inv in investments:
-            purpose = inv['purpose']
+            purpose = inv.purpose
             if purpose not in by_purpose:
                 by_purpose[purpose] = 0
-            by_purpose[purpose] += inv.get('current_value', inv['amount'])
+            by_purpose[purpose] += inv.get('current_value', inv.amount)
+        
+        return {
+            'total_invested': total_invested,
+            'total_current': total_current,
+            'count': len(investments),
+            'by_type': sorted(by_type.items(), key=lambda x: x[1]['current'], reverse=True),
+            'by_purpose': sorted(by_purpose.items(), key=lambda x: x[1], reverse=True),
+        }
+    
+    @timed_view
+    def view_summary(self):
+        """Display investment summary with statistics"""
+        summary = self.get_summary()
+        
+        if summary is None:
+            print("\nNo investments found.")
+            return
+        
+        currency = self.data_manager.get_currency()
+        
+        total_invested = summary['total_invested']
+        total_current = summary['total_current']
+        total_gain_loss = total_current - total_invested
+        total_gain_loss_pct = (total_gain_loss / total_invested) * 100 if total_invested > 0 else 0
         
         print("\n" + "="*60)
         print("INVESTMENT SUMMARY".center(60))
@@ -224,13 +257,13 @@ class InvestmentManager:
             print(f"Total Gain: {currency}{total_gain_loss:,.2f} (+{total_gain_loss_pct:.1f}%)")
         else:
             print(f"Total Loss: {currency}{total_gain_loss:,.2f} ({total_gain_loss_pct:.1f}%)")
-        print(f"Total Investments: {len(investments)}")
+        print(f"Total Investments: {summary['count']}")
         
         print("\n" + "-"*60)
         print("BY INVESTMENT TYPE".center(60))
         print("-"*60)
         
-        for inv_type, data in sorted(by_type.items(), key=lambda x: x[1]['current'], reverse=True):
+        for inv_type, data in summary['by_type']:
             percentage = (data['current'] / total_current) * 100
             gain_loss = data['current'] - data['invested']
             print(f"{inv_type:.<25} {currency}{data['current']:>12,.2f} ({percentage:>5.1f}%)")
@@ -244,7 +277,7 @@ class InvestmentManager:
         print("BY PURPOSE".center(60))
         print("-"*60)
         
-        for purpose, amount in sorted(by_purpose.items(), key=lambda x: x[1], reverse=True):
+        for purpose, amount in summary['by_purpose']:
             percentage = (amount / total_current) * 100
             print(f"{purpose:.<30} {currency}{amount:>12,.2f} ({percentage:>5.1f}%)")
         
@@ -252,7 +285,7 @@ class InvestmentManager:
     
     def update_investment_value(self):
         """Update the current value of an investment"""
-        investments = self.data_manager.get_all_investments()
+        investments = self.data_manager.get_all_investments(include_ids=True)
         
         if not investments:
             print("\nNo investments found.")
@@ -281,7 +314,7 @@ class InvestmentManager:
                     print("Value cannot be negative.")
                     return
                 
-                self.data_manager.update_investment_value(index, new_value)
+                self.data_manager.set_investment_value(inv['_id'], new_value)
                 
                 gain_loss = new_value - inv['amount']
                 gain_loss_pct = (gain_loss / inv['amount']) * 100 if inv['amount'] > 0 else 0
@@ -296,3 +329,107 @@ class InvestmentManager:
                 print("Invalid selection.")
         except ValueError:
             print("Invalid input.")
+    
+    @timed_view
+    def get_purpose_projections(self, years=DEFAULT_YEARS, n_paths=None, workers=None):
+        """Monte Carlo percentile bands per purpose using the saved assumptions"""
+        investments = self.data_manager.get_all_investments()
+        overrides = self.data_manager.get_return_assumptions()
+        options = {"years": years, "workers": workers}
+        if n_paths:
+            options["n_paths"] = n_paths
+        return simulate_purposes(investments, overrides, **options)
+    
+    def simulate_by_purpose(self):
+        """Project each purpose bucket's value with a Monte Carlo simulation"""
+        investments = self.data_manager.get_all_investments()
+        
+        if not investments:
+            print("\nNo investments found.")
+            return
+        
+        currency = self.data_manager.get_currency()
+        print("\n" + "="*60)
+        print("SIMULATE OUTCOMES BY PURPOSE".center(60))
+        print("="*60)
+        
+        years_input = input(f"Years to project (default {DEFAULT_YEARS}): ").strip()
+        try:
+            years = int(years_input) if years_input else DEFAULT_YEARS
+            if years <= 0:
+                raise ValueError
+        except ValueError:
+            print("Invalid number of years.")
+            return
+        
+        print("\nRunning simulation...")
+        projections = self.get_purpose_projections(years)
+        
+        # Show a few checkpoints rather than every year
+        checkpoints = sorted({y for y in (1, 5, 10, 20, 30, years) if y <= years})
+        
+        for purpose in sorted(projections):
+            result = projections[purpose]
+            print(f"\n{purpose}")
+            print(f"   Current Value: {currency}{result['current_value']:,.2f}")
+            if result['monthly_contribution'] > 0:
+                print(f"   Monthly Contribution: {currency}{result['monthly_contribution']:,.2f}")
+            print(f"   {'Year':>6} {'Pessimistic':>15} {'Median':>15} {'Optimistic':>15}")
+            for year in checkpoints:
+                low = result['bands'][PERCENTILES[0]][year - 1]
+                mid = result['bands'][50][year - 1]
+                high = result['bands'][PERCENTILES[-1]][year - 1]
+                print(f"   {year:>6} {currency}{low:>14,.0f} {currency}{mid:>14,.0f} {currency}{high:>14,.0f}")
+        
+        print("\n" + "-"*60)
+        print(f"Pessimistic/optimistic are the {PERCENTILES[0]}th/{PERCENTILES[-1]}th percentiles.")
+        print("Projections depend on your return assumptions and are not guarantees.")
+        print("="*60)
+    
+    def set_assumptions(self):
+        """Set return and contribution assumptions for an investment type"""
+        print("\n" + "="*60)
+        print("SIMULATION ASSUMPTIONS".center(60))
+        print("="*60)
+        
+        overrides = self.data_manager.get_return_assumptions()
+        currency = self.data_manager.get_currency()
+        
+        for i, t in enumerate(self.common_types, 1):
+            a = resolve_assumptions(t, overrides)
+            print(f"[{i}] {t:<20} return {a['mean_return']:>5.1f}%  volatility {a['volatility']:>5.1f}%  "
+                  f"+{currency}{a['monthly_contribution']:,.0f}/mo")
+        
+        inv_type = input("\nSelect type number (or type name): ").strip()
+        try:
+            type_num = int(inv_type)
+            if 1 <= type_num <= len(self.common_types):
+                inv_type = self.common_types[type_num - 1]
+        except ValueError:
+            pass
+        
+        if not inv_type:
+            print("Investment type cannot be empty.")
+            return
+        
+        current = resolve_assumptions(inv_type, overrides)
+        try:
+            mean_return = float(input(f"Expected annual return % [{current['mean_return']}]: ").strip()
+                                or current['mean_return'])
+            volatility = float(input(f"Annual volatility % [{current['volatility']}]: ").strip()
+                               or current['volatility'])
+            contribution = float(input(f"Monthly contribution [{current['monthly_contribution']}]: ").strip()
+                                 or current['monthly_contribution'])
+        except ValueError:
+            print("Invalid input. Please enter numbers.")
+            return
+        
+        if mean_return <= -100:
+            print("Expected return must be above -100%.")
+            return
+        if volatility < 0 or contribution < 0:
+            print("Volatility and contribution cannot be negative.")
+            return
+        
+        self.data_manager.set_return_assumption(inv_type, mean_return, volatility, contribution)
+        print(f"\nAssumptions for {inv_type} saved.")
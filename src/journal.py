@@ -0,0 +1,202 @@
+"""
+Write Journal - Local append-only journal that drains inserts to MongoDB in the background
+
+New documents are appended to a JSON-lines file and acknowledged immediately;
+fsyncs are batched, and a background thread inserts pending documents with
+insert_many. Documents carry client-generated _ids, so replaying a journal
+after a crash or a half-finished flush never creates duplicates.
+"""
+
+import os
+import threading
+import time
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+
+DUPLICATE_KEY = 11000
+
+DEFAULT_FSYNC_BATCH = 32        # fsync after this many unsynced appends...
+DEFAULT_FSYNC_INTERVAL = 0.2    # ...or this many seconds, whichever comes first
+DEFAULT_FLUSH_INTERVAL = 1.0    # seconds between drains to MongoDB
+MAX_RETRY_DELAY = 30.0
+
+
+class WriteJournal:
+    """Append-only JSONL journal of pending inserts
+
+    writer(collection_name, documents) performs the actual insert and is
+    called from the background flusher thread.
+    """
+
+    def __init__(self, path, writer, fsync_batch=DEFAULT_FSYNC_BATCH,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.writer = writer
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.flush_interval = flush_interval
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._pending = self._replay()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="pfa-journal", daemon=True)
+        self._thread.start()
+
+    def _replay(self):
+        """Load entries left over from a previous run"""
+        pending = []
+        if not os.path.exists(self.path):
+            return pending
+        end = 0         # offset just past the last newline
+        tail = b""      # what follows it: a line a crash cut short, or nothing
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    tail = raw
+                    break
+                end += len(raw)
+                record = self._parse(raw)
+                if record:
+                    pending.append(record)
+        if tail:
+            record = self._parse(tail)
+            with open(self.path, "r+b") as f:
+                if record:
+                    # Only the newline was lost
+                    pending.append(record)
+                    f.seek(0, os.SEEK_END)
+                    f.write(b"\n")
+                else:
+                    # A torn final line from a crash mid-append; the next append must not join it
+                    f.truncate(end)
+        return pending
+
+    @staticmethod
+    def _parse(raw):
+        """(collection, document) of a journal line; None for a blank or unreadable one"""
+        line = raw.strip()
+        if not line:
+            return None
+        try:
+            record = json_util.loads(line.decode("utf-8"))
+        except ValueError:
+            return None
+        return record["collection"], record["document"]
+
+    def append(self, collection_name, document):
+        """Journal a document for insertion; returns without touching MongoDB"""
+        line = json_util.dumps({"collection": collection_name, "document": document})
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._pending.append((collection_name, document))
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_batch:
+                self._sync_locked()
+        if len(self._pending) >= self.fsync_batch:
+            self._wake.set()
+
+    def pending(self, collection_name):
+        """Copies of the documents still waiting to be written to a collection"""
+        with self._lock:
+            return [dict(doc) for name, doc in self._pending if name == collection_name]
+
+    def pending_count(self, collection_name=None):
+        with self._lock:
+            if collection_name is None:
+                return len(self._pending)
+            return sum(1 for name, _ in self._pending if name == collection_name)
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def flush(self):
+        """Write every pending document to MongoDB; raises if the server is unreachable"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return 0
+
+            by_collection = {}
+            for name, doc in batch:
+                by_collection.setdefault(name, []).append(doc)
+            for name, docs in by_collection.items():
+                try:
+                    self.writer(name, docs)
+                except BulkWriteError as e:
+                    # Already inserted by an earlier, interrupted flush
+                    errors = e.details.get("writeErrors", [])
+                    if any(err.get("code") != DUPLICATE_KEY for err in errors):
+                        raise
+
+            with self._lock:
+                # Appends may have arrived during the inserts; keep only those
+                self._pending = self._pending[len(batch):]
+                self._compact_locked()
+            return len(batch)
+
+    def _compact_locked(self):
+        """Rewrite the journal with only the entries not yet in MongoDB"""
+        self._file.close()
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for name, doc in self._pending:
+                f.write(json_util.dumps({"collection": name, "document": doc}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+
+    def _run(self):
+        retry_delay = self.flush_interval
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            self._wake.wait(self.fsync_interval)
+            woken = self._wake.is_set()
+            self._wake.clear()
+
+            with self._lock:
+                if time.monotonic() - self._last_sync >= self.fsync_interval:
+                    self._sync_locked()
+
+            if not (woken or time.monotonic() >= next_flush):
+                continue
+            try:
+                self.flush()
+                self.last_error = None
+                retry_delay = self.flush_interval
+            except PyMongoError as e:
+                # Server unreachable or slow: keep the entries and back off
+                self.last_error = e
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+            next_flush = time.monotonic() + retry_delay
+
+    def close(self, timeout=None):
+        """Stop the flusher, make a last attempt to drain and fsync the journal"""
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        try:
+            self.flush()
+        except PyMongoError as e:
+            self.last_error = e
+        with self._lock:
+            self._sync_locked()
+            self._file.close()
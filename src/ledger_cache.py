@@ -0,0 +1,180 @@
+"""
+Ledger Cache - Income and expenses as NumPy columns shared by one session
+
+The first summary of a session loads each ledger collection once into
+parallel arrays (amount in the reporting currency, month ordinal and group
+code), with the group labels (income sources, expense categories) interned
+into a code table. Every manager of the session reads the same columns, and
+DataManager appends the entries it writes itself, so summaries become
+group-bys over arrays instead of fresh reads and dict loops.
+
+Columns are tagged with the version counter they reflect. A write the cache
+does not see (another process, an archive run, a restore) moves the counter
+past the tag, and the next read loads the collection again.
+"""
+
+import threading
+
+import numpy as np
+
+
+# Ledger collections and the field their entries are grouped by
+GROUP_FIELDS = {'income': 'source', 'expenses': 'category'}
+INITIAL_CAPACITY = 1024
+
+
+def month_ordinals(dates):
+    """Months since 1970-01 of YYYY-MM-DD date strings"""
+    return np.array([date[:7] for date in dates], dtype='datetime64[M]').astype(np.int32)
+
+
+def month_ordinal(month):
+    """Months since 1970-01 of a YYYY-MM string"""
+    return int(np.datetime64(month, 'M').astype(np.int32))
+
+
+class LedgerColumns:
+    """One ledger collection as growable parallel arrays"""
+
+    def __init__(self, group_field, records=()):
+        self.group_field = group_field
+        # Group label of each code, and the code of each label
+        self.labels = []
+        self._codes = {}
+        self._size = 0
+        self._amount = np.empty(INITIAL_CAPACITY)
+        self._month = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self._code = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self.append(records)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def amounts(self):
+        return self._amount[:self._size]
+
+    @property
+    def months(self):
+        return self._month[:self._size]
+
+    @property
+    def codes(self):
+        return self._code[:self._size]
+
+    def code(self, label):
+        """Code of a group label, assigning the next one to a new label"""
+        code = self._codes.get(label)
+        if code is None:
+            code = self._codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+
+    def append(self, records):
+        """Add records (with amount, date and the group field) to the end of the columns"""
+        records = list(records)
+        if not records:
+            return
+        end = self._size + len(records)
+        if end > len(self._amount):
+            # Doubling keeps appends amortised O(1)
+            capacity = max(end, 2 * len(self._amount))
+            for name in ('_amount', '_month', '_code'):
+                column = getattr(self, name)
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                setattr(self, name, grown)
+        self._amount[self._size:end] = [record.amount for record in records]
+        self._month[self._size:end] = month_ordinals(record.date for record in records)
+        self._code[self._size:end] = [self.code(getattr(record, self.group_field)) for record in records]
+        self._size = end
+
+    def in_month(self, month):
+        """Row mask of the entries dated in a YYYY-MM month"""
+        return self.months == month_ordinal(month)
+
+    def labels_matching(self, predicate):
+        """Code mask of the labels for which predicate(label) is true"""
+        return np.array([bool(predicate(label)) for label in self.labels], dtype=bool)
+
+    def group_totals(self, mask=None):
+        """(totals, counts) indexed by code, over the rows in mask (default: all)"""
+        codes, amounts = self.codes, self.amounts
+        if mask is not None:
+            codes, amounts = codes[mask], amounts[mask]
+        n_labels = len(self.labels)
+        return np.bincount(codes, weights=amounts, minlength=n_labels), np.bincount(codes, minlength=n_labels)
+
+    def by_label(self, mask=None):
+        """{label: {"total", "count"}} for the labels with rows in mask"""
+        totals, counts = self.group_totals(mask)
+        return {
+            label: {'total': float(totals[code]), 'count': int(counts[code])}
+            for code, label in enumerate(self.labels) if counts[code]
+        }
+
+
+class LedgerCache:
+    """The session's LedgerColumns per collection, each tagged with the key it was loaded for
+
+    A key is (collection version, fx_rates version, reporting currency).
+    Writers bracket their writes with begin_write/end_write; a load that
+    overlaps a write is used once but not kept, since it may or may not
+    contain the write.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._writers = 0
+        self._write_seq = 0
+
+    def get(self, name, key, load):
+        """Columns of a collection for key, loading them from load() (records) on a miss"""
+        with self._lock:
+            cached = self._columns.get(name)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            write_seq, writers = self._write_seq, self._writers
+
+        columns = LedgerColumns(GROUP_FIELDS[name], load())
+        with self._lock:
+            if not writers and write_seq == self._write_seq:
+                self._columns[name] = (key, columns)
+            else:
+                self._columns.pop(name, None)
+        return columns
+
+    def begin_write(self):
+        with self._lock:
+            self._writers += 1
+            self._write_seq += 1
+
+    def end_write(self, name, records, version=None):
+        """Append a finished write's records; version is the collection's counter after it, if bumped"""
+        with self._lock:
+            self._writers -= 1
+            self._write_seq += 1
+            self._apply(name, records, version)
+
+    def advance(self, name, version):
+        """Move the tag to version after a bump for entries already in the columns (a journal flush)"""
+        with self._lock:
+            self._apply(name, (), version)
+
+    def clear(self):
+        with self._lock:
+            self._columns.clear()
+
+    def _apply(self, name, records, version):
+        cached = self._columns.get(name)
+        if cached is None:
+            return
+        key, columns = cached
+        if version is not None:
+            if key[0] != version - 1:
+                # Someone else wrote since the columns were loaded
+                del self._columns[name]
+                return
+            self._columns[name] = ((version,) + key[1:], columns)
+        columns.append(records)
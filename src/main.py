@@ -3,14 +3,18 @@ Personal Finance Assistant - Main Program
 A comprehensive tool to manage your income, expenses, investments, and financial goals.
 """
 
+import sys
 from datetime import datetime
+from connection import DatabaseUnavailable
 from data_manager import DataManager
+from fx import load_rates_csv
 from income import IncomeManager
 from expenses import ExpenseManager
 from investments import InvestmentManager
 from dashboard import Dashboard
 from debt_manager import DebtManager
 from goals_manager import GoalsManager
+from search import SearchManager
 
 
 class PersonalFinanceApp:
@@ -22,6 +26,7 @@ class PersonalFinanceApp:
         self.dashboard = Dashboard(self.data_manager)
         self.debt_manager = DebtManager(self.data_manager)
         self.goals_manager = GoalsManager(self.data_manager)
+        self.search_manager = SearchManager(self.data_manager)
     
     def display_main_menu(self):
         print("\n" + "="*60)
@@ -34,6 +39,8 @@ class PersonalFinanceApp:
         print("[5] Savings Goals")
         print("[6] Financial Dashboard")
         print("[7] Settings & Goals")
+        print("[8] Search")
+        print("[9] Cash-Flow Forecast")
         print("[0] Exit")
         print("\n" + "-"*60)
     
@@ -77,6 +84,9 @@ class PersonalFinanceApp:
             print("[6] Process Recurring Expenses (Apply for this month)")
             print("[7] Investment Deposit")
             print("[8] Simulate Expense")
+            print("[9] Auto-Categorization Rules")
+            print("[10] Set Category Budget")
+            print("[11] View Budgets")
             print("[0] Back to Main Menu")
             print("\n" + "-"*60)
             
@@ -98,6 +108,12 @@ class PersonalFinanceApp:
                 self.expense_manager.investment_deposit()
             elif choice == "8":
                 self.expense_manager.simulate_expense()
+            elif choice == "9":
+                self.expense_manager.manage_category_rules()
+            elif choice == "10":
+                self.expense_manager.set_budget()
+            elif choice == "11":
+                self.expense_manager.view_budgets()
             elif choice == "0":
                 break
             else:
@@ -114,6 +130,8 @@ class PersonalFinanceApp:
             print("[2] View Investments by Purpose")
             print("[3] View Investment Summary")
             print("[4] Update Investment Value (for gains/losses)")
+            print("[5] Simulate Outcomes by Purpose")
+            print("[6] Set Simulation Assumptions")
             print("[0] Back to Main Menu")
             print("\n" + "-"*60)
             
@@ -127,6 +145,10 @@ class PersonalFinanceApp:
                 self.investment_manager.view_summary()
             elif choice == "4":
                 self.investment_manager.update_investment_value()
+            elif choice == "5":
+                self.investment_manager.simulate_by_purpose()
+            elif choice == "6":
+                self.investment_manager.set_assumptions()
             elif choice == "0":
                 break
             else:
@@ -142,6 +164,7 @@ class PersonalFinanceApp:
             print("[3] Set Monthly Repayment Goal")
             print("[4] View Debt Status")
             print("[5] View Repayment History")
+            print("[6] Payoff Plan (Avalanche/Snowball/Deadline)")
             print("[0] Back to Main Menu")
             print("\n" + "-"*60)
             
@@ -157,6 +180,8 @@ class PersonalFinanceApp:
                 self.debt_manager.view_debt_status()
             elif choice == "5":
                 self.debt_manager.view_repayment_history()
+            elif choice == "6":
+                self.debt_manager.view_payoff_plan()
             elif choice == "0":
                 break
             else:
@@ -199,6 +224,8 @@ class PersonalFinanceApp:
             print("="*60)
             print("\n[1] Set Savings Goal (%)")
             print("[2] View Current Savings Goal")
+            print("[3] Set Reporting Currency")
+            print("[4] Import Exchange Rates (CSV)")
             print("[0] Back to Main Menu")
             print("\n" + "-"*60)
             
@@ -217,6 +244,26 @@ class PersonalFinanceApp:
             elif choice == "2":
                 goal = self.data_manager.get_savings_goal()
                 print(f"\nCurrent savings goal: {goal}%")
+            elif choice == "3":
+                print(f"\nCurrent reporting currency: {self.data_manager.get_reporting_currency()}")
+                code = input("Enter ISO currency code (e.g. USD, EUR): ").strip().upper()
+                if len(code) == 3 and code.isalpha():
+                    self.data_manager.set_reporting_currency(code)
+                    print(f"Reporting currency set to {code}")
+                    print("Entries without a currency are now treated as " + code + ".")
+                else:
+                    print("Please enter a three-letter currency code.")
+            elif choice == "4":
+                print("\nCSV columns: date (YYYY-MM-DD), currency, rate")
+                print("rate = value of one unit of the currency in the reporting currency")
+                path = input("Enter CSV file path: ").strip()
+                try:
+                    count = self.data_manager.import_fx_rates(load_rates_csv(path))
+                    print(f"Imported {count} exchange rates.")
+                except OSError as e:
+                    print(f"Could not read file: {e}")
+                except ValueError as e:
+                    print(e)
             elif choice == "0":
                 break
             else:
@@ -243,6 +290,10 @@ class PersonalFinanceApp:
                 self.dashboard.show_dashboard()
             elif choice == "7":
                 self.settings_menu()
+            elif choice == "8":
+                self.search_manager.search()
+            elif choice == "9":
+                self.dashboard.view_cash_flow_forecast()
             elif choice == "0":
                 print("\nThank you for using Personal Finance Assistant!")
                 print("All data has been saved automatically.")
@@ -252,5 +303,14 @@ class PersonalFinanceApp:
 
 
 if __name__ == "__main__":
-    app = PersonalFinanceApp()
+    if len(sys.argv) > 1:
+        # Subcommands run non-interactively (see cli.py)
+        import cli
+        sys.exit(cli.main())
+    
+    try:
+        app = PersonalFinanceApp()
+    except (DatabaseUnavailable, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
     app.run()
@@ -0,0 +1,985 @@
+"""
+Memory Backend - An in-process stand-in for MongoDB
+
+With PFA_BACKEND=memory, create_client hands out a MemoryClient instead of
+a MongoClient, so DataManager and every manager run unchanged with no
+server. Data lives as long as the process, and every client in the process
+shares it. That suits demos, throwaway sessions and fast runs of manager
+logic.
+
+It covers the part of the pymongo API this project uses:
+- find, update, delete, bulk and find_one_and_update calls
+- the comparison, $in/$nin, $exists, $regex, $or/$and query operators
+- the $set, $setOnInsert, $inc, $unset, $push, $addToSet, $pull, $max and $min
+  update operators, and update pipelines of $set/$addFields/$unset stages
+- the $match, $group, $sort, $skip and $limit aggregation stages
+- unique indexes
+
+Collections keep their documents in insertion order. Hash indexes on
+tenant, category and purpose and a sorted index on date let the usual
+tenant- and date-scoped queries skip most documents. Text search matches
+lowercase words (no stemming or phrases). Change streams and transactions
+are refused the way a standalone mongod refuses them, and callers fall back
+as they would there.
+"""
+
+import bisect
+import functools
+import itertools
+import re
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+
+# Fields with a hash index in every collection, and the one with a sorted index
+HASH_INDEXED = ('tenant', 'category', 'purpose')
+SORTED_INDEXED = 'date'
+
+# Server error codes
+DUPLICATE_KEY = 11000
+ILLEGAL_OPERATION = 20
+INDEX_NOT_FOUND = 27
+COMMAND_NOT_FOUND = 59
+CHANGE_STREAMS_UNSUPPORTED = 40573
+
+_MISSING = object()
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def shared_client():
+    """The process's MemoryClient (all clients of one process see the same data)"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = MemoryClient()
+        return _shared_client
+
+
+# Documents
+def _copy(value):
+    """Copy of a document's dicts and lists (pymongo never hands out stored objects)"""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _get(doc, path):
+    """Value at a dotted path, or _MISSING"""
+    value = doc
+    for part in path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set(doc, path, value):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.setdefault(part, {})
+    doc[parts[-1]] = value
+
+
+def _unset(doc, path):
+    parts = path.split('.')
+    for part in parts[:-1]:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(parts[-1], None)
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_hashable(item) for item in value)
+    return value
+
+
+# Comparison follows MongoDB's type order; values of different types never match a range
+def _type_rank(value):
+    if value is None or value is _MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value):
+    rank = _type_rank(value)
+    if rank == 1:
+        return (rank, 0)
+    if rank in (4, 5, 10):
+        return (rank, repr(value))
+    return (rank, value)
+
+
+def _compare(value, op, target):
+    if _type_rank(value) != _type_rank(target):
+        return False
+    if _type_rank(value) == 1:
+        # null equals null
+        return op in ('$gte', '$lte')
+    try:
+        if op == '$gt':
+            return value > target
+        if op == '$gte':
+            return value >= target
+        if op == '$lt':
+            return value < target
+        return value <= target
+    except TypeError:
+        return False
+
+
+def _equals(value, target):
+    if value is _MISSING:
+        return target is None
+    if isinstance(value, list) and not isinstance(target, list):
+        return target in value
+    return value == target
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern, options):
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return re.compile(pattern, flags)
+
+
+# Operators comparing an array element itself rather than its fields
+_ELEMENT_OPERATORS = {'$eq', '$ne', '$gt', '$gte', '$lt', '$lte', '$in', '$nin', '$exists', '$regex', '$options', '$not'}
+
+
+def _is_operator_dict(condition):
+    return isinstance(condition, dict) and bool(condition) and all(key.startswith('$') for key in condition)
+
+
+def _matches_condition(value, condition):
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and condition.search(value) is not None
+    if not _is_operator_dict(condition):
+        return _equals(value, condition)
+
+    for op, target in condition.items():
+        if op == '$eq':
+            ok = _equals(value, target)
+        elif op == '$ne':
+            ok = not _equals(value, target)
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            values = value if isinstance(value, list) else [value]
+            ok = any(_compare(item, op, target) for item in values)
+        elif op == '$in':
+            ok = any(_matches_condition(value, item) for item in target)
+        elif op == '$nin':
+            ok = not any(_matches_condition(value, item) for item in target)
+        elif op == '$exists':
+            ok = (value is not _MISSING) == bool(target)
+        elif op == '$regex':
+            pattern = target if isinstance(target, re.Pattern) else _compile(target, condition.get('$options', ''))
+            ok = isinstance(value, str) and pattern.search(value) is not None
+        elif op == '$options':
+            continue
+        elif op == '$not':
+            ok = not _matches_condition(value, target)
+        else:
+            raise OperationFailure(f"unknown operator: {op}", 2)
+        if not ok:
+            return False
+    return True
+
+
+def matches(doc, query):
+    """Whether a document matches a query ($text is left to the collection)"""
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$nor':
+            if any(matches(doc, clause) for clause in condition):
+                return False
+        elif key == '$text':
+            continue
+        elif not _matches_condition(_get(doc, key), condition):
+            return False
+    return True
+
+
+def project(doc, projection, score=None):
+    """Copy of doc with a find projection applied ({'$meta': 'textScore'} fields get score)"""
+    if not projection:
+        return _copy(doc)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    fields = {key: value for key, value in projection.items() if not isinstance(value, dict)}
+    # Any truthy field (even just _id) makes an inclusion; _id is only dropped by an explicit _id: 0
+    if any(fields.values()):
+        result = {}
+        if fields.get('_id', 1) and '_id' in doc:
+            result['_id'] = doc['_id']
+        for key, value in fields.items():
+            if value and key != '_id':
+                found = _get(doc, key)
+                if found is not _MISSING:
+                    _set(result, key, _copy(found))
+    else:
+        result = _copy(doc)
+        for key in fields:
+            _unset(result, key)
+    for key, value in projection.items():
+        if isinstance(value, dict):
+            result[key] = score
+    return result
+
+
+def apply_update(doc, update, inserting=False):
+    """Apply update operators to doc in place"""
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.items():
+            current = _get(doc, path)
+            if op in ('$set', '$setOnInsert'):
+                _set(doc, path, _copy(value))
+            elif op == '$inc':
+                _set(doc, path, value if current is _MISSING else current + value)
+            elif op == '$unset':
+                _unset(doc, path)
+            elif op == '$push':
+                items = value['$each'] if _is_operator_dict(value) else [value]
+                if current is _MISSING:
+                    current = []
+                    _set(doc, path, current)
+                elif not isinstance(current, list):
+                    raise OperationFailure(f"The field '{path}' must be an array", 2)
+                current.extend(_copy(item) for item in items)
+            elif op == '$addToSet':
+                items = value['$each'] if _is_operator_dict(value) else [value]
+                if current is _MISSING:
+                    current = []
+                    _set(doc, path, current)
+                elif not isinstance(current, list):
+                    raise OperationFailure(f"The field '{path}' must be an array", 2)
+                current.extend(_copy(item) for item in items if item not in current)
+            elif op == '$pull':
+                if isinstance(current, list):
+                    current[:] = [item for item in current if not _pulls(item, value)]
+            elif op == '$max':
+                if current is _MISSING or _sort_key(value) > _sort_key(current):
+                    _set(doc, path, _copy(value))
+            elif op == '$min':
+                if current is _MISSING or _sort_key(value) < _sort_key(current):
+                    _set(doc, path, _copy(value))
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}", 9)
+
+
+def _pulls(item, condition):
+    """Whether $pull removes an array element"""
+    if isinstance(condition, dict) and condition and not set(condition) <= _ELEMENT_OPERATORS:
+        # A query on the fields of document elements
+        return isinstance(item, dict) and matches(item, condition)
+    return _matches_condition(item, condition)
+
+
+def apply_pipeline(doc, pipeline):
+    """Apply an update pipeline ($set/$addFields and $unset stages) to doc in place"""
+    for stage in pipeline:
+        (op, spec), = stage.items()
+        if op in ('$set', '$addFields'):
+            values = {path: evaluate(doc, expression) for path, expression in spec.items()}
+            for path, value in values.items():
+                _set(doc, path, value)
+        elif op == '$unset':
+            for path in [spec] if isinstance(spec, str) else spec:
+                _unset(doc, path)
+        else:
+            raise OperationFailure(f"{op} is not allowed to be used within an update", 72)
+
+
+def _upsert_seed(query):
+    """The fields an upsert copies from its filter (plain equality conditions)"""
+    doc = {}
+    for key, condition in query.items():
+        if key.startswith('$') or _is_operator_dict(condition) or isinstance(condition, re.Pattern):
+            continue
+        _set(doc, key, _copy(condition))
+    return doc
+
+
+# Aggregation
+def evaluate(doc, expression):
+    """Value of an aggregation expression for a document"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict):
+        if len(expression) == 1 and next(iter(expression)).startswith('$'):
+            op, args = next(iter(expression.items()))
+            if op == '$ifNull':
+                for arg in args[:-1]:
+                    value = evaluate(doc, arg)
+                    if value is not None:
+                        return value
+                return evaluate(doc, args[-1])
+            if op == '$cond':
+                if isinstance(args, dict):
+                    args = [args['if'], args['then'], args['else']]
+                condition = evaluate(doc, args[0])
+                # false, null and 0 are false; everything else (even "") is true
+                truthy = condition is not None and condition is not False and condition != 0
+                return evaluate(doc, args[1] if truthy else args[2])
+            if op == '$substrBytes':
+                value = evaluate(doc, args[0])
+                start, length = evaluate(doc, args[1]), evaluate(doc, args[2])
+                data = ('' if value is None else str(value)).encode()
+                return data[start:start + length if length >= 0 else None].decode(errors='ignore')
+            if op in ('$toLower', '$toUpper'):
+                value = evaluate(doc, args[0] if isinstance(args, list) else args)
+                value = '' if value is None else str(value)
+                return value.lower() if op == '$toLower' else value.upper()
+            if op == '$add':
+                return sum(evaluate(doc, arg) or 0 for arg in args)
+            if op == '$concatArrays':
+                arrays = [evaluate(doc, arg) for arg in args]
+                return None if any(array is None for array in arrays) else list(itertools.chain(*arrays))
+            raise OperationFailure(f"Unrecognized expression '{op}'", 168)
+        return {key: evaluate(doc, value) for key, value in expression.items()}
+    if isinstance(expression, list):
+        return [evaluate(doc, item) for item in expression]
+    return expression
+
+
+def _group(docs, spec):
+    rows = {}
+    counts = defaultdict(int)
+    for doc in docs:
+        group_id = evaluate(doc, spec['_id'])
+        key = _hashable(group_id)
+        row = rows.get(key)
+        if row is None:
+            row = rows[key] = {'_id': group_id}
+        counts[key] += 1
+        for name, accumulator in spec.items():
+            if name == '_id':
+                continue
+            (op, argument), = accumulator.items()
+            value = evaluate(doc, argument)
+            if op in ('$sum', '$avg'):
+                number = value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+                row[name] = row.get(name, 0) + number
+            elif op == '$max':
+                if value is not None and (name not in row or _sort_key(value) > _sort_key(row[name])):
+                    row[name] = value
+            elif op == '$min':
+                if value is not None and (name not in row or _sort_key(value) < _sort_key(row[name])):
+                    row[name] = value
+            elif op == '$first':
+                row.setdefault(name, value)
+            elif op == '$last':
+                row[name] = value
+            elif op == '$push':
+                row.setdefault(name, []).append(value)
+            elif op == '$addToSet':
+                values = row.setdefault(name, [])
+                if value not in values:
+                    values.append(value)
+            else:
+                raise OperationFailure(f"unknown group operator '{op}'", 15952)
+    for key, row in rows.items():
+        for name, accumulator in spec.items():
+            if name != '_id' and '$avg' in accumulator:
+                row[name] /= counts[key]
+            elif name != '_id' and name not in row:
+                row[name] = None
+    return list(rows.values())
+
+
+def _sort(docs, spec, score_of=None):
+    """Stable multi-key sort; spec is [(field, direction)] ({'$meta': 'textScore'} sorts by score)"""
+    docs = list(docs)
+    for field, direction in reversed(spec):
+        if isinstance(direction, dict):
+            docs.sort(key=score_of, reverse=True)
+        else:
+            docs.sort(key=lambda doc: _sort_key(_get(doc, field)), reverse=direction == -1)
+    return docs
+
+
+def _sort_spec(key_or_list, direction=None):
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def _text_terms(search):
+    """(words to find, words to exclude) of a $text search string"""
+    terms = re.findall(r'-?\w+', search.lower())
+    return (
+        {term for term in terms if not term.startswith('-')},
+        {term[1:] for term in terms if term.startswith('-')},
+    )
+
+
+class MemoryCursor:
+    """Lazy result of find(); runs the query on first iteration"""
+
+    def __init__(self, collection, query, projection=None, sort=None, limit=0, skip=0):
+        self.collection = collection
+        self._query = query
+        self._projection = projection
+        self._sort = _sort_spec(sort) if sort else []
+        self._limit = limit
+        self._skip = skip
+        self._results = None
+
+    def sort(self, key_or_list, direction=None):
+        self._sort = _sort_spec(key_or_list, direction)
+        return self
+
+    def limit(self, limit):
+        self._limit = limit
+        return self
+
+    def skip(self, skip):
+        self._skip = skip
+        return self
+
+    def batch_size(self, batch_size):
+        return self
+
+    def __iter__(self):
+        if self._results is None:
+            self._results = self.collection._find(
+                self._query, self._projection, self._sort, self._skip, self._limit)
+        return iter(self._results)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+
+class MemoryCollection:
+    """One collection: documents by _id in insertion order, plus their indexes"""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self.full_name = f'{database.name}.{name}'
+        self.exists = False
+        self._lock = database.client._lock
+        self._docs = {}
+        self._seq = {}
+        self._counter = itertools.count()
+        # field -> value -> _ids, and _ids whose value cannot be hashed
+        self._hash = {field: defaultdict(set) for field in HASH_INDEXED}
+        self._irregular = {field: set() for field in HASH_INDEXED + (SORTED_INDEXED,)}
+        # (date, seq, _id) of every document with a string date, sorted
+        self._dates = []
+        self._indexes = {}
+        # Unique index name -> (fields, {key: _id})
+        self._unique = {}
+        self._text_weights = None
+
+    # Indexes
+    def _index(self, doc):
+        doc_id = doc['_id']
+        for field in HASH_INDEXED:
+            value = doc.get(field)
+            if isinstance(value, (dict, list)):
+                self._irregular[field].add(doc_id)
+            else:
+                self._hash[field][value].add(doc_id)
+        date = doc.get(SORTED_INDEXED)
+        if isinstance(date, str):
+            bisect.insort(self._dates, (date, self._seq[doc_id], doc_id))
+        elif date is not None:
+            self._irregular[SORTED_INDEXED].add(doc_id)
+        for fields, keys in self._unique.values():
+            keys[self._unique_key(doc, fields)] = doc_id
+
+    def _unindex(self, doc):
+        doc_id = doc['_id']
+        for field in HASH_INDEXED:
+            value = doc.get(field)
+            if isinstance(value, (dict, list)):
+                self._irregular[field].discard(doc_id)
+            else:
+                ids = self._hash[field].get(value)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self._hash[field][value]
+        date = doc.get(SORTED_INDEXED)
+        if isinstance(date, str):
+            position = bisect.bisect_left(self._dates, (date, self._seq[doc_id]))
+            if position < len(self._dates) and self._dates[position][2] == doc_id:
+                del self._dates[position]
+        else:
+            self._irregular[SORTED_INDEXED].discard(doc_id)
+        for fields, keys in self._unique.values():
+            key = self._unique_key(doc, fields)
+            if keys.get(key) == doc_id:
+                del keys[key]
+
+    @staticmethod
+    def _unique_key(doc, fields):
+        return tuple(_hashable(None if (value := _get(doc, field)) is _MISSING else value) for field in fields)
+
+    def _check_unique(self, doc):
+        for name, (fields, keys) in self._unique.items():
+            owner = keys.get(self._unique_key(doc, fields))
+            if owner is not None and owner != doc['_id']:
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.full_name} index: {name}", DUPLICATE_KEY)
+
+    def _candidates(self, query):
+        """_ids that can match query, in insertion order (None: every document)"""
+        sets = []
+        for field in HASH_INDEXED:
+            condition = query.get(field, _MISSING)
+            if condition is _MISSING or isinstance(condition, (dict, list, re.Pattern)):
+                continue
+            sets.append(self._hash[field].get(condition, set()) | self._irregular[field])
+
+        condition = query.get(SORTED_INDEXED, _MISSING)
+        if isinstance(condition, str):
+            condition = {'$gte': condition, '$lte': condition}
+        if (_is_operator_dict(condition) and set(condition) <= {'$gt', '$gte', '$lt', '$lte'}
+                and all(isinstance(value, str) for value in condition.values())):
+            low, high = 0, len(self._dates)
+            # (d,) sorts before every (d, seq, _id); (d + '\0',) after them all
+            if '$gte' in condition:
+                low = max(low, bisect.bisect_left(self._dates, (condition['$gte'],)))
+            if '$gt' in condition:
+                low = max(low, bisect.bisect_left(self._dates, (condition['$gt'] + '\0',)))
+            if '$lte' in condition:
+                high = min(high, bisect.bisect_left(self._dates, (condition['$lte'] + '\0',)))
+            if '$lt' in condition:
+                high = min(high, bisect.bisect_left(self._dates, (condition['$lt'],)))
+            sets.append({entry[2] for entry in self._dates[low:high]} | self._irregular[SORTED_INDEXED])
+
+        if not sets:
+            return None
+        sets.sort(key=len)
+        ids = set(sets[0])
+        for other in sets[1:]:
+            ids &= other
+        return sorted(ids, key=self._seq.__getitem__)
+
+    def _select(self, query):
+        """[(document, text score)] matching query, in insertion order"""
+        query = query or {}
+        text = query.get('$text')
+        if text is not None and self._text_weights is None:
+            raise OperationFailure("text index required for $text query", INDEX_NOT_FOUND)
+        ids = self._candidates(query)
+        docs = self._docs.values() if ids is None else (self._docs[doc_id] for doc_id in ids)
+        selected = []
+        for doc in docs:
+            if not matches(doc, query):
+                continue
+            score = None
+            if text is not None:
+                score = self._text_score(doc, *_text_terms(text['$search']))
+                if not score:
+                    continue
+            selected.append((doc, score))
+        return selected
+
+    def _text_score(self, doc, wanted, excluded):
+        score = 0.0
+        for field, weight in self._text_weights.items():
+            value = _get(doc, field)
+            if not isinstance(value, str):
+                continue
+            words = re.findall(r'\w+', value.lower())
+            if excluded.intersection(words):
+                return 0.0
+            found = sum(1 for word in words if word in wanted)
+            if found:
+                score += weight * found / len(words)
+        return score
+
+    def _find(self, query, projection, sort, skip, limit):
+        with self._lock:
+            selected = self._select(query)
+            if sort:
+                scores = {id(doc): score for doc, score in selected}
+                docs = _sort([doc for doc, _ in selected], sort, lambda doc: scores[id(doc)] or 0)
+                selected = [(doc, scores[id(doc)]) for doc in docs]
+            selected = selected[skip:skip + limit if limit else None]
+            return [project(doc, projection, score) for doc, score in selected]
+
+    # Reads
+    def find(self, filter=None, projection=None, sort=None, limit=0, skip=0, session=None, **kwargs):
+        return MemoryCursor(self, filter or {}, projection, sort, limit, skip)
+
+    def find_one(self, filter=None, projection=None, sort=None, session=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {'_id': filter}
+        return next(iter(self.find(filter, projection, sort, limit=1)), None)
+
+    def count_documents(self, filter, session=None, **kwargs):
+        with self._lock:
+            return len(self._select(filter))
+
+    def estimated_document_count(self, **kwargs):
+        return len(self._docs)
+
+    def distinct(self, key, filter=None, session=None, **kwargs):
+        with self._lock:
+            values = []
+            for doc, _ in self._select(filter):
+                value = _get(doc, key)
+                for item in (value if isinstance(value, list) else [value]):
+                    if item is not _MISSING and item not in values:
+                        values.append(_copy(item))
+            return values
+
+    def aggregate(self, pipeline, session=None, **kwargs):
+        with self._lock:
+            docs = None
+            for stage in pipeline:
+                (name, spec), = stage.items()
+                if name == '$match':
+                    docs = ([doc for doc, _ in self._select(spec)] if docs is None
+                            else [doc for doc in docs if matches(doc, spec)])
+                    continue
+                if docs is None:
+                    docs = list(self._docs.values())
+                if name == '$group':
+                    docs = _group(docs, spec)
+                elif name == '$sort':
+                    docs = _sort(docs, _sort_spec(spec))
+                elif name == '$skip':
+                    docs = docs[spec:]
+                elif name == '$limit':
+                    docs = docs[:spec]
+                else:
+                    raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", 40324)
+            if docs is None:
+                docs = list(self._docs.values())
+            return iter([_copy(doc) for doc in docs])
+
+    # Writes
+    def _insert(self, document):
+        # Like pymongo, an _id is added to the caller's document
+        if '_id' not in document:
+            document['_id'] = ObjectId()
+        if document['_id'] in self._docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.full_name} index: _id_", DUPLICATE_KEY)
+        doc = _copy(document)
+        self._check_unique(doc)
+        self._seq[doc['_id']] = next(self._counter)
+        self._docs[doc['_id']] = doc
+        self._index(doc)
+        self.exists = True
+
+    def _replace(self, old, new):
+        self._check_unique(new)
+        self._unindex(old)
+        self._docs[new['_id']] = new
+        self._index(new)
+
+    def _update(self, query, update, upsert=False, multi=False, replace=False, sort=None):
+        """Apply an update; returns (matched, modified, upserted _id, document before, document after)"""
+        docs = [doc for doc, _ in self._select(query)]
+        if sort:
+            docs = _sort(docs, _sort_spec(sort))
+        if not multi:
+            docs = docs[:1]
+        modified = 0
+        before = after = None
+        for doc in docs:
+            new = {'_id': doc['_id'], **_copy(update)} if replace else _copy(doc)
+            if isinstance(update, list):
+                apply_pipeline(new, update)
+            elif not replace:
+                apply_update(new, update)
+            if new['_id'] != doc['_id']:
+                raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+            if new != doc:
+                self._replace(doc, new)
+                modified += 1
+            before, after = doc, new
+        if docs or not upsert:
+            return len(docs), modified, None, before, after
+
+        new = _upsert_seed(query)
+        if replace:
+            new.update(_copy(update))
+        elif isinstance(update, list):
+            apply_pipeline(new, update)
+        else:
+            apply_update(new, update, inserting=True)
+        self._insert(new)
+        return 0, 0, new['_id'], None, self._docs[new['_id']]
+
+    def insert_one(self, document, session=None, **kwargs):
+        with self._lock:
+            self._insert(document)
+        return InsertOneResult(document['_id'], True)
+
+    def insert_many(self, documents, ordered=True, session=None, **kwargs):
+        documents = list(documents)
+        if not documents:
+            raise TypeError("documents must be a non-empty list")
+        result = self._bulk([InsertOne(document) for document in documents], ordered)
+        return InsertManyResult([document['_id'] for document in documents if '_id' in document][:result['nInserted']], True)
+
+    def update_one(self, filter, update, upsert=False, session=None, **kwargs):
+        with self._lock:
+            matched, modified, upserted, _, _ = self._update(filter, update, upsert)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def update_many(self, filter, update, upsert=False, session=None, **kwargs):
+        with self._lock:
+            matched, modified, upserted, _, _ = self._update(filter, update, upsert, multi=True)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def replace_one(self, filter, replacement, upsert=False, session=None, **kwargs):
+        with self._lock:
+            matched, modified, upserted, _, _ = self._update(filter, replacement, upsert, replace=True)
+        return UpdateResult({'n': matched or int(upserted is not None), 'nModified': modified, 'upserted': upserted}, True)
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False,
+                            return_document=ReturnDocument.BEFORE, session=None, **kwargs):
+        with self._lock:
+            _, _, _, before, after = self._update(filter, update, upsert, sort=sort)
+            document = after if return_document == ReturnDocument.AFTER else before
+            return None if document is None else project(document, projection)
+
+    def _delete(self, query, multi):
+        docs = [doc for doc, _ in self._select(query)]
+        if not multi:
+            docs = docs[:1]
+        for doc in docs:
+            self._unindex(doc)
+            del self._docs[doc['_id']]
+            del self._seq[doc['_id']]
+        return len(docs)
+
+    def delete_one(self, filter, session=None, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete(filter, False)}, True)
+
+    def delete_many(self, filter, session=None, **kwargs):
+        with self._lock:
+            return DeleteResult({'n': self._delete(filter, True)}, True)
+
+    def bulk_write(self, requests, ordered=True, session=None, **kwargs):
+        return BulkWriteResult(self._bulk(requests, ordered), True)
+
+    def _bulk(self, requests, ordered):
+        result = {'writeErrors': [], 'writeConcernErrors': [], 'nInserted': 0, 'nUpserted': 0,
+                  'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        with self._lock:
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result['nInserted'] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        matched, modified, upserted, _, _ = self._update(
+                            request._filter, request._doc, request._upsert,
+                            multi=isinstance(request, UpdateMany), replace=isinstance(request, ReplaceOne))
+                        result['nMatched'] += matched
+                        result['nModified'] += modified
+                        if upserted is not None:
+                            result['nUpserted'] += 1
+                            result['upserted'].append({'index': index, '_id': upserted})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        result['nRemoved'] += self._delete(request._filter, isinstance(request, DeleteMany))
+                    else:
+                        raise TypeError(f"{request!r} is not a valid request")
+                except DuplicateKeyError as e:
+                    result['writeErrors'].append({'index': index, 'code': DUPLICATE_KEY, 'errmsg': str(e)})
+                    if ordered:
+                        break
+        if result['writeErrors']:
+            raise BulkWriteError(result)
+        return result
+
+    # Index management
+    def create_index(self, keys, unique=False, name=None, weights=None, **kwargs):
+        keys = _sort_spec(keys, 1)
+        name = name or '_'.join(f'{field}_{direction}' for field, direction in keys)
+        with self._lock:
+            text_fields = [field for field, direction in keys if direction == 'text']
+            if text_fields:
+                if self._text_weights is not None and name not in self._indexes:
+                    raise OperationFailure("a collection can have only one text index", 85)
+                self._text_weights = {field: 1 for field in text_fields}
+                self._text_weights.update(weights or {})
+            if unique and name not in self._unique:
+                fields = [field for field, _ in keys]
+                index = {}
+                for doc in self._docs.values():
+                    key = self._unique_key(doc, fields)
+                    if key in index:
+                        raise DuplicateKeyError(
+                            f"E11000 duplicate key error collection: {self.full_name} index: {name}", DUPLICATE_KEY)
+                    index[key] = doc['_id']
+                self._unique[name] = (fields, index)
+            self._indexes[name] = {'key': keys, 'unique': unique, **kwargs}
+            self.exists = True
+        return name
+
+    def index_information(self):
+        with self._lock:
+            information = {'_id_': {'key': [('_id', 1)], 'v': 2}}
+            for name, spec in self._indexes.items():
+                information[name] = {'v': 2, **spec}
+            return information
+
+    def drop_index(self, index_or_name):
+        name = index_or_name if isinstance(index_or_name, str) else '_'.join(
+            f'{field}_{direction}' for field, direction in _sort_spec(index_or_name, 1))
+        with self._lock:
+            spec = self._indexes.pop(name, None)
+            if spec is None:
+                raise OperationFailure(f"index not found with name [{name}]", INDEX_NOT_FOUND)
+            self._unique.pop(name, None)
+            if any(direction == 'text' for _, direction in spec['key']):
+                self._text_weights = None
+
+    def drop(self, session=None, **kwargs):
+        self.database.drop_collection(self.name)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets",
+                               CHANGE_STREAMS_UNSUPPORTED)
+
+
+class MemoryDatabase:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self.client._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = MemoryCollection(self, name)
+            return collection
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_collection(self, name, **kwargs):
+        return self[name]
+
+    def list_collection_names(self, session=None, **kwargs):
+        with self.client._lock:
+            return [name for name, collection in self._collections.items() if collection.exists]
+
+    def drop_collection(self, name, session=None, **kwargs):
+        with self.client._lock:
+            self._collections.pop(name, None)
+
+    def command(self, command, value=1, session=None, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == 'ping':
+            return {'ok': 1.0}
+        raise OperationFailure(f"no such command: '{name}' (in-memory backend)", COMMAND_NOT_FOUND)
+
+    def watch(self, *args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets",
+                               CHANGE_STREAMS_UNSUPPORTED)
+
+
+class MemorySession:
+    """Session of a MemoryClient; transactions are refused like on a standalone mongod"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.end_session()
+
+    def start_transaction(self, *args, **kwargs):
+        raise OperationFailure("Transaction numbers are only allowed on a replica set member or mongos",
+                               ILLEGAL_OPERATION)
+
+    def with_transaction(self, callback, *args, **kwargs):
+        self.start_transaction()
+
+    def end_session(self):
+        pass
+
+
+class MemoryClient:
+    """Stand-in for MongoClient keeping its databases in this process's memory"""
+
+    def __init__(self):
+        # One lock for every collection, so a bulk write is never seen half done
+        self._lock = threading.RLock()
+        self._databases = {}
+        self.admin = self['admin']
+
+    def __getitem__(self, name):
+        with self._lock:
+            database = self._databases.get(name)
+            if database is None:
+                database = self._databases[name] = MemoryDatabase(self, name)
+            return database
+
+    def get_database(self, name, **kwargs):
+        return self[name]
+
+    def list_database_names(self, session=None, **kwargs):
+        with self._lock:
+            return [name for name, database in self._databases.items() if database.list_collection_names()]
+
+    def drop_database(self, name, session=None, **kwargs):
+        with self._lock:
+            self._databases.pop(name if isinstance(name, str) else name.name, None)
+
+    def start_session(self, **kwargs):
+        return MemorySession(self)
+
+    def close(self):
+        # Shared by the whole process; the data outlives any one user of it
+        pass
@@ -0,0 +1,277 @@
+"""
+Metrics - Call counts and latency histograms in OpenMetrics text format
+
+Every public DataManager method and the managers' report views are timed
+into fixed-bucket histograms (one bisect and a few additions per call), so
+instrumentation stays on all the time. Only the outermost DataManager call
+of a thread is recorded: add_expense counts once, not once more for each
+DataManager method it uses internally.
+
+The histograms are exported as OpenMetrics text, which Prometheus and the
+node_exporter textfile collector read:
+- PFA_METRICS_FILE=path rewrites the file every PFA_METRICS_INTERVAL seconds
+  (default 15) and when the process exits
+- PFA_METRICS_PORT=port serves GET /metrics on 127.0.0.1 (PFA_METRICS_HOST
+  to change); `serve` also answers /metrics on its own port
+
+Alert on p99 latency with histogram_quantile(0.99, rate(
+pfa_operation_seconds_bucket{operation="Dashboard.compute_metrics"}[5m]))
+and on volume with rate(pfa_operation_seconds_count[5m]).
+"""
+
+import atexit
+import bisect
+import functools
+import inspect
+import multiprocessing
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CONTENT_TYPE = 'application/openmetrics-text; version=1.0.0; charset=utf-8'
+DEFAULT_INTERVAL = 15.0
+DEFAULT_HOST = '127.0.0.1'
+
+# Upper bounds (seconds) of the latency buckets; +Inf is implied
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their count and sum"""
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self._lock = threading.Lock()
+        # One count per bound and a last one for +Inf
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self.errors = 0
+
+    def observe(self, value, error=False):
+        slot = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            if error:
+                self.errors += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts, sum, errors)"""
+        with self._lock:
+            counts, total, errors = list(self._counts), self._sum, self.errors
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total, errors
+
+
+class MetricsRegistry:
+    """Histograms per (layer, operation)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def histogram(self, layer, operation):
+        key = (layer, operation)
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, Histogram())
+        return histogram
+
+    def observe(self, layer, operation, seconds, error=False):
+        self.histogram(layer, operation).observe(seconds, error)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """Every histogram as an OpenMetrics exposition"""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        latency = [
+            '# TYPE pfa_operation_seconds histogram',
+            '# UNIT pfa_operation_seconds seconds',
+            '# HELP pfa_operation_seconds Time spent in DataManager calls and manager views.',
+        ]
+        errors = [
+            '# TYPE pfa_operation_errors counter',
+            '# HELP pfa_operation_errors Calls that ended in an exception.',
+        ]
+        for (layer, operation), histogram in histograms:
+            labels = f'layer="{_label(layer)}",operation="{_label(operation)}"'
+            cumulative, total, failed = histogram.snapshot()
+            for bound, count in zip(histogram.bounds + (float('inf'),), cumulative):
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                latency.append(f'pfa_operation_seconds_bucket{{{labels},le="{le}"}} {count}')
+            latency.append(f'pfa_operation_seconds_count{{{labels}}} {cumulative[-1]}')
+            latency.append(f'pfa_operation_seconds_sum{{{labels}}} {total!r}')
+            errors.append(f'pfa_operation_errors_total{{{labels}}} {failed}')
+        return '\n'.join(latency + errors + ['# EOF']) + '\n'
+
+    def write(self, path):
+        """Write render() to path, replacing it in one step so readers never see half a file"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(self.render())
+        os.replace(temporary, path)
+
+
+REGISTRY = MetricsRegistry()
+_depth = threading.local()
+
+
+def instrumented(layer):
+    """Class decorator timing every public method; nested calls within the layer are not recorded"""
+    def decorate(cls):
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.isfunction(method):
+                continue
+            setattr(cls, name, _outermost(layer, method))
+        return cls
+    return decorate
+
+
+def _outermost(layer, method):
+    operation = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        depth = getattr(_depth, layer, 0)
+        if depth:
+            return method(*args, **kwargs)
+        setattr(_depth, layer, 1)
+        started = time.perf_counter()
+        error = True
+        try:
+            result = method(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            setattr(_depth, layer, 0)
+            REGISTRY.observe(layer, operation, time.perf_counter() - started, error)
+    return wrapper
+
+
+def timed_view(method):
+    """Time a manager view under its qualified name (e.g. Dashboard.compute_metrics)"""
+    operation = method.__qualname__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        error = True
+        try:
+            result = method(*args, **kwargs)
+            error = False
+            return result
+        finally:
+            REGISTRY.observe('view', operation, time.perf_counter() - started, error)
+    return wrapper
+
+
+class MetricsFileWriter:
+    """Background thread rewriting a metrics file on an interval (and once more on close)"""
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, registry=REGISTRY):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='pfa-metrics-file', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._write()
+
+    def _write(self):
+        try:
+            self.registry.write(self.path)
+        except OSError:
+            # A full disk or a removed directory must not take the application down
+            pass
+
+    def close(self):
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+            self._write()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the terminal
+        pass
+
+
+def serve_metrics(port, host=DEFAULT_HOST):
+    """Serve GET /metrics from a daemon thread; returns the server (shutdown() stops it)"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='pfa-metrics-http', daemon=True).start()
+    return server
+
+
+def start_exporters():
+    """Start the exporters configured by PFA_METRICS_* (once per process; not in pool workers)
+
+    Raises ValueError naming the variable when a value is invalid; nothing
+    is started then, and a later call tries again.
+    """
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started or multiprocessing.parent_process() is not None:
+            return
+
+        # Validate everything before starting anything
+        path = os.getenv('PFA_METRICS_FILE')
+        if path:
+            interval = os.getenv('PFA_METRICS_INTERVAL') or DEFAULT_INTERVAL
+            try:
+                interval = float(interval)
+            except ValueError:
+                raise ValueError(f"PFA_METRICS_INTERVAL must be a number of seconds, got {interval!r}")
+            if interval <= 0:
+                raise ValueError("PFA_METRICS_INTERVAL must be positive")
+        port = os.getenv('PFA_METRICS_PORT')
+        if port:
+            try:
+                port = int(port)
+            except ValueError:
+                raise ValueError(f"PFA_METRICS_PORT must be a port number, got {port!r}")
+
+        if port:
+            server = serve_metrics(port, os.getenv('PFA_METRICS_HOST') or DEFAULT_HOST)
+            atexit.register(server.shutdown)
+        if path:
+            atexit.register(MetricsFileWriter(path, interval).close)
+        _exporters_started = True
@@ -0,0 +1,152 @@
+"""
+Portfolio Simulation - Monte Carlo outcome bands for investments grouped by purpose
+
+Each purpose bucket (e.g. "Retirement") is split by investment type, and each
+type grows with its own monthly return distribution plus a monthly
+contribution. Paths are simulated in vectorized chunks of shape
+(paths x types) and the chunks are spread over a ProcessPoolExecutor.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Annual expected return, annual volatility and monthly contribution per type
+DEFAULT_ASSUMPTIONS = {
+    "Stocks": {"mean_return": 7.0, "volatility": 16.0, "monthly_contribution": 0},
+    "Bonds": {"mean_return": 3.0, "volatility": 6.0, "monthly_contribution": 0},
+    "ETF": {"mean_return": 6.5, "volatility": 15.0, "monthly_contribution": 0},
+    "Mutual Fund": {"mean_return": 6.0, "volatility": 14.0, "monthly_contribution": 0},
+    "Real Estate": {"mean_return": 5.0, "volatility": 12.0, "monthly_contribution": 0},
+    "Cryptocurrency": {"mean_return": 10.0, "volatility": 60.0, "monthly_contribution": 0},
+    "Savings Account": {"mean_return": 2.0, "volatility": 0.5, "monthly_contribution": 0},
+    "CD": {"mean_return": 3.0, "volatility": 0.0, "monthly_contribution": 0},
+    "Retirement Account": {"mean_return": 6.0, "volatility": 12.0, "monthly_contribution": 0},
+    "Other": {"mean_return": 4.0, "volatility": 10.0, "monthly_contribution": 0},
+}
+
+PERCENTILES = (5, 25, 50, 75, 95)
+DEFAULT_YEARS = 20
+DEFAULT_PATHS = 100000
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def resolve_assumptions(type_name, overrides=None):
+    """Assumptions for an investment type: user overrides, then defaults, then 'Other'"""
+    base = DEFAULT_ASSUMPTIONS.get(type_name, DEFAULT_ASSUMPTIONS["Other"])
+    if overrides and type_name in overrides:
+        return {**base, **overrides[type_name]}
+    return dict(base)
+
+
+def build_buckets(investments, overrides=None):
+    """Group investments into purpose buckets holding per-type values and assumptions
+
+    A type's monthly contribution is split across the purposes holding it in
+    proportion to their current value.
+    """
+    by_purpose = {}
+    type_totals = {}
+    for inv in investments:
+        value = inv.get('current_value', inv['amount'])
+        types = by_purpose.setdefault(inv['purpose'], {})
+        types[inv['type']] = types.get(inv['type'], 0) + value
+        type_totals[inv['type']] = type_totals.get(inv['type'], 0) + value
+    holders = {}
+    for types in by_purpose.values():
+        for t in types:
+            holders[t] = holders.get(t, 0) + 1
+
+    buckets = {}
+    for purpose, types in by_purpose.items():
+        names = sorted(types)
+        values = np.array([types[t] for t in names], dtype=float)
+        assumptions = [resolve_assumptions(t, overrides) for t in names]
+        shares = np.array([
+            types[t] / type_totals[t] if type_totals[t] > 0 else 1.0 / holders[t]
+            for t in names
+        ])
+        buckets[purpose] = {
+            "types": names,
+            "values": values,
+            "contributions": np.array([a['monthly_contribution'] for a in assumptions], dtype=float) * shares,
+            "mean_return": np.array([a['mean_return'] for a in assumptions], dtype=float) / 100,
+            "volatility": np.array([a['volatility'] for a in assumptions], dtype=float) / 100,
+        }
+    return buckets
+
+
+def simulate_chunk(values, contributions, mean_return, volatility, years, n_paths, seed):
+    """Simulate one chunk of paths; returns bucket totals at each year end (paths x years)
+
+    Monthly returns are lognormal with the given annual mean and volatility.
+    Module-level so it can be pickled to worker processes.
+    """
+    rng = np.random.default_rng(seed)
+    # Convert annual arithmetic mean/volatility into monthly log-return parameters
+    sigma = np.sqrt(np.log1p((volatility ** 2) / (1 + mean_return) ** 2) / 12)
+    mu = np.log1p(mean_return) / 12 - sigma ** 2 / 2
+
+    balances = np.broadcast_to(values, (n_paths, len(values))).copy()
+    totals = np.empty((n_paths, years), dtype=np.float32)
+    for month in range(years * 12):
+        growth = np.exp(mu + sigma * rng.standard_normal(balances.shape))
+        balances *= growth
+        balances += contributions
+        if month % 12 == 11:
+            totals[:, month // 12] = balances.sum(axis=1)
+    return totals
+
+
+def _chunk_sizes(n_paths, chunk_size):
+    sizes = [chunk_size] * (n_paths // chunk_size)
+    if n_paths % chunk_size:
+        sizes.append(n_paths % chunk_size)
+    return sizes
+
+
+def simulate_purposes(investments, overrides=None, years=DEFAULT_YEARS, n_paths=DEFAULT_PATHS,
+                      chunk_size=DEFAULT_CHUNK_SIZE, workers=None, seed=None):
+    """Percentile outcome bands per purpose
+
+    Returns {purpose: {"current_value", "monthly_contribution", "years",
+    "bands": {percentile: [value at end of each year]}}}. workers=1 runs
+    in-process; otherwise chunks are spread over a process pool
+    (default: one worker per CPU).
+    """
+    buckets = build_buckets(investments, overrides)
+    if not buckets:
+        return {}
+
+    workers = workers or os.cpu_count() or 1
+    sizes = _chunk_sizes(n_paths, chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(buckets) * len(sizes))
+
+    jobs = []
+    for i, (purpose, bucket) in enumerate(buckets.items()):
+        for j, size in enumerate(sizes):
+            jobs.append((purpose, (
+                bucket["values"], bucket["contributions"], bucket["mean_return"],
+                bucket["volatility"], years, size, seeds[i * len(sizes) + j],
+            )))
+
+    if workers == 1:
+        chunks = [(purpose, simulate_chunk(*args)) for purpose, args in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(purpose, executor.submit(simulate_chunk, *args)) for purpose, args in jobs]
+            chunks = [(purpose, future.result()) for purpose, future in futures]
+
+    results = {}
+    for purpose, bucket in buckets.items():
+        totals = np.concatenate([chunk for p, chunk in chunks if p == purpose])
+        bands = np.percentile(totals, PERCENTILES, axis=0)
+        results[purpose] = {
+            "current_value": float(bucket["values"].sum()),
+            "monthly_contribution": float(bucket["contributions"].sum()),
+            "years": years,
+            "bands": {pct: [float(v) for v in band] for pct, band in zip(PERCENTILES, bands)},
+        }
+    return results
@@ -0,0 +1,117 @@
+"""
+Records - Compact rows for ledger data held in memory
+
+pymongo hands back every document as a dict with all of its fields
+(timestamp, description, ...), several hundred bytes per entry. The record
+types here keep only the fields reports read, in __slots__, and are loaded
+with a projection so the other fields never leave the server. Repeated
+strings (categories, sources, dates) are interned, so a million expenses
+share a few hundred string objects instead of holding three each.
+
+Records read like the documents they come from (record.amount or
+record['amount'], record.get('paid', 0)), so code written against the
+dicts keeps working.
+"""
+
+import sys
+
+
+class Record:
+    """Base for slotted records; subclasses list their fields in __slots__"""
+
+    __slots__ = ()
+    # Values for fields a document does not have
+    DEFAULTS = {}
+    # Fields whose values repeat across documents
+    INTERNED = ()
+    # Fields filled in after loading, never read from the database
+    DERIVED = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name, self.DEFAULTS.get(name)))
+
+    @classmethod
+    def projection(cls):
+        """MongoDB projection reading only this record's fields (`id` is the document _id)"""
+        projection = {name: 1 for name in cls.__slots__ if name not in cls.DERIVED and name != 'id'}
+        projection['_id'] = 1 if 'id' in cls.__slots__ else 0
+        return projection
+
+    @classmethod
+    def from_doc(cls, doc):
+        """Build a record from a document read with projection()"""
+        record = cls.__new__(cls)
+        defaults = cls.DEFAULTS
+        for name in cls.__slots__:
+            value = doc.get('_id' if name == 'id' else name, defaults.get(name))
+            if name in cls.INTERNED and value.__class__ is str:
+                value = sys.intern(value)
+            setattr(record, name, value)
+        return record
+
+    def as_dict(self):
+        """The record's fields as a plain dict (None fields left out)"""
+        fields = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if value is not None:
+                fields['_id' if name == 'id' else name] = value
+        return fields
+
+    # Dict-style access, for code written against raw documents
+    def __getitem__(self, name):
+        if name == '_id':
+            name = 'id'
+        if name not in self.__slots__:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __setitem__(self, name, value):
+        if name not in self.__slots__:
+            raise KeyError(name)
+        setattr(self, name, value)
+
+    def __contains__(self, name):
+        return name in self.__slots__ and getattr(self, name) is not None
+
+    def get(self, name, default=None):
+        value = getattr(self, name, None) if name in self.__slots__ else None
+        return default if value is None else value
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+
+class IncomeRecord(Record):
+    __slots__ = ('amount', 'source', 'date', 'currency', 'original_amount')
+    INTERNED = ('source', 'date', 'currency')
+    DERIVED = ('original_amount',)
+
+
+class ExpenseRecord(Record):
+    __slots__ = ('amount', 'category', 'date', 'currency', 'original_amount')
+    INTERNED = ('category', 'date', 'currency')
+    DERIVED = ('original_amount',)
+
+
+class InvestmentRecord(Record):
+    __slots__ = ('id', 'amount', 'current_value', 'type', 'purpose')
+    DEFAULTS = {'purpose': ''}
+    INTERNED = ('type', 'purpose')
+
+
+class DebtRecord(Record):
+    __slots__ = ('id', 'description', 'amount', 'paid', 'interest_rate', 'target_date')
+    DEFAULTS = {'paid': 0}
+
+
+class GoalRecord(Record):
+    __slots__ = ('id', 'name', 'target_amount', 'saved', 'monthly_target', 'deadline')
+    DEFAULTS = {'saved': 0}
@@ -0,0 +1,90 @@
+"""
+Report Cache - LRU memo of computed reports keyed by the data versions they read
+
+A report's key includes the version counters of the collections it is
+computed from, so a write anywhere relevant makes the next lookup miss and
+nothing ever has to be invalidated explicitly. It also includes the epoch
+of the counters (a random id given to them when they are created), since a
+fresh or different database counts from zero again. Entries can be saved to a
+JSON file and reloaded on the next run.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_ENTRIES = 128
+
+
+class ReportCache:
+    """Bounded LRU cache of JSON-serializable report results"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if path:
+            self._load()
+
+    @staticmethod
+    def make_key(name, versions, params=(), epoch=None):
+        """Stable string key for a report, the data versions it read and its parameters
+
+        epoch identifies the counters the versions come from, so a saved
+        report never matches counters that started over on other data.
+        """
+        return json.dumps([name, epoch, versions, list(params)], sort_keys=True, default=str)
+
+    def get_or_compute(self, key, compute):
+        """Cached result for key, or compute(), store and return it"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt or unreadable cache is just an empty one
+            return
+        for key, value in entries[-self.max_entries:]:
+            self._entries[key] = value
+
+    def save(self):
+        """Write the cache to its file (if it has one and anything changed)"""
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+            self._dirty = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, default=str)
+        os.replace(temp_path, self.path)
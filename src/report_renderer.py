@@ -0,0 +1,163 @@
+"""
+Report Renderer - Builds report sections from data and writes them in one buffered pass
+"""
+
+import csv
+import io
+import json
+import sys
+
+
+OUTPUT_FORMATS = ("table", "json", "csv")
+
+# Lines are joined and written to the stream in blocks of this many
+WRITE_BLOCK_LINES = 4096
+
+
+class Column:
+    """A report column: the row key, its header and how values are formatted"""
+
+    def __init__(self, key, header, kind="text"):
+        self.key = key
+        self.header = header
+        self.kind = kind  # "text" or "money"
+
+
+class ReportSection:
+    """A titled table of rows (dicts keyed by column key)"""
+
+    def __init__(self, title, columns, rows, note=None):
+        self.title = title
+        self.columns = columns
+        self.rows = rows
+        self.note = note
+
+
+class Report:
+    """A report made of sections followed by labelled summary values"""
+
+    def __init__(self, title):
+        self.title = title
+        self.sections = []
+        self.summary = []
+
+    def add_section(self, title, columns, rows, note=None):
+        self.sections.append(ReportSection(title, columns, rows, note))
+        return self
+
+    def add_summary(self, label, value, kind="money"):
+        self.summary.append((label, value, kind))
+        return self
+
+
+class ReportRenderer:
+    """Render reports as a plain table, JSON or CSV through a single buffered stream"""
+
+    def __init__(self, stream=None, output_format="table", currency="$", width=60):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'")
+        self.stream = stream if stream is not None else sys.stdout
+        self.output_format = output_format
+        self.currency = currency
+        self.width = width
+
+    def render(self, report):
+        """Render a report and flush the stream once at the end"""
+        if self.output_format == "json":
+            self._render_json(report)
+        elif self.output_format == "csv":
+            self._render_csv(report)
+        else:
+            self._write_lines(self._table_lines(report))
+        self.stream.flush()
+
+    def _format(self, value, kind):
+        if value is None:
+            return ""
+        if kind == "money":
+            return f"{self.currency}{value:,.2f}"
+        return str(value)
+
+    def _table_lines(self, report):
+        width = self.width
+        yield ""
+        yield "=" * width
+        yield report.title.center(width)
+        yield "=" * width
+
+        for section in report.sections:
+            if section.title:
+                yield ""
+                yield "-" * width
+                yield section.title.center(width)
+                yield "-" * width
+
+            cells = [
+                [self._format(row.get(col.key), col.kind) for col in section.columns]
+                for row in section.rows
+            ]
+            widths = [len(col.header) for col in section.columns]
+            for row in cells:
+                for i, cell in enumerate(row):
+                    if len(cell) > widths[i]:
+                        widths[i] = len(cell)
+
+            # Money right-aligned, everything else left-aligned
+            aligns = [">" if col.kind == "money" else "<" for col in section.columns]
+            yield "  ".join(f"{col.header:{aligns[i]}{widths[i]}}" for i, col in enumerate(section.columns)).rstrip()
+            yield "  ".join("-" * w for w in widths)
+            for row in cells:
+                yield "  ".join(f"{cell:{aligns[i]}{widths[i]}}" for i, cell in enumerate(row)).rstrip()
+
+            if section.note:
+                yield ""
+                yield section.note
+
+        if report.summary:
+            yield ""
+            yield "-" * width
+            for label, value, kind in report.summary:
+                yield f"{label}: {self._format(value, kind)}"
+            yield "-" * width
+
+    def _write_lines(self, lines):
+        write = self.stream.write
+        block = []
+        for line in lines:
+            block.append(line)
+            if len(block) >= WRITE_BLOCK_LINES:
+                block.append("")
+                write("\n".join(block))
+                block = []
+        if block:
+            block.append("")
+            write("\n".join(block))
+
+    def _render_json(self, report):
+        data = {
+            "title": report.title,
+            "sections": [
+                {
+                    "title": section.title,
+                    "rows": [
+                        {col.key: row.get(col.key) for col in section.columns}
+                        for row in section.rows
+                    ],
+                }
+                for section in report.sections
+            ],
+            "summary": {label: value for label, value, _ in report.summary},
+        }
+        self.stream.write(json.dumps(data, default=str))
+        self.stream.write("\n")
+
+    def _render_csv(self, report):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for i, section in enumerate(report.sections):
+            if i:
+                writer.writerow([])
+            writer.writerow([col.key for col in section.columns])
+            keys = [col.key for col in section.columns]
+            writer.writerows([[row.get(key, "") for key in keys] for row in section.rows])
+        self.stream.write(buffer.getvalue())
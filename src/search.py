@@ -0,0 +1,123 @@
+"""
+Search Manager - Find entries by text across income, expenses, investments, debts and goals
+"""
+
+from datetime import datetime
+
+from data_manager import SEARCHABLE_COLLECTIONS
+from report_renderer import Column, Report, ReportRenderer
+
+
+PAGE_SIZE = 20
+
+
+def result_rows(results):
+    """Flatten search hits from different collections into common report rows"""
+    rows = []
+    for doc in results:
+        spec = SEARCHABLE_COLLECTIONS[doc['collection']]
+        text = " / ".join(str(doc[field]) for field in spec['text'] if doc.get(field))
+        rows.append({
+            "collection": doc['collection'],
+            "date": doc.get('date', ''),
+            "amount": doc.get(spec['amount']),
+            "category": doc.get(spec['category'], '') if spec['category'] else '',
+            "text": text,
+            "score": round(doc['score'], 2),
+        })
+    return rows
+
+
+def search_report(result, query):
+    """Report for one page of search results"""
+    total_pages = max(1, -(-result['total'] // result['page_size']))
+    report = Report(f"SEARCH: {query}")
+    report.add_section(None, [
+        Column("collection", "Type"),
+        Column("date", "Date"),
+        Column("amount", "Amount", "money"),
+        Column("category", "Category"),
+        Column("text", "Matched"),
+        Column("score", "Score"),
+    ], result_rows(result['results']),
+        note=f"Page {result['page']} of {total_pages} ({result['total']} matches)")
+    return report
+
+
+class SearchManager:
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+
+    def _ask_date(self, prompt):
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            print("Invalid date format. Ignoring this filter.")
+            return None
+        return value
+
+    def _ask_amount(self, prompt):
+        value = input(prompt).strip()
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            print("Invalid amount. Ignoring this filter.")
+            return None
+
+    def search(self):
+        """Prompt for a query and filters, then page through ranked results"""
+        print("\n" + "="*60)
+        print("SEARCH".center(60))
+        print("="*60)
+
+        text = input("Search for: ").strip()
+        if not text:
+            print("Search text cannot be empty.")
+            return
+
+        print("\nOptional filters (press Enter to skip)")
+        names = list(SEARCHABLE_COLLECTIONS)
+        print("Types: " + ", ".join(names))
+        collection = input("Only search type: ").strip().lower()
+        if collection and collection not in SEARCHABLE_COLLECTIONS:
+            print("Unknown type. Searching everything.")
+            collection = ""
+        min_amount = self._ask_amount("Minimum amount: ")
+        max_amount = self._ask_amount("Maximum amount: ")
+        start_date = self._ask_date("From date (YYYY-MM-DD): ")
+        end_date = self._ask_date("To date (YYYY-MM-DD): ")
+        category = input("Category/source/type: ").strip() or None
+
+        currency = self.data_manager.get_currency()
+        page = 1
+        while True:
+            result = self.data_manager.search_entries(
+                text, [collection] if collection else None,
+                min_amount, max_amount, start_date, end_date, category,
+                page, PAGE_SIZE,
+            )
+            if not result['total']:
+                print("\nNo matching entries found.")
+                return
+            ReportRenderer(None, "table", currency).render(search_report(result, text))
+
+            has_next = page * PAGE_SIZE < result['total']
+            options = []
+            if has_next:
+                options.append("[n] Next page")
+            if page > 1:
+                options.append("[p] Previous page")
+            if not options:
+                return
+            choice = input("\n" + "  ".join(options) + "  [Enter] Done: ").strip().lower()
+            if choice == "n" and has_next:
+                page += 1
+            elif choice == "p" and page > 1:
+                page -= 1
+            else:
+                return
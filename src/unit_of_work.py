@@ -0,0 +1,225 @@
+"""
+Unit of Work - Related writes of one operation committed together
+
+An investment deposit touches the investment, a new expense entry and that
+month's spend counters. A UnitOfWork queues such writes and commits them
+when its with block ends. The revisions of all the documents are reserved in
+one round trip and the version counters bumped in one more, instead of once
+per step.
+
+On replica sets and sharded clusters the writes run in one MongoDB
+transaction. A standalone mongod has no transactions, so the unit is
+written to the pending_units collection first and then applied as one
+ordered bulk_write per collection, each write tagged with the unit's id so
+it applies at most once. The marker is deleted when every write is in.
+A crash partway leaves the marker behind, and recover_units (run by every
+new DataManager for markers older than a minute, and by init-db for all of
+them) rolls the unit forward. Until then readers may see part of the unit.
+
+Entries written through a unit of work skip the write-behind journal, since
+a journaled entry would land outside the transaction.
+"""
+
+import weakref
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+
+# Clients whose server turned down a transaction (a standalone mongod)
+_no_transactions = weakref.WeakSet()
+
+# IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+TRANSACTIONS_UNSUPPORTED = 20
+
+# Markers of units written without a transaction, and the field tagging their writes
+PENDING_COLLECTION = 'pending_units'
+UNIT_FIELD = 'pending_units'
+
+# Markers younger than this may belong to a commit still in progress
+RECOVERY_AGE = timedelta(minutes=1)
+
+
+class UnitOfWork:
+    """Writes queued for one logical operation; committed on leaving the with block"""
+
+    def __init__(self, data_manager):
+        self.data_manager = data_manager
+        self.id = ObjectId()
+        # Collection name -> queued ('insert', document) / ('update', query, update, upsert)
+        self._writes = {}
+        self.committed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # An exception in the block discards everything queued
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def insert(self, collection_name, document):
+        """Queue a new document; returns it (with its _id and tenant set)"""
+        document.setdefault('_id', ObjectId())
+        document['tenant'] = self.data_manager.tenant
+        self._writes.setdefault(collection_name, []).append(('insert', document))
+        return document
+
+    def update(self, collection_name, query, update, upsert=False):
+        """Queue an update of the tenant's documents matching query"""
+        self._writes.setdefault(collection_name, []).append(('update', query, update, upsert))
+
+    def inserted(self, collection_name):
+        return [write[1] for write in self._writes.get(collection_name, ()) if write[0] == 'insert']
+
+    def commit(self):
+        """Write everything queued and bump the version counters of the collections written"""
+        if self.committed:
+            raise RuntimeError("Unit of work already committed")
+        self.committed = True
+        data_manager = self.data_manager
+        if not self._writes:
+            return
+
+        written = list(self._writes)
+        first = data_manager._next_revisions(sum(len(writes) for writes in self._writes.values()))
+        operations = {}
+        for name, writes in self._writes.items():
+            operations[name] = []
+            for revision, write in enumerate(writes, first):
+                if write[0] == 'insert':
+                    write[1]['revision'] = write[1]['created_revision'] = revision
+                    operations[name].append(write)
+                else:
+                    _, query, update, upsert = write
+                    update.setdefault('$set', {})['revision'] = revision
+                    operations[name].append(('update', data_manager._scope(query), update, upsert))
+            first += len(writes)
+        expenses = self.inserted('expenses')
+        if expenses:
+            operations['category_spend'] = [
+                ('update', query, update, True) for query, update in data_manager._category_spend_changes(expenses)
+            ]
+
+        ledgers = [name for name in ('income', 'expenses') if self.inserted(name)]
+        records, versions = {}, {}
+        for _ in ledgers:
+            data_manager.ledger.begin_write()
+        try:
+            self._write(operations)
+            versions = data_manager._bump_version(*written)
+            for name in ledgers:
+                records[name] = data_manager._ledger_records(name, self.inserted(name))
+        finally:
+            for name in ledgers:
+                data_manager.ledger.end_write(name, records.get(name, ()), versions.get(name))
+
+    def _write(self, operations):
+        client = self.data_manager.client
+        if client not in _no_transactions:
+            try:
+                with client.start_session() as session:
+                    session.with_transaction(lambda s: self._bulk_write(operations, s))
+                return
+            except OperationFailure as e:
+                if e.code != TRANSACTIONS_UNSUPPORTED:
+                    raise
+                _no_transactions.add(client)
+        self._write_recoverable(operations)
+
+    def _bulk_write(self, operations, session=None):
+        db = self.data_manager.db
+        for name, writes in operations.items():
+            if writes:
+                db[name].bulk_write([_request(write) for write in writes], ordered=True, session=session)
+
+    def _write_recoverable(self, operations):
+        """Apply the writes without a transaction, behind a marker recover_units can roll forward"""
+        db = self.data_manager.db
+        db[PENDING_COLLECTION].insert_one({
+            '_id': self.id,
+            'tenant': self.data_manager.tenant,
+            'created': datetime.now(),
+            # Encoded, since update documents have $ and dotted keys
+            'operations': bson.encode({'operations': list(operations.items())}),
+        })
+        for name, writes in operations.items():
+            if writes:
+                db[name].bulk_write([_request(write, self.id) for write in writes], ordered=True)
+        _finish(db, self.id, operations)
+
+
+def _request(write, unit_id=None):
+    """The bulk_write request of a queued write; with unit_id, one that applies only once"""
+    if write[0] == 'insert':
+        return InsertOne(write[1])
+    _, query, update, upsert = write
+    if unit_id is None:
+        return UpdateOne(query, update, upsert=upsert)
+    return UpdateOne(*_guarded(query, update, unit_id), upsert=upsert)
+
+
+def _guarded(query, update, unit_id):
+    """An update that tags what it changes with the unit's id and skips documents already tagged"""
+    update = dict(update)
+    update['$addToSet'] = {**update.get('$addToSet', {}), UNIT_FIELD: unit_id}
+    return {**query, UNIT_FIELD: {'$ne': unit_id}}, update
+
+
+def _finish(db, unit_id, operations):
+    """Delete the unit's marker, then take its tag off the documents it updated"""
+    # The marker goes first: while it exists the tags are what keeps a retry from applying twice
+    db[PENDING_COLLECTION].delete_one({'_id': unit_id})
+    for name, writes in operations.items():
+        untag = []
+        for write in writes:
+            if write[0] == 'update':
+                query = write[1]
+                untag.append(UpdateOne({**query, UNIT_FIELD: [unit_id]}, {'$unset': {UNIT_FIELD: ''}}))
+                # Tagged by another unit still in progress as well
+                untag.append(UpdateOne({**query, UNIT_FIELD: unit_id}, {'$pull': {UNIT_FIELD: unit_id}}))
+        if untag:
+            db[name].bulk_write(untag, ordered=True)
+
+
+def recover_units(data_manager, min_age=RECOVERY_AGE):
+    """Roll forward the tenant's units left half-written by a crash; returns how many"""
+    db = data_manager.db
+    markers = list(db[PENDING_COLLECTION].find(
+        data_manager._scope({'created': {'$lte': datetime.now() - min_age}})
+    ))
+    written = set()
+    for marker in markers:
+        operations = dict(bson.decode(marker['operations'])['operations'])
+        # Writes still to apply get fresh revisions: change consumers may have moved past the old ones
+        stamped = [
+            write[1] if write[0] == 'insert' else write[2]['$set']
+            for writes in operations.values() for write in writes
+            if write[0] == 'insert' or 'revision' in write[2].get('$set', {})
+        ]
+        if stamped:
+            for revision, fields in enumerate(stamped, data_manager._next_revisions(len(stamped))):
+                fields['revision'] = revision
+                if 'created_revision' in fields:
+                    fields['created_revision'] = revision
+        for name, writes in operations.items():
+            for write in writes:
+                try:
+                    if write[0] == 'insert':
+                        db[name].insert_one(write[1])
+                    else:
+                        _, query, update, upsert = write
+                        db[name].update_one(*_guarded(query, update, marker['_id']), upsert=upsert)
+                except DuplicateKeyError:
+                    # Already applied: the entry exists, or the counter upserted carries the tag
+                    pass
+            written.add(name)
+        _finish(db, marker['_id'], operations)
+    if written:
+        data_manager._bump_version(*written)
+        data_manager.ledger.clear()
+    return len(markers)
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import connection  # noqa: E402
+import memory_backend  # noqa: E402
+from data_manager import DataManager  # noqa: E402
+
+
+@pytest.fixture
+def data_manager(monkeypatch):
+    """A DataManager on a fresh in-memory store (PFA_BACKEND=memory)"""
+    # Ignore any .env file and PFA_* settings of the machine running the tests
+    monkeypatch.setattr(connection, "_env_loaded", True)
+    for variable in list(os.environ):
+        if variable.startswith("PFA_"):
+            monkeypatch.delenv(variable)
+    monkeypatch.setenv("PFA_BACKEND", "memory")
+    monkeypatch.setattr(memory_backend, "_shared_client", memory_backend.MemoryClient())
+
+    dm = DataManager()
+    yield dm
+    dm.close()
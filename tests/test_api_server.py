@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+import api_server  # noqa: E402
+
+
+def _call(data_manager, requests):
+    """Run requests(client) against the app and return its result"""
+    async def run():
+        app = api_server.create_app(data_manager)
+        # The app closes the data manager on cleanup; the fixture does that instead
+        app.on_cleanup.clear()
+        async with TestClient(TestServer(app)) as client:
+            return await requests(client)
+    return asyncio.run(run())
+
+
+def test_created_documents_leave_out_bookkeeping_fields(data_manager):
+    async def requests(client):
+        response = await client.post("/expenses", json={"amount": 12.5, "category": "Food"})
+        return response.status, await response.json()
+
+    status, body = _call(data_manager, requests)
+    assert status == 201
+    assert body["category"] == "Food"
+    assert not {"tenant", "revision", "created_revision"} & set(body)
+
+
+def test_debt_payments_use_ids_from_the_debt_listing(data_manager):
+    async def requests(client):
+        await client.post("/debts", json={"amount": 1000, "description": "Car"})
+        debt = (await (await client.get("/debts")).json())["active"][0]
+        response = await client.post(f"/debts/{debt['_id']}/payments", json={"amount": 100})
+        return response.status
+
+    assert _call(data_manager, requests) == 201
+    assert data_manager.get_all_debts()[0]["paid"] == 100
+
+
+def test_investment_values_are_updated_by_id(data_manager):
+    async def requests(client):
+        await client.post("/investments", json={"name": "Index Fund", "amount": 1000})
+        investment = (await (await client.get("/investments")).json())[0]
+        updated = await client.put(f"/investments/{investment['_id']}/value", json={"current_value": 1200})
+        missing = await client.put("/investments/0/value", json={"current_value": 1})
+        return updated.status, missing.status
+
+    assert _call(data_manager, requests) == (200, 400)
+    assert data_manager.get_all_investments()[0]["current_value"] == 1200
+
+
+def test_dashboard_route(data_manager):
+    async def requests(client):
+        return (await client.get("/dashboard")).status
+
+    assert _call(data_manager, requests) == 200
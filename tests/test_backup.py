@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from backup import backup, restore
+from data_manager import DataManager
+
+
+TODAY = datetime.now().strftime("%Y-%m-%d")
+
+
+def _ledger(data_manager):
+    return (
+        sorted(e["amount"] for e in data_manager.income_collection.find({"tenant": data_manager.tenant})),
+        sorted(e["amount"] for e in data_manager.expenses_collection.find({"tenant": data_manager.tenant})),
+        [d["description"] for d in data_manager.debts_collection.find({"tenant": data_manager.tenant})],
+    )
+
+
+def test_full_and_incremental_round_trip(data_manager, tmp_path):
+    data_manager.add_income(1000, "Salary", TODAY)
+    data_manager.add_expense(40, "Food", TODAY)
+    data_manager.add_debt(300, "Card", TODAY)
+    full = backup(data_manager, str(tmp_path / "full.jsonl.gz"))
+    data_manager.add_expense(15, "Transport", TODAY)
+    incremental = backup(data_manager, str(tmp_path / "incremental.jsonl.gz"), incremental=True)
+    assert incremental["kind"] == "incremental"
+    expected = _ledger(data_manager)
+
+    data_manager.add_expense(999, "Mistake", TODAY)
+    restore(data_manager, full["path"])
+    restore(data_manager, incremental["path"])
+    assert _ledger(data_manager) == expected == ([1000], [15, 40], ["Card"])
+
+
+def test_restore_into_another_tenant_keeps_both(data_manager, tmp_path):
+    data_manager.add_income(1000, "Salary", TODAY)
+    data_manager.add_debt(300, "Card", TODAY)
+    path = backup(data_manager, str(tmp_path / "full.jsonl.gz"))["path"]
+
+    other = DataManager(tenant="other", client=data_manager.client)
+    other.add_income(5, "Gift", TODAY)
+    restore(other, path)
+    # Twice: the same files map to the same _ids
+    restore(other, path)
+    assert _ledger(other) == _ledger(data_manager) == ([1000], [], ["Card"])
+    assert other.get_all_income() == data_manager.get_all_income()
+    assert data_manager.income_collection.count_documents({}) == 2
@@ -0,0 +1,72 @@
+import pytest
+
+from cli import build_parser, main
+
+
+@pytest.mark.parametrize("years", ["0", "-3", "ten"])
+def test_simulate_portfolio_needs_a_year_or_more(years, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        build_parser().parse_args(["simulate-portfolio", "--years", years])
+    assert exit_info.value.code == 2
+    assert "--years" in capsys.readouterr().err
+
+
+def test_simulate_portfolio_years():
+    args = build_parser().parse_args(["simulate-portfolio", "--years", "1"])
+    assert args.years == 1
+
+
+def test_import_expenses_reports_rows_in_order(data_manager, tmp_path, capsys):
+    path = tmp_path / "bank.csv"
+    path.write_text("date,amount,description\n"
+                    "2026-01-05,12.50,Coffee shop\n"
+                    "not a date,3,Bus\n"
+                    "2026-01-07,40,Groceries\n")
+    assert main(["import-expenses", str(path)]) == 1
+    errors = capsys.readouterr().err.splitlines()
+    assert [error.split(": ")[0] for error in errors[:3]] == [f"{path}:2", f"{path}:3", f"{path}:4"]
+    assert "nothing was imported" in errors[3]
+    assert data_manager.get_all_expenses() == []
+
+    assert main(["import-expenses", str(path), "--default-category", "Other"]) == 0
+    out, err = capsys.readouterr()
+    assert out.startswith("Imported 2 expenses")
+    assert err.splitlines() == [f"{path}:3: skipped, needs a YYYY-MM-DD date and a numeric amount"]
+
+
+def test_import_expenses_fails_when_nothing_is_importable(data_manager, tmp_path, capsys):
+    path = tmp_path / "bank.csv"
+    path.write_text("date,amount,description\n")
+    assert main(["import-expenses", str(path), "--default-category", "Other"]) == 1
+    assert "no expenses to import" in capsys.readouterr().err
+
+
+def test_empty_repayments_go_to_the_output_file(data_manager, tmp_path, capsys):
+    path = tmp_path / "repayments.txt"
+    assert main(["repayments", "--output", str(path)]) == 0
+    assert path.read_text().strip() == "No debt history found."
+    assert capsys.readouterr().out == ""
+
+
+def test_archive_batch_size_must_be_positive(capsys):
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(["archive", "--batch-size", "0"])
+    assert "--batch-size" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("argv", [
+    ["search", "rent", "--page", "0"],
+    ["search", "rent", "--page-size", "-5"],
+    ["changes", "--limit", "0"],
+    ["repayments", "--limit", "0"],
+    ["forecast", "--months", "0"],
+])
+def test_counts_must_be_positive(argv):
+    with pytest.raises(SystemExit) as exit_info:
+        build_parser().parse_args(argv)
+    assert exit_info.value.code == 2
+
+
+def test_archived_entries_need_a_year(data_manager, capsys):
+    assert main(["archived", "income"]) == 1
+    assert "A year is required" in capsys.readouterr().err
@@ -0,0 +1,38 @@
+from bson import ObjectId, json_util
+from pymongo.errors import AutoReconnect
+
+from journal import WriteJournal
+
+
+def _line(amount):
+    document = {"_id": ObjectId(), "amount": amount}
+    return json_util.dumps({"collection": "income", "document": document}) + "\n"
+
+
+def _unreachable(name, documents):
+    raise AutoReconnect("server down")
+
+
+def _open(path):
+    """A journal whose server is down, so everything stays pending"""
+    return WriteJournal(str(path), _unreachable, flush_interval=3600)
+
+
+def test_torn_final_line_is_cut_off(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(_line(1) + _line(2)[:20])
+    journal = _open(path)
+    assert [doc["amount"] for doc in journal.pending("income")] == [1]
+
+    journal.append("income", {"_id": ObjectId(), "amount": 3})
+    journal.close()
+    assert [doc["amount"] for doc in _open(path).pending("income")] == [1, 3]
+
+
+def test_line_missing_only_its_newline_is_kept(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text(_line(1) + _line(2).rstrip("\n"))
+    journal = _open(path)
+    journal.append("income", {"_id": ObjectId(), "amount": 3})
+    journal.close()
+    assert [doc["amount"] for doc in _open(path).pending("income")] == [1, 2, 3]
@@ -0,0 +1,430 @@
+import io
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+import data_manager as data_manager_module
+import memory_backend
+from cash_flow import MAX_MONTHS, forecast_cash_flow
+from categorizer import Categorizer
+from dashboard import Dashboard
+from debt_payoff import solve_payoff
+from data_manager import DataManager
+from expenses import ExpenseManager
+from goal_projection import project_goal
+from income import IncomeManager
+from ledger_cache import LedgerCache
+from records import IncomeRecord
+
+
+TODAY = datetime.now().strftime("%Y-%m-%d")
+
+
+def test_income_summary(data_manager):
+    data_manager.add_income(1000, "Salary", TODAY)
+    data_manager.add_income(250, "Freelance", TODAY)
+    summary = IncomeManager(data_manager).get_summary()
+    assert summary["total_income"] == 1250
+    assert summary["month_income"] == 1250
+    assert summary["by_source"] == [("Salary", 1000), ("Freelance", 250)]
+
+
+def test_income_listing_goes_to_the_stream(data_manager):
+    data_manager.add_income(1000, "Salary", TODAY, "pay")
+    stream = io.StringIO()
+    IncomeManager(data_manager).view_all_income("csv", stream)
+    assert "Salary" in stream.getvalue()
+
+
+def test_expense_category_totals(data_manager):
+    data_manager.add_expense(30, "Food", TODAY)
+    data_manager.add_expense(20, "Food", TODAY)
+    data_manager.add_expense(500, "Investment", TODAY)
+    totals = ExpenseManager(data_manager).get_category_totals()
+    assert totals["by_category"]["Food"] == {"total": 50, "count": 2}
+    assert totals["total_expenses"] == 50
+    assert totals["total_investments"] == 500
+
+
+def test_recurring_expenses_are_applied_once_a_month(data_manager):
+    data_manager.add_recurring_expense(900, "Housing", "Rent", "monthly")
+    manager = ExpenseManager(data_manager)
+
+    first = manager.apply_recurring_expenses()
+    assert [entry["description"] for entry in first["applied"]] == ["Rent"]
+    assert data_manager.get_recurring_expenses()[0]["last_processed"] == TODAY
+
+    second = manager.apply_recurring_expenses()
+    assert second["applied"] == []
+    assert len(data_manager.get_expenses_by_category("Housing")) == 1
+
+
+def test_update_investment_value(data_manager):
+    data_manager.add_investment("Index Fund", 1000, "ETF", "Retirement", TODAY)
+    data_manager.add_investment("Bonds", 500, "Bonds", "Retirement", TODAY)
+
+    assert data_manager.update_investment_value(1, 550)
+    assert not data_manager.update_investment_value(2, 1)
+    investment_id = data_manager.get_all_investments(include_ids=True)[0]["_id"]
+    assert data_manager.set_investment_value(investment_id, 1100)
+    assert [inv["current_value"] for inv in data_manager.get_all_investments()] == [1100, 550]
+
+
+def test_delete_category_rule(data_manager):
+    data_manager.add_category_rule("uber", "Transportation", "keyword")
+    data_manager.add_category_rule("rent", "Housing", "keyword")
+
+    assert data_manager.delete_category_rule(0)
+    assert [rule["pattern"] for rule in data_manager.get_category_rules()] == ["rent"]
+    assert not data_manager.delete_category_rule(5)
+
+
+def test_debt_payments_and_goal_contributions_accumulate(data_manager):
+    debt = data_manager.add_debt(1000, "Car", TODAY)
+    goal = data_manager.add_goal("Trip", 2000, 100, None, "", TODAY)
+    for amount in (100, 50):
+        assert data_manager.add_debt_payment(debt["_id"], amount, TODAY)
+        assert data_manager.add_goal_contribution(goal["_id"], amount, TODAY)
+
+    debt = data_manager.get_all_debts()[0]
+    assert debt["paid"] == 150 and len(debt["payments"]) == 2
+    assert data_manager.get_all_goals()[0]["saved"] == 150
+
+
+def test_backfill_revisions_stamps_old_documents(data_manager):
+    data_manager.expenses_collection.insert_one(
+        {"tenant": data_manager.tenant, "amount": 5, "category": "Food", "date": TODAY})
+
+    assert data_manager.backfill_revisions() == 1
+    changes = data_manager.changes_since(0)["changes"]
+    assert any(change["collection"] == "expenses" for change in changes)
+
+
+def test_changes_stop_short_of_writes_in_progress(data_manager, monkeypatch):
+    other = DataManager()
+    reserved = other._next_revisions()
+    data_manager.add_income(100, "Salary", TODAY)
+
+    # The later income is already in, but the reserved revision's write is not
+    page = data_manager.changes_since(0)
+    assert page["revision"] == reserved - 1
+    assert not any(change["collection"] == "income" for change in page["changes"])
+
+    other.income_collection.insert_one({"tenant": other.tenant, "amount": 5, "source": "Gift", "date": TODAY,
+                                        "revision": reserved, "created_revision": reserved})
+    other._bump_version("income")
+    page = data_manager.changes_since(page["revision"])
+    assert [change["document"]["amount"] for change in page["changes"]] == [5, 100]
+
+    # A lease whose write never finished stops holding changes back once it times out
+    other._next_revisions()
+    data_manager.add_income(50, "Salary", TODAY)
+    assert data_manager.changes_since(page["revision"])["changes"] == []
+    monkeypatch.setattr(data_manager_module, "REVISION_LEASE_TIMEOUT", timedelta(0))
+    assert len(data_manager.changes_since(page["revision"])["changes"]) == 1
+    other.close()
+
+
+def test_archived_totals_follow_the_reporting_currency(data_manager):
+    data_manager.set_reporting_currency("USD")
+    data_manager.import_fx_rates([{"currency": "EUR", "date": "2020-06-01", "rate": 2.0}])
+    data_manager.add_income(100, "Salary", "2020-06-01", currency="EUR")
+    data_manager.archive_entries("income", "2021-01-01")
+    totals = data_manager.get_archived_totals("income")
+    assert totals[0]["currency"] == "USD"
+    assert totals[0]["total"] == 200
+
+    # The rates are against USD, so reporting in EUR converts USD back at 1/2
+    data_manager.set_reporting_currency("EUR")
+    totals = data_manager.get_archived_totals("income")
+    assert totals[0]["currency"] == "EUR"
+    assert totals[0]["total"] == 100
+
+
+def test_return_assumptions_are_stored_under_safe_keys(data_manager):
+    data_manager.set_return_assumption("U.S. $tocks", 8.0, 15.0, 100)
+    stored = data_manager.settings_collection.find_one({"tenant": data_manager.tenant})["return_assumptions"]
+    assert list(stored) == ["u_s_ _tocks"]
+    assert data_manager.get_return_assumptions() == {
+        "U.S. $tocks": {"mean_return": 8.0, "volatility": 15.0, "monthly_contribution": 100},
+    }
+
+
+def test_return_assumptions_reject_a_total_loss(data_manager):
+    with pytest.raises(ValueError):
+        data_manager.set_return_assumption("Stocks", -100, 15.0, 0)
+    assert data_manager.get_return_assumptions() == {}
+
+
+def test_empty_listings_go_to_the_stream(data_manager, capsys):
+    stream = io.StringIO()
+    IncomeManager(data_manager).view_all_income("table", stream)
+    ExpenseManager(data_manager).view_all_expenses("table", stream)
+    ExpenseManager(data_manager).view_budgets("table", stream)
+    assert stream.getvalue().strip().splitlines() == [
+        "No income entries found.", "", "No expense entries found.", "", "No category budgets set."]
+    assert capsys.readouterr().out == ""
+
+
+def test_saved_reports_do_not_outlive_their_database(data_manager, tmp_path, monkeypatch):
+    path = str(tmp_path / "reports.json")
+    first = DataManager(report_cache_path=path)
+    first.add_income(100, "Salary", TODAY)
+    assert IncomeManager(first).get_summary()["total_income"] == 100
+    first.close()
+
+    # A fresh store counts versions from zero again
+    monkeypatch.setattr(memory_backend, "_shared_client", memory_backend.MemoryClient())
+    second = DataManager(report_cache_path=path)
+    second.add_income(999, "Salary", TODAY)
+    assert IncomeManager(second).get_summary()["total_income"] == 999
+    second.close()
+
+
+def test_changes_move_on_after_writes_that_match_nothing(data_manager):
+    other = DataManager()
+    assert data_manager.add_debt_payment(ObjectId(), 5, TODAY) is False
+    assert data_manager.add_goal_contribution(ObjectId(), 5, TODAY) is False
+    versions = data_manager.get_versions("goals")
+    assert data_manager.update_goal_monthly_target(ObjectId(), 50) is False
+    assert data_manager.get_versions("goals") == versions
+
+    other.add_income(100, "Salary", TODAY)
+    page = other.changes_since(0)
+    assert [change["document"]["amount"] for change in page["changes"] if change["collection"] == "income"] == [100]
+    other.close()
+
+
+def test_deletes_without_pre_images_reach_the_dashboard(data_manager):
+    data_manager.add_income(1000, "Salary", TODAY)
+    data_manager.add_investment("Index Fund", 500, "ETF", "Retirement", TODAY)
+    dashboard = Dashboard(data_manager)
+    state = dashboard.load_state(track_investments=True)
+    investment_id = data_manager.investments_collection.find_one()["_id"]
+    income_id = data_manager.income_collection.find_one()["_id"]
+
+    def delete(collection, doc_id):
+        return {"operationType": "delete", "ns": {"coll": collection}, "documentKey": {"_id": doc_id}}
+
+    # The change stream lets them through, though their tenant is unknown
+    match = data_manager._ledger_watch_pipeline()[0]["$match"]
+    assert memory_backend.matches(delete("income", income_id), match)
+    assert not memory_backend.matches(
+        {**delete("income", income_id), "fullDocumentBeforeChange": {"tenant": "other"}}, match)
+
+    # An entry's amount is unknown without its pre-image: the state has to be reloaded
+    assert dashboard.apply_change(state, delete("income", income_id)) is False
+    assert dashboard.apply_change(state, delete("investments", investment_id)) is True
+    assert state.investment_count == 0
+    assert state.total_invested == 0
+
+
+def test_archive_rejects_an_empty_batch_before_writing(data_manager):
+    data_manager.add_income(100, "Salary", "2020-06-01")
+    with pytest.raises(ValueError):
+        data_manager.archive_entries("income", "2021-01-01", batch_size=0)
+    assert data_manager.get_archived_totals() == []
+    assert data_manager.income_collection.count_documents({"tenant": data_manager.tenant}) == 1
+
+
+def test_pending_journal_entries_hide_bookkeeping_fields(data_manager, tmp_path, monkeypatch):
+    journaled = DataManager(journal_path=str(tmp_path / "journal.jsonl"))
+    journaled.add_income(100, "Salary", TODAY)
+
+    # A flush that stamped the pending entries and then failed to insert them
+    def unreachable(*args, **kwargs):
+        raise AutoReconnect("server down")
+
+    monkeypatch.setattr(type(journaled.income_collection), "insert_many", unreachable)
+    with pytest.raises(AutoReconnect):
+        journaled.journal.flush()
+    assert journaled.journal.pending("income")[0]["created_revision"]
+
+    (entry,) = journaled.get_all_income()
+    assert set(entry) == {"amount", "source", "date", "description", "timestamp"}
+    monkeypatch.undo()
+    journaled.close()
+
+
+def test_goal_projection_with_steady_contributions():
+    now = datetime(2026, 3, 15)
+    goal = {"target_amount": 1000, "saved": 300, "date": "2026-01-01", "deadline": "2026-10",
+            "contributions": [{"amount": 100, "date": f"2026-0{month}-05"} for month in (1, 2, 3)]}
+
+    # Three identical months leave no spread: every path needs exactly seven more
+    projection = project_goal(goal, n_paths=100, rng=np.random.default_rng(1), now=now)
+    assert projection["std_contribution"] == 0
+    assert projection["median_months"] == projection["p90_months"] == 7
+    assert projection["probability_by_deadline"] == 1.0
+
+    goal["deadline"] = "2026-09"
+    projection = project_goal(goal, n_paths=100, rng=np.random.default_rng(1), now=now)
+    assert projection["probability_by_deadline"] == 0.0
+
+
+def test_goal_projection_is_reproducible_with_a_seed():
+    now = datetime(2026, 3, 15)
+    goal = {"target_amount": 1200, "saved": 0, "monthly_target": 100, "date": "2026-03-01", "deadline": "2027-03"}
+
+    first = project_goal(goal, n_paths=2000, rng=np.random.default_rng(42), now=now)
+    assert first == project_goal(goal, n_paths=2000, rng=np.random.default_rng(42), now=now)
+    assert (first["mean_contribution"], first["std_contribution"]) == (100, 25)
+    assert 11 <= first["median_months"] <= 13
+    assert first["median_months"] <= first["p90_months"]
+    assert 0.3 < first["probability_by_deadline"] < 0.7
+
+    assert project_goal({**goal, "saved": 1200}, rng=np.random.default_rng(42), now=now) is None
+
+
+def test_payoff_strategies_order_the_debts():
+    now = datetime(2026, 3, 15)
+    debts = [
+        {"description": "Card", "amount": 1000, "paid": 0, "interest_rate": 20},
+        {"description": "Loan", "amount": 400, "paid": 100, "interest_rate": 5},
+        {"description": "Friend", "amount": 600, "paid": 0, "target_date": "2026-06"},
+    ]
+    plans = {plan["strategy"]: plan for plan in solve_payoff(debts, 200, now=now)}
+
+    def order(strategy):
+        return [debt["description"] for debt in sorted(plans[strategy]["debts"], key=lambda d: d["order"])]
+
+    assert order("avalanche") == ["Card", "Loan", "Friend"]
+    assert order("snowball") == ["Loan", "Friend", "Card"]
+    assert order("deadline") == ["Friend", "Card", "Loan"]
+
+    # Only paying the friend first clears them by June
+    assert plans["deadline"]["debts"][2]["payoff_date"] == "2026-05"
+    assert plans["deadline"]["targets_missed"] == 0
+    assert plans["avalanche"]["targets_missed"] == 1
+    assert plans["avalanche"]["total_interest"] < plans["snowball"]["total_interest"]
+
+
+def test_payoff_without_interest_is_exact():
+    now = datetime(2026, 11, 1)
+    debts = [{"description": "Big", "amount": 300}, {"description": "Small", "amount": 200, "paid": 50}]
+    (plan,) = solve_payoff(debts, 100, strategies=("snowball",), now=now)
+
+    assert [(debt["order"], debt["months"], debt["payoff_date"]) for debt in plan["debts"]] == [
+        (2, 5, "2027-03"), (1, 2, "2026-12")]
+    assert (plan["months"], plan["debt_free_date"], plan["total_interest"]) == (5, "2027-03", 0)
+    assert solve_payoff(debts, 100, strategies=("snowball",), horizon_months=4, now=now)[0]["months"] is None
+
+
+def test_categorizer_precedence():
+    rules = [
+        {"pattern": "coffee", "category": "Food", "kind": "keyword"},
+        {"pattern": "uber", "category": "Transportation", "kind": "keyword"},
+        {"pattern": "Starbucks", "category": "Coffee Shops", "kind": "merchant"},
+        {"pattern": r"(\d)\1(\d)\2", "category": "Duplicates", "kind": "regex"},
+    ]
+    categorizer = Categorizer(rules, learned={"starbucks": "Treats"})
+
+    assert categorizer.categorize("STARBUCKS") == "Treats"
+    assert categorizer.categorize("STARBUCKS #1122 coffee") == "Coffee Shops"
+    assert categorizer.categorize("COFFEE 4455") == "Duplicates"
+    assert categorizer.categorize("COFFEE 4456") == "Food"
+    assert categorizer.categorize_many(["uber to coffee", "coffee by uber", "rent"]) == [
+        "Transportation", "Food", None]
+
+
+def test_regex_rules_keep_their_backreferences_when_merged():
+    rules = [
+        {"pattern": r"^(ref)-(\d+)", "category": "Refunds", "kind": "regex"},
+        {"pattern": r"(\w)\1{2}", "category": "Triples", "kind": "regex"},
+        {"pattern": r"(?P<code>[A-Z]{2})-(?P=code)", "category": "Transfers", "kind": "regex"},
+        {"pattern": r"(?P<code>\d{3})/(?P=code)", "category": "Fees", "kind": "regex"},
+    ]
+    categorizer = Categorizer(rules)
+
+    assert categorizer.categorize("REF-12") == "Refunds"
+    assert categorizer.categorize("zzz top") == "Triples"
+    assert categorizer.categorize("zyz top") is None
+    assert categorizer.categorize("wire AB-AB") == "Transfers"
+    assert categorizer.categorize("wire AB-CD") is None
+    assert categorizer.categorize("fee 120/120") == "Fees"
+    assert categorizer.categorize("fee 120/121") is None
+
+
+def test_cash_flow_forecast_of_fixed_items():
+    now = datetime(2026, 3, 31)
+    rent = {"amount": 900, "description": "Rent", "frequency": "monthly",
+            "created_date": "2026-01-05", "last_processed": "2026-03-05"}
+    debt = {"description": "Card", "amount": 300, "paid": 0}
+    goal = {"name": "Trip", "target_amount": 500, "saved": 400, "monthly_target": 150}
+    forecast = forecast_cash_flow(1000, [rent], [], [], [debt], 200, [goal], months=2, n_paths=50, seed=1, now=now)
+
+    april, may = forecast["monthly"]
+    assert (april["recurring"], april["debt_payments"], april["goal_contributions"]) == (900, 200, 100)
+    assert (may["recurring"], may["debt_payments"], may["goal_contributions"]) == (900, 100, 0)
+    assert (april["end_balance"], may["end_balance"], forecast["ending_balance"]) == (-200, -1200, -1200)
+    assert (may["lowest_date"], may["lowest_balance"]) == ("2026-05-05", -1200)
+    assert forecast["first_shortfall_date"] == "2026-04-05"
+    assert forecast["shortfall_probability"] == 1.0
+    assert forecast_cash_flow(0, [], [], [], months=100, n_paths=1, now=now)["months"] == MAX_MONTHS
+
+
+def test_cash_flow_forecast_is_reproducible_with_a_seed():
+    now = datetime(2026, 3, 31)
+    income = [{"amount": 3000, "source": "Salary", "date": f"2026-0{month}-01"} for month in (1, 2, 3)]
+    expenses = [{"amount": 2900, "category": "Food", "date": f"2026-0{month}-15"} for month in (1, 2, 3)]
+    expenses.append({"amount": 900, "category": "Housing", "date": "2026-03-05", "description": "Rent (Recurring)"})
+
+    forecast = forecast_cash_flow(0, [], income, expenses, months=3, n_paths=500, seed=7, now=now)
+    assert forecast == forecast_cash_flow(0, [], income, expenses, months=3, n_paths=500, seed=7, now=now)
+
+    # Salary lands on the 1st, everyday spending (the recurring rent left out) spreads over the month
+    april = forecast["monthly"][0]
+    assert (april["income"], april["everyday"]) == pytest.approx((3000, 2900))
+    assert forecast["ending_balance"] == pytest.approx(300)
+    assert forecast["first_shortfall_date"] is None
+    assert 0 < forecast["shortfall_probability"] < 1
+
+
+def test_ledger_columns_follow_writes(data_manager):
+    data_manager.add_income(1000, "Salary", "2025-01-15")
+    columns = data_manager.get_ledger_columns("income")
+
+    # The session's own writes are appended to the columns it already has
+    data_manager.add_income(250, "Gift", TODAY)
+    assert data_manager.get_ledger_columns("income") is columns
+    assert columns.by_label() == {"Salary": {"total": 1000, "count": 1}, "Gift": {"total": 250, "count": 1}}
+
+    # Writes by another session or an archive run make the next read load again
+    other = DataManager()
+    other.add_income(50, "Salary", TODAY)
+    reloaded = data_manager.get_ledger_columns("income")
+    assert reloaded is not columns
+    assert reloaded.by_label()["Salary"] == {"total": 1050, "count": 2}
+
+    data_manager.archive_entries("income", "2026-01-01")
+    assert data_manager.get_ledger_columns("income").by_label() == {
+        "Gift": {"total": 250, "count": 1}, "Salary": {"total": 50, "count": 1}}
+    assert IncomeManager(data_manager).get_summary()["month_income"] == 300
+    other.close()
+
+
+def test_ledger_loads_overlapping_a_write_are_not_kept():
+    cache = LedgerCache()
+    loads = []
+
+    def load():
+        loads.append(1)
+        return [IncomeRecord(amount=10, source="Salary", date="2026-01-05")]
+
+    cache.begin_write()
+    assert len(cache.get("income", (1, 0, "USD"), load)) == 1
+    cache.end_write("income", [IncomeRecord(amount=5, source="Gift", date="2026-01-06")], 2)
+    cache.get("income", (2, 0, "USD"), load)
+    assert len(loads) == 2
+
+    # Kept from here on: a bump by one write moves the tag along, anything else drops the columns
+    cache.begin_write()
+    cache.end_write("income", [IncomeRecord(amount=5, source="Gift", date="2026-01-06")], 3)
+    assert len(cache.get("income", (3, 0, "USD"), load)) == 2
+    assert len(loads) == 2
+    cache.advance("income", 5)
+    cache.get("income", (5, 0, "USD"), load)
+    assert len(loads) == 3
@@ -0,0 +1,51 @@
+from bson import ObjectId
+
+from memory_backend import MemoryClient, project
+
+
+def test_id_only_projection_keeps_the_id():
+    doc = {"_id": ObjectId(), "amount": 5, "tenant": "default"}
+    assert project(doc, {"_id": 1}) == {"_id": doc["_id"]}
+
+
+def test_inclusion_and_exclusion_projections():
+    doc = {"_id": 1, "amount": 5, "category": "Food", "tenant": "default"}
+    assert project(doc, {"amount": 1}) == {"_id": 1, "amount": 5}
+    assert project(doc, {"amount": 1, "_id": 0}) == {"amount": 5}
+    assert project(doc, {"_id": 0}) == {"amount": 5, "category": "Food", "tenant": "default"}
+    assert project(doc, {"tenant": 0}) == {"_id": 1, "amount": 5, "category": "Food"}
+
+
+def test_indexed_queries_match_a_full_scan():
+    collection = MemoryClient()["db"]["entries"]
+    for i in range(200):
+        collection.insert_one({"tenant": "ab"[i % 2], "category": ["Food", "Rent", None][i % 3],
+                               "date": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "amount": i})
+    collection.delete_many({"amount": {"$lt": 20}})
+    collection.update_many({"category": "Food"}, {"$set": {"date": "2023-01-01"}})
+    everything = list(collection.find())
+    queries = [
+        {"tenant": "a", "date": {"$gte": "2024-03", "$lt": "2024-05"}},
+        {"date": "2023-01-01"},
+        {"tenant": "b", "category": None},
+        {"category": {"$in": ["Food", "Rent"]}, "date": {"$lte": "2024-02-01"}},
+    ]
+    for query in queries:
+        expected = [doc["amount"] for doc in everything if all(
+            _matches(doc.get(field), condition) for field, condition in query.items())]
+        assert [doc["amount"] for doc in collection.find(query)] == expected
+
+
+def _matches(value, condition):
+    if not isinstance(condition, dict):
+        return value == condition
+    checks = {"$gte": lambda v, t: v >= t, "$lt": lambda v, t: v < t, "$lte": lambda v, t: v <= t,
+              "$in": lambda v, t: v in t}
+    return all(checks[op](value, target) for op, target in condition.items())
+
+
+def test_upsert_and_update_operators():
+    collection = MemoryClient()["db"]["counters"]
+    collection.update_one({"_id": "t:versions", "tenant": "t"}, {"$inc": {"income": 1}}, upsert=True)
+    collection.update_one({"_id": "t:versions"}, {"$inc": {"income": 2}, "$max": {"top": 3}})
+    assert collection.find_one("t:versions") == {"_id": "t:versions", "tenant": "t", "income": 3, "top": 3}
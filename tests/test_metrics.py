@@ -0,0 +1,70 @@
+import pytest
+
+import metrics
+from metrics import REGISTRY, MetricsRegistry, instrumented
+
+
+def test_render_is_cumulative_openmetrics():
+    registry = MetricsRegistry()
+    registry.observe("data_manager", "add_income", 0.002)
+    registry.observe("data_manager", "add_income", 0.3, error=True)
+    text = registry.render()
+    labels = 'layer="data_manager",operation="add_income"'
+    assert f'pfa_operation_seconds_bucket{{{labels},le="0.001"}} 0' in text
+    assert f'pfa_operation_seconds_bucket{{{labels},le="0.0025"}} 1' in text
+    assert f'pfa_operation_seconds_bucket{{{labels},le="0.5"}} 2' in text
+    assert f'pfa_operation_seconds_bucket{{{labels},le="+Inf"}} 2' in text
+    assert f"pfa_operation_seconds_count{{{labels}}} 2" in text
+    assert f"pfa_operation_seconds_sum{{{labels}}} 0.302" in text
+    assert f"pfa_operation_errors_total{{{labels}}} 1" in text
+    assert text.endswith("# EOF\n")
+
+
+def test_only_the_outermost_call_is_recorded():
+    @instrumented("test_layer")
+    class Service:
+        def outer(self):
+            return self.inner() + 1
+
+        def inner(self):
+            return 1
+
+        def _helper(self):
+            return 0
+
+    REGISTRY.clear()
+    service = Service()
+    assert service.outer() == 2
+    service.inner()
+    counts = {
+        operation: REGISTRY.histogram(layer, operation).snapshot()[0][-1]
+        for layer, operation in [("test_layer", "outer"), ("test_layer", "inner")]
+    }
+    assert counts == {"outer": 1, "inner": 1}
+    # Private methods are left alone
+    assert not hasattr(Service._helper, "__wrapped__")
+
+
+class _Writer:
+    started = []
+
+    def __init__(self, path, interval):
+        self.started.append((path, interval))
+
+    def close(self):
+        pass
+
+
+def test_exporters_start_after_a_bad_setting_is_fixed(tmp_path, monkeypatch):
+    monkeypatch.setattr(metrics, "_exporters_started", False)
+    monkeypatch.setattr(metrics, "MetricsFileWriter", _Writer)
+    monkeypatch.delenv("PFA_METRICS_PORT", raising=False)
+    monkeypatch.setenv("PFA_METRICS_FILE", str(tmp_path / "pfa.prom"))
+    monkeypatch.setenv("PFA_METRICS_INTERVAL", "soon")
+    with pytest.raises(ValueError, match="PFA_METRICS_INTERVAL"):
+        metrics.start_exporters()
+    assert not metrics._exporters_started and _Writer.started == []
+
+    monkeypatch.setenv("PFA_METRICS_INTERVAL", "60")
+    metrics.start_exporters()
+    assert _Writer.started == [(str(tmp_path / "pfa.prom"), 60.0)]
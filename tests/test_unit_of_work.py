@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import unit_of_work
+from data_manager import ENTRY_PROJECTION
+
+
+TODAY = datetime.now().strftime("%Y-%m-%d")
+
+
+def _investment(data_manager, amount):
+    data_manager.deposit_to_investment("Index Fund", amount, TODAY)
+    return data_manager.investments_collection.find_one({"tenant": data_manager.tenant})["_id"]
+
+
+def test_deposit_leaves_no_marker_or_tags(data_manager):
+    investment_id = _investment(data_manager, 100)
+    data_manager.deposit_to_investment("Index Fund", 50, TODAY, investment_id)
+    assert data_manager.db[unit_of_work.PENDING_COLLECTION].count_documents({}) == 0
+    investment = data_manager.investments_collection.find_one({"_id": investment_id})
+    assert investment["current_value"] == 150
+    assert unit_of_work.UNIT_FIELD not in investment
+
+
+def test_interrupted_unit_is_rolled_forward_once(data_manager, monkeypatch):
+    investment_id = _investment(data_manager, 100)
+    collection_type = type(data_manager.expenses_collection)
+    bulk_write = collection_type.bulk_write
+
+    def crash_on_expenses(collection, *args, **kwargs):
+        if collection.name == "expenses":
+            raise SystemExit("process killed")
+        return bulk_write(collection, *args, **kwargs)
+
+    # The investment batch goes in, then the process dies before the expense batch
+    monkeypatch.setattr(collection_type, "bulk_write", crash_on_expenses)
+    with pytest.raises(SystemExit):
+        data_manager.deposit_to_investment("Index Fund", 50, TODAY, investment_id)
+    monkeypatch.undo()
+    assert data_manager.investments_collection.find_one({"_id": investment_id})["current_value"] == 150
+    assert data_manager.expenses_collection.count_documents({"tenant": data_manager.tenant}) == 1
+
+    # Too young to be told apart from a commit still running
+    assert data_manager.recover_units() == 0
+    assert data_manager.recover_units(timedelta(0)) == 1
+    assert data_manager.recover_units(timedelta(0)) == 0
+
+    investment = data_manager.investments_collection.find_one({"_id": investment_id})
+    assert investment["current_value"] == 150
+    assert unit_of_work.UNIT_FIELD not in investment
+    expenses = list(data_manager.expenses_collection.find({"tenant": data_manager.tenant}, ENTRY_PROJECTION))
+    assert sorted(e["amount"] for e in expenses) == [50, 100]
+    spend = data_manager.category_spend_collection.find_one({"_id": data_manager._spend_id(TODAY[:7])})
+    assert spend["categories"]["investment"]["total"] == 150